@@ -0,0 +1,34 @@
+from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.template.response import TemplateResponse
+
+from . import rollups
+from .models import DailyStat
+
+
+@admin.register(DailyStat)
+class DashboardAdmin(admin.ModelAdmin):
+    """Дашборд аналитики вместо списка: читает только сводные таблицы
+    (обновляет их ``refresh_analytics``)."""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Аналитика",
+            **rollups.summary(),
+        }
+        return TemplateResponse(
+            request, "admin/analytics/dashboard.html", context
+        )
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class AnalyticsConfig(AppConfig):
+    name = "analytics"
+    verbose_name = "Аналитика"
+
+    def ready(self):
+        from . import signals  # noqa: F401
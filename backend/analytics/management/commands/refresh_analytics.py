@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from analytics import rollups
+from jobs.queue import enqueue
+
+
+class Command(BaseCommand):
+    help = " Обновить сводные таблицы аналитики "
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Пересчитать сводку с нуля по рабочим таблицам",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Разрешить полный пересчет в рабочие часы",
+        )
+        parser.add_argument(
+            "--schedule",
+            action="store_true",
+            help="Поставить периодическое обновление в очередь задач",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        if options["schedule"]:
+            job = enqueue("analytics.refresh", dedup_key=rollups.JOB_KEY)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    "Обновление поставлено в очередь"
+                    if job
+                    else "Обновление уже в очереди"
+                )
+            )
+            return
+        full = options["full"] or rollups.needs_full()
+        if full and rollups.business_hours() and not options["force"]:
+            raise CommandError(
+                "Полный пересчет читает рабочие таблицы целиком: "
+                "запустите его вне рабочих часов или с --force"
+            )
+        self.stdout.write(self.style.NOTICE("Старт"))
+        result = rollups.refresh(
+            full=full,
+            batch_size=options["batch_size"],
+            progress=lambda done: self.stdout.write(f"Рецептов: {done}"),
+        )
+        if result is None:
+            raise CommandError("Сводка уже обновляется")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Пересчитано рецептов: {result['recipes']}, изменения "
+                f"учтены до "
+                f"{timezone.localtime(result['until']):%d.%m.%Y %H:%M:%S}"
+            )
+        )
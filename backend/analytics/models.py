@@ -0,0 +1,116 @@
+"""Сводные таблицы аналитики.
+
+Заполняются только ``analytics.rollups.refresh``; дашборд в админке
+читает их и не обращается к рабочим таблицам. Ссылки на рецепты,
+ингредиенты и авторов - простые id без внешних ключей: сводка по
+удаленному рецепту должна дожить до обновления, которое ее вычтет.
+"""
+
+from django.db import models
+from django.utils import timezone
+
+
+class RecipeStat(models.Model):
+    """Рецепт на момент последнего обновления сводки."""
+
+    recipe_id = models.PositiveIntegerField("Рецепт", primary_key=True)
+    name = models.CharField("Название", max_length=256)
+    author_id = models.PositiveIntegerField("Автор")
+    favorites = models.PositiveIntegerField("В избранном", default=0)
+    carts = models.PositiveIntegerField("В корзинах", default=0)
+    # Состав при обновлении - чтобы вычесть его из IngredientStat.
+    ingredients = models.JSONField("Ингредиенты", default=list)
+    pub_date = models.DateTimeField("Дата публикации")
+
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=("-favorites", "-recipe_id"),
+                name="recipe_stat_favorites_idx",
+            ),
+        )
+        verbose_name = "Статистика рецепта"
+        verbose_name_plural = "Статистика рецептов"
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class IngredientStat(models.Model):
+    """Число рецептов с ингредиентом."""
+
+    ingredient_id = models.PositiveIntegerField("Ингредиент", primary_key=True)
+    name = models.CharField("Название", max_length=256)
+    measurement_unit = models.CharField("Единица измерения", max_length=32)
+    recipes = models.IntegerField("Рецептов", default=0, db_index=True)
+
+    class Meta:
+        verbose_name = "Статистика ингредиента"
+        verbose_name_plural = "Статистика ингредиентов"
+
+    def __str__(self) -> str:
+        return f"{self.name}, {self.measurement_unit}"
+
+
+class AuthorStat(models.Model):
+    """Рецепты автора и их добавления в избранное и корзины."""
+
+    author_id = models.PositiveIntegerField("Автор", primary_key=True)
+    username = models.CharField("Логин", max_length=150)
+    recipes = models.IntegerField("Рецептов", default=0, db_index=True)
+    favorites = models.IntegerField("В избранном", default=0)
+    carts = models.IntegerField("В корзинах", default=0)
+    last_published = models.DateTimeField(
+        "Последняя публикация", null=True, db_index=True
+    )
+
+    class Meta:
+        verbose_name = "Статистика автора"
+        verbose_name_plural = "Статистика авторов"
+
+    def __str__(self) -> str:
+        return self.username
+
+
+class DailyStat(models.Model):
+    """События за день: публикации, добавления в избранное и корзины.
+    Полный пересчет видит только сохранившиеся записи."""
+
+    date = models.DateField("Дата", primary_key=True)
+    recipes = models.PositiveIntegerField("Опубликовано рецептов", default=0)
+    favorites = models.PositiveIntegerField("Добавлено в избранное", default=0)
+    carts = models.PositiveIntegerField("Добавлено в корзины", default=0)
+
+    class Meta:
+        ordering = ("-date",)
+        verbose_name = "Сводка"
+        verbose_name_plural = "Сводка"
+
+    def __str__(self) -> str:
+        return f"{self.date:%d.%m.%Y}"
+
+
+class RecipeChange(models.Model):
+    """Удаление из избранного или корзины: у него нет своей метки
+    времени, а сводку рецепта нужно пересчитать."""
+
+    recipe_id = models.PositiveIntegerField("Рецепт")
+    created = models.DateTimeField("Дата", default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = "Изменение рецепта"
+        verbose_name_plural = "Изменения рецептов"
+
+
+class Watermark(models.Model):
+    """Момент, до которого изменения уже учтены в сводке."""
+
+    name = models.CharField("Сводка", max_length=64, primary_key=True)
+    value = models.DateTimeField("Учтено до", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Отметка обновления"
+        verbose_name_plural = "Отметки обновления"
+
+    def __str__(self) -> str:
+        return self.name
@@ -0,0 +1,355 @@
+"""Инкрементальное обновление сводных таблиц аналитики.
+
+Изменения находятся по меткам времени с прошлого обновления:
+``Recipe.updated`` (публикация, правка, удаление), ``created`` у
+избранного и корзины и журнал ``RecipeChange`` для удалений из них.
+Сводка каждого затронутого рецепта пересчитывается по индексам
+``recipe_id``, а к сводкам ингредиентов, авторов и дней прибавляется
+только разница с прежним значением. Полный пересчет читает рабочие
+таблицы целиком, коммитит пачками и запускается вне рабочих часов.
+"""
+
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+import api.constants
+from api.export import chunked
+from api.overload import limiter
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientRecipe,
+    Recipe,
+    ShoppingCart,
+)
+
+from .models import (
+    AuthorStat,
+    DailyStat,
+    IngredientStat,
+    RecipeChange,
+    RecipeStat,
+    Watermark,
+)
+
+WATERMARK = "analytics"
+JOB_KEY = "analytics-refresh"
+
+
+def business_hours() -> bool:
+    start, end = api.constants.ANALYTICS_BUSINESS_HOURS
+    return start <= timezone.localtime().hour < end
+
+
+def needs_full() -> bool:
+    """Сводка еще не строилась: обновить ее можно только полностью."""
+    return not Watermark.objects.filter(
+        name=WATERMARK, value__isnull=False
+    ).exists()
+
+
+def load(model, keys, create) -> dict:
+    """Строки сводки ``model`` по ключам; недостающие - несохраненные
+    из ``create(ключи)``."""
+    stats = model.objects.in_bulk(list(keys))
+    missing = [key for key in keys if key not in stats]
+    if missing:
+        stats.update(create(missing))
+    return stats
+
+
+def save(model, stats, fields) -> None:
+    model.objects.bulk_update(
+        [stat for stat in stats if not stat._state.adding], fields
+    )
+    model.objects.bulk_create(stat for stat in stats if stat._state.adding)
+
+
+def counts(model, recipe_ids) -> dict:
+    return dict(
+        model.objects.filter(recipe_id__in=recipe_ids)
+        .order_by()
+        .values("recipe_id")
+        .annotate(count=Count("id"))
+        .values_list("recipe_id", "count")
+    )
+
+
+def recipe_stats(recipe_ids):
+    """Текущие сводки неудаленных рецептов и логины их авторов."""
+    favorites = counts(Favorite, recipe_ids)
+    carts = counts(ShoppingCart, recipe_ids)
+    ingredients = defaultdict(list)
+    for recipe_id, ingredient_id in (
+        IngredientRecipe.objects.filter(recipe_id__in=recipe_ids)
+        .order_by("ingredient_id")
+        .values_list("recipe_id", "ingredient_id")
+    ):
+        ingredients[recipe_id].append(ingredient_id)
+    stats, usernames = {}, {}
+    for row in Recipe.objects.filter(pk__in=recipe_ids).values(
+        "id", "name", "author_id", "author__username", "pub_date"
+    ):
+        stats[row["id"]] = RecipeStat(
+            recipe_id=row["id"],
+            name=row["name"],
+            author_id=row["author_id"],
+            favorites=favorites.get(row["id"], 0),
+            carts=carts.get(row["id"], 0),
+            ingredients=ingredients[row["id"]],
+            pub_date=row["pub_date"],
+        )
+        usernames[row["author_id"]] = row["author__username"]
+    return stats, usernames
+
+
+def add_ingredients(deltas) -> None:
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    stats = load(
+        IngredientStat,
+        deltas,
+        lambda missing: {
+            ingredient.pk: IngredientStat(
+                ingredient_id=ingredient.pk,
+                name=ingredient.name,
+                measurement_unit=ingredient.measurement_unit,
+            )
+            for ingredient in Ingredient.objects.filter(pk__in=missing)
+        },
+    )
+    for key, delta in deltas.items():
+        if key in stats:
+            stats[key].recipes += delta
+    save(IngredientStat, stats.values(), ("recipes",))
+
+
+def add_authors(deltas, recipes, usernames) -> None:
+    stats = load(
+        AuthorStat,
+        deltas,
+        lambda missing: {key: AuthorStat(author_id=key) for key in missing},
+    )
+    for key, delta in deltas.items():
+        for field, value in delta.items():
+            setattr(stats[key], field, getattr(stats[key], field) + value)
+    for recipe in recipes:
+        stat = stats[recipe.author_id]
+        stat.username = usernames[recipe.author_id]
+        if stat.last_published is None or stat.last_published < (
+            recipe.pub_date
+        ):
+            stat.last_published = recipe.pub_date
+    save(
+        AuthorStat,
+        stats.values(),
+        ("username", "recipes", "favorites", "carts", "last_published"),
+    )
+
+
+def refresh_recipes(recipe_ids) -> None:
+    """Пересчитывает сводки рецептов ``recipe_ids`` и прибавляет разницу
+    с прежними к сводкам ингредиентов и авторов."""
+    old = RecipeStat.objects.in_bulk(recipe_ids)
+    new, usernames = recipe_stats(recipe_ids)
+    ingredients = Counter()
+    authors = defaultdict(Counter)
+    for stats, sign in ((old, -1), (new, 1)):
+        for stat in stats.values():
+            ingredients.update({key: sign for key in stat.ingredients})
+            author = authors[stat.author_id]
+            author["recipes"] += sign
+            author["favorites"] += sign * stat.favorites
+            author["carts"] += sign * stat.carts
+    RecipeStat.objects.filter(pk__in=recipe_ids).delete()
+    RecipeStat.objects.bulk_create(new.values())
+    add_ingredients(ingredients)
+    add_authors(authors, new.values(), usernames)
+
+
+def changed_recipes(since, until) -> list:
+    recipe_ids = set(
+        Recipe.all_objects.filter(
+            updated__gte=since, updated__lt=until
+        ).values_list("pk", flat=True)
+    )
+    for model in (Favorite, ShoppingCart):
+        recipe_ids.update(
+            model.objects.filter(
+                created__gte=since, created__lt=until
+            ).values_list("recipe_id", flat=True)
+        )
+    recipe_ids.update(
+        RecipeChange.objects.filter(created__lt=until).values_list(
+            "recipe_id", flat=True
+        )
+    )
+    return sorted(recipe_ids)
+
+
+def daily_counts(queryset, field) -> dict:
+    return dict(
+        queryset.annotate(day=TruncDate(field))
+        .order_by()
+        .values("day")
+        .annotate(count=Count("pk"))
+        .values_list("day", "count")
+    )
+
+
+def refresh_days(since, until) -> None:
+    """Прибавляет к сводке по дням события из ``[since, until)``."""
+    window = {"lt": until} if since is None else {"gte": since, "lt": until}
+
+    def between(field):
+        return {
+            f"{field}__{lookup}": value for lookup, value in window.items()
+        }
+
+    recipes = Recipe.all_objects.filter(**between("pub_date"))
+    if since is not None:
+        # Новый рецепт изменен не раньше публикации: сужает по индексу.
+        recipes = recipes.filter(updated__gte=since)
+    deltas = {
+        "recipes": daily_counts(recipes, "pub_date"),
+        "favorites": daily_counts(
+            Favorite.objects.filter(**between("created")), "created"
+        ),
+        "carts": daily_counts(
+            ShoppingCart.objects.filter(**between("created")), "created"
+        ),
+    }
+    stats = load(
+        DailyStat,
+        {day for values in deltas.values() for day in values},
+        lambda missing: {day: DailyStat(date=day) for day in missing},
+    )
+    for field, values in deltas.items():
+        for day, count in values.items():
+            setattr(stats[day], field, getattr(stats[day], field) + count)
+    save(DailyStat, stats.values(), tuple(deltas))
+
+
+def refresh_names(since) -> None:
+    stats = IngredientStat.objects.in_bulk(
+        list(
+            Ingredient.objects.filter(updated__gte=since).values_list(
+                "pk", flat=True
+            )
+        )
+    )
+    for ingredient in Ingredient.objects.filter(pk__in=list(stats)):
+        stats[ingredient.pk].name = ingredient.name
+        stats[ingredient.pk].measurement_unit = ingredient.measurement_unit
+    IngredientStat.objects.bulk_update(
+        stats.values(), ("name", "measurement_unit")
+    )
+
+
+def rebuild(until, batch_size, progress) -> int:
+    """Строит сводку заново. Очистка каждой таблицы и каждая пачка
+    рецептов - отдельные транзакции, чтобы не держать снимок и блокировки
+    на весь пересчет; пока он идет, отметка пуста и сводка не готова."""
+    Watermark.objects.update_or_create(
+        name=WATERMARK, defaults={"value": None}
+    )
+    for model in (RecipeStat, IngredientStat, AuthorStat, DailyStat):
+        model.objects.all().delete()
+    total, last = 0, 0
+    while True:
+        batch = list(
+            Recipe.objects.filter(pk__gt=last)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not batch:
+            break
+        with transaction.atomic():
+            refresh_recipes(batch)
+        total, last = total + len(batch), batch[-1]
+        if progress:
+            progress(total)
+    with transaction.atomic():
+        refresh_days(None, until)
+        RecipeChange.objects.filter(created__lt=until).delete()
+        Watermark.objects.filter(name=WATERMARK).update(value=until)
+    return total
+
+
+def update(since, until, batch_size, progress) -> int:
+    """Учитывает изменения из ``[since, until)`` одной транзакцией: они
+    невелики, а прибавки к сводке по дням должны попасть в нее ровно
+    один раз."""
+    total = 0
+    with transaction.atomic():
+        refresh_names(since)
+        for batch in chunked(changed_recipes(since, until), batch_size):
+            refresh_recipes(batch)
+            total += len(batch)
+            if progress:
+                progress(total)
+        refresh_days(since, until)
+        RecipeChange.objects.filter(created__lt=until).delete()
+        Watermark.objects.filter(name=WATERMARK).update(value=until)
+    return total
+
+
+def refresh(full=False, batch_size=500, progress=None):
+    """Учитывает в сводке изменения с прошлого обновления, а с ``full``
+    или при первом запуске строит ее заново. Возвращает число
+    пересчитанных рецептов и момент, до которого учтены изменения, или
+    None, если уже идет другое обновление."""
+    # Слот на все воркеры (advisory-лок) не дает двум обновлениям
+    # прибавить одно и то же дважды.
+    release = limiter.acquire(JOB_KEY, 1)
+    if release is None:
+        return None
+    try:
+        until = timezone.now() - timedelta(
+            seconds=api.constants.ANALYTICS_SETTLE
+        )
+        since = (
+            Watermark.objects.filter(name=WATERMARK)
+            .values_list("value", flat=True)
+            .first()
+        )
+        if full or since is None:
+            total = rebuild(until, batch_size, progress)
+        else:
+            total = update(since, until, batch_size, progress)
+    finally:
+        release()
+    return {"recipes": total, "until": until}
+
+
+def summary() -> dict:
+    """Данные дашборда; читаются только сводные таблицы."""
+    top = api.constants.ANALYTICS_TOP
+    days = api.constants.ANALYTICS_DAYS
+    return {
+        "until": Watermark.objects.filter(name=WATERMARK)
+        .values_list("value", flat=True)
+        .first(),
+        "totals": AuthorStat.objects.aggregate(
+            recipes=Sum("recipes"),
+            favorites=Sum("favorites"),
+            carts=Sum("carts"),
+        ),
+        "ingredients": IngredientStat.objects.filter(recipes__gt=0).order_by(
+            "-recipes", "name"
+        )[:top],
+        "recipes": RecipeStat.objects.order_by("-favorites", "-recipe_id")[
+            :top
+        ],
+        "authors": AuthorStat.objects.filter(
+            recipes__gt=0,
+            last_published__gte=timezone.now() - timedelta(days=days),
+        ).order_by("-recipes", "username")[:top],
+        "days": DailyStat.objects.filter(
+            date__gt=timezone.localdate() - timedelta(days=days)
+        ),
+    }
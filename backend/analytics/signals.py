@@ -0,0 +1,25 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from recipes.models import Favorite, ShoppingCart
+from recipes.purge import purged
+
+from .models import RecipeChange
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def recipe_unmarked(sender, instance, **kwargs):
+    RecipeChange.objects.create(recipe_id=instance.recipe_id)
+
+
+@receiver(purged, sender=Favorite)
+@receiver(purged, sender=ShoppingCart)
+def recipes_unmarked(sender, queryset, **kwargs):
+    RecipeChange.objects.bulk_create(
+        RecipeChange(recipe_id=recipe_id)
+        for recipe_id in queryset.filter(recipe__is_deleted=False)
+        .order_by()
+        .values_list("recipe_id", flat=True)
+        .distinct()
+    )
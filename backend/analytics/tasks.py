@@ -0,0 +1,20 @@
+"""Фоновые задачи аналитики (см. ``jobs.queue``)."""
+
+import api.constants
+from jobs.queue import enqueue, task
+
+from . import rollups
+
+
+@task("analytics.refresh")
+def refresh():
+    # Следующее обновление ставится сразу: цепочка не прервется, даже
+    # если это упадет.
+    enqueue(
+        "analytics.refresh",
+        dedup_key=rollups.JOB_KEY,
+        delay=api.constants.ANALYTICS_REFRESH_INTERVAL,
+    )
+    if rollups.needs_full() and rollups.business_hours():
+        return
+    rollups.refresh()
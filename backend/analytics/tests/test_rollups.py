@@ -0,0 +1,100 @@
+from unittest import mock
+
+from django.test import TestCase
+
+import api.constants
+from analytics import rollups
+from analytics.models import AuthorStat, IngredientStat, RecipeStat
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientRecipe,
+    Recipe,
+    ShoppingCart,
+)
+from users.models import User
+
+
+@mock.patch.object(api.constants, "ANALYTICS_SETTLE", 0)
+class RollupTest(TestCase):
+    """Инкрементальное обновление сводки совпадает с полным пересчетом."""
+
+    def setUp(self):
+        self.author = self.user("author")
+        self.reader = self.user("reader")
+        self.flour = Ingredient.objects.create(
+            name="мука", measurement_unit="г"
+        )
+        self.milk = Ingredient.objects.create(
+            name="молоко", measurement_unit="мл"
+        )
+
+    @staticmethod
+    def user(name) -> User:
+        return User.objects.create_user(
+            email=f"{name}@a.ru", username=name, password="x"
+        )
+
+    def recipe(self, name, *ingredients) -> Recipe:
+        recipe = Recipe.objects.create(
+            author=self.author,
+            name=name,
+            image="recipes/image/x.png",
+            text="...",
+            cooking_time=10,
+        )
+        for ingredient in ingredients:
+            IngredientRecipe.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=1
+            )
+        return recipe
+
+    @staticmethod
+    def snapshot() -> dict:
+        return {
+            "recipes": set(
+                RecipeStat.objects.values_list(
+                    "recipe_id", "favorites", "carts"
+                )
+            ),
+            "ingredients": set(
+                IngredientStat.objects.filter(recipes__gt=0).values_list(
+                    "ingredient_id", "recipes"
+                )
+            ),
+            "authors": set(
+                AuthorStat.objects.values_list(
+                    "author_id", "recipes", "favorites", "carts"
+                )
+            ),
+        }
+
+    def test_incremental_matches_full(self):
+        pancakes = self.recipe("Блины", self.flour, self.milk)
+        Favorite.objects.create(user=self.reader, recipe=pancakes)
+        self.assertTrue(rollups.needs_full())
+        rollups.refresh()
+        self.assertFalse(rollups.needs_full())
+
+        bread = self.recipe("Хлеб", self.flour)
+        Favorite.objects.create(user=self.reader, recipe=bread)
+        ShoppingCart.objects.create(user=self.reader, recipe=bread)
+        Favorite.objects.filter(recipe=pancakes).delete()
+        porridge = self.recipe("Каша", self.milk)
+        porridge.soft_delete()
+        result = rollups.refresh()
+        self.assertEqual(result["recipes"], 3)
+        incremental = self.snapshot()
+        self.assertEqual(
+            incremental["recipes"], {(pancakes.pk, 0, 0), (bread.pk, 1, 1)}
+        )
+        self.assertEqual(
+            incremental["ingredients"], {(self.flour.pk, 2), (self.milk.pk, 1)}
+        )
+
+        rollups.refresh(full=True)
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_concurrent_refresh_is_skipped(self):
+        with mock.patch.object(rollups.limiter, "acquire", return_value=None):
+            self.assertIsNone(rollups.refresh())
@@ -0,0 +1,141 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponseNotAllowed, JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+
+import api.constants
+
+from .authentication import CachedTokenAuthentication
+from .overload import Overloaded, is_timeout, protected
+from .utils import (
+    get_shopping_list_ingredients,
+    render_shopping_list,
+    shopping_list_response,
+)
+from .views import IngredientViewSet, RecipeViewSet, TagViewSet
+
+
+def json_response(data, status_code=status.HTTP_200_OK) -> JsonResponse:
+    return JsonResponse(
+        data,
+        status=status_code,
+        safe=False,
+        json_dumps_params={"ensure_ascii": False},
+    )
+
+
+def require_get(view):
+    """Аналог require_GET для корутин (в Django 3.2 он только синхронный)."""
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return HttpResponseNotAllowed(("GET", "HEAD"))
+        return await view(request, *args, **kwargs)
+
+    # Как и DRF-вьюхи, API работает по токену, а не по сессии.
+    wrapper.csrf_exempt = True
+    return wrapper
+
+
+def protect(view):
+    """Перегрузка и таймаут SQL - 503 с ``Retry-After``, как у вьюсетов."""
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view(request, *args, **kwargs)
+        except Exception as error:
+            if not (isinstance(error, Overloaded) or is_timeout(error)):
+                raise
+        response = json_response(
+            {"detail": Overloaded.default_detail},
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+        response["Retry-After"] = str(api.constants.OVERLOAD_RETRY_AFTER)
+        return response
+
+    return wrapper
+
+
+@sync_to_async
+def run_action(viewset, action, func, *args):
+    """Выполняет ``func`` под лимитом и бюджетом времени действия
+    ``action`` вьюсета. Advisory-лок берется и снимается в одном потоке,
+    а значит, в одном соединении."""
+    with protected(f"{viewset.__name__}.{action}", action):
+        return func(*args)
+
+
+@sync_to_async
+def authenticate(request):
+    """Аутентификация по токену, как в DRF."""
+    result = CachedTokenAuthentication().authenticate(request)
+    return result[0] if result else AnonymousUser()
+
+
+def list_data(viewset, request):
+    """Данные действия ``list`` вьюсета: тот же queryset, фильтры и
+    сериализатор, что и у синхронного API."""
+    view = viewset(
+        action="list",
+        request=Request(request),
+        format_kwarg=None,
+        args=(),
+        kwargs={},
+    )
+    queryset = view.filter_queryset(view.get_queryset())
+    return view.get_serializer(queryset, many=True).data
+
+
+def build_shopping_list(user) -> str:
+    return render_shopping_list(get_shopping_list_ingredients(user))
+
+
+@require_get
+@protect
+async def tag_list(request):
+    """Асинхронный вывод тегов"""
+    return json_response(
+        await run_action(TagViewSet, "list", list_data, TagViewSet, request)
+    )
+
+
+@require_get
+@protect
+async def ingredient_list(request):
+    """Асинхронный вывод ингредиентов с поиском по началу названия"""
+    return json_response(
+        await run_action(
+            IngredientViewSet, "list", list_data, IngredientViewSet, request
+        )
+    )
+
+
+@require_get
+@protect
+async def download_shopping_cart(request):
+    """Асинхронная выгрузка списка покупок"""
+    try:
+        user = await authenticate(request)
+    except AuthenticationFailed as error:
+        return json_response(
+            {"detail": error.detail}, status.HTTP_401_UNAUTHORIZED
+        )
+    if not user.is_authenticated:
+        return json_response(
+            {"detail": "Учетные данные не были предоставлены."},
+            status.HTTP_401_UNAUTHORIZED,
+        )
+    return shopping_list_response(
+        await run_action(
+            RecipeViewSet,
+            "download_shopping_cart",
+            build_shopping_list,
+            user,
+        )
+    )
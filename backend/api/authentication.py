@@ -0,0 +1,66 @@
+import copy
+import threading
+import time
+
+from rest_framework.authentication import TokenAuthentication
+
+import api.constants
+
+from .invalidation import bus
+
+
+class TokenCache:
+    """Токены с пользователями в памяти процесса. Сбрасываются по
+    сообщениям шины об изменении пользователей и токенов."""
+
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+        bus.subscribe("users", self.users_changed)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None or entry[2] < time.monotonic():
+            return None
+        return entry[0], entry[1]
+
+    def set(self, key, user, token, version):
+        with self.lock:
+            # Пока пользователь загружался, он мог измениться.
+            if version != bus.version("users"):
+                return
+            if len(self.entries) >= api.constants.AUTH_CACHE_SIZE:
+                self.entries.clear()
+            self.entries[key] = (
+                user,
+                token,
+                time.monotonic() + api.constants.AUTH_CACHE_TIMEOUT,
+            )
+
+    def users_changed(self, keys):
+        user_ids = {int(key.split("-", 1)[1]) for key in keys}
+        with self.lock:
+            if not user_ids:
+                self.entries.clear()
+                return
+            for key, (user, _, _) in list(self.entries.items()):
+                if user.pk in user_ids:
+                    del self.entries[key]
+
+
+tokens = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к базе на каждый запрос."""
+
+    def authenticate_credentials(self, key):
+        cached = tokens.get(key)
+        if cached is None:
+            version = bus.version("users")
+            user, token = super().authenticate_credentials(key)
+            tokens.set(key, user, token, version)
+        else:
+            user, token = cached
+        # Экземпляр из кэша не должен меняться обработчиками запроса.
+        return copy.copy(user), token
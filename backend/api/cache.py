@@ -0,0 +1,15 @@
+from . import edge_cache
+from .invalidation import bus
+
+
+def get_version(name) -> str:
+    """Текущая версия набора данных ``name`` для ключей кэша."""
+    return bus.version(name)
+
+
+def invalidate(name, *keys) -> None:
+    """Инвалидирует кэши набора ``name``: локальные кэши всех воркеров
+    через шину и микрокэш nginx (для ``name`` и дополнительных ключей
+    вида ``recipes-<id>``)."""
+    bus.publish(name, *keys)
+    edge_cache.purge(name, *keys)
@@ -2,3 +2,173 @@ COOKING_TIME_MIN_VALUE = 1
 COOKING_TIME_MAX_VALUE = 24 * 60
 SHOPPING_LIST_NAME = "shopping_list.txt"
 LENGTH_OF_FIELDS_RECIPES = 200
+# Битов в маске тегов рецепта (63-й не используется, чтобы маска
+# оставалась положительной)
+MAX_TAG_BITS = 62
+# Приведение единиц измерения к базовой: единица -> (базовая, множитель)
+UNIT_CONVERSIONS = {
+    "г": ("г", 1),
+    "кг": ("г", 1000),
+    "мг": ("г", 0.001),
+    "мл": ("мл", 1),
+    "л": ("мл", 1000),
+    "ч. л.": ("мл", 5),
+    "ст. л.": ("мл", 15),
+    "стакан": ("мл", 250),
+}
+# Крупная единица для вывода: базовая -> (крупная, порог)
+UNIT_DISPLAY = {
+    "г": ("кг", 1000),
+    "мл": ("л", 1000),
+}
+# Синонимы ингредиентов (после нормализации названия)
+INGREDIENT_SYNONYMS = {
+    "яйца куриные крупные": "яйца куриные",
+    "яйцо куриное": "яйца куриные",
+    "яйцо": "яйца куриные",
+}
+AMOUNT_PRECISION = 3
+# Рекомендации
+RECOMMENDATIONS_TOP_K = 20
+RECOMMENDATIONS_LIMIT = 6
+RECOMMENDATIONS_FAVORITE_WEIGHT = 0.7
+RECOMMENDATIONS_INGREDIENT_WEIGHT = 0.3
+# Сколько последних избранных пользователя учитывать
+RECOMMENDATIONS_USER_ITEMS = 200
+# Ингредиенты, встречающиеся в большей доле рецептов, не учитываются
+RECOMMENDATIONS_MAX_INGREDIENT_SHARE = 0.2
+RECOMMENDATIONS_RELOAD_INTERVAL = 60
+# Подсказки авторов по графу подписок
+SUGGESTIONS_LIMIT = 5
+SUGGESTIONS_FOLLOW_WEIGHT = 1.0
+SUGGESTIONS_CO_FAVORITE_WEIGHT = 0.5
+SUGGESTIONS_FAVORITE_AUTHOR_WEIGHT = 2.0
+# Сколько пользователей, добавивших рецепт в избранное, обходить
+SUGGESTIONS_FANS_PER_RECIPE = 50
+# Бюджет времени на один запрос подсказок, секунды
+SUGGESTIONS_TIME_BUDGET = 0.05
+SUGGESTIONS_RELOAD_INTERVAL = 60
+# Фасеты: интервалы времени готовки (минуты, правая граница не входит)
+COOKING_TIME_BUCKETS = ((0, 15), (15, 30), (30, 60), (60, None))
+FACETS_CACHE_TIMEOUT = 60
+# Микрокэш анонимных GET-запросов на nginx
+ANONYMOUS_CACHE_TTL = 10
+ANONYMOUS_CACHE_PATHS = {
+    "/api/recipes/": "recipes",
+    "/api/tags/": "tags",
+    "/api/ingredients/": "ingredients",
+}
+EDGE_CACHE_REFRESH_HEADER = "X-Cache-Refresh"
+EDGE_CACHE_TIMEOUT = 2
+# Рейтинги рецептов: вес добавления в избранное, в корзину и публикации
+POPULARITY_FAVORITE_WEIGHT = 1.0
+POPULARITY_CART_WEIGHT = 0.5
+TRENDING_PUBLISH_WEIGHT = 1.0
+# Период полураспада вклада активности в trending, секунды
+TRENDING_HALF_LIFE = 3 * 24 * 60 * 60
+# Точка отсчета времени для trending (2024-01-01 UTC)
+TRENDING_EPOCH = 1704067200
+# Шина инвалидации: канал NOTIFY, период опроса и пауза перед
+# переподключением слушателя, секунды
+INVALIDATION_CHANNEL = "foodgram_invalidation"
+INVALIDATION_POLL = 5
+INVALIDATION_RECONNECT_DELAY = 5
+# Кэш токенов в памяти воркера: время жизни записи и размер
+AUTH_CACHE_TIMEOUT = 300
+AUTH_CACHE_SIZE = 10000
+# Максимальный ?limit= для постраничных списков
+MAX_PAGE_SIZE = 100
+# Потоковая выгрузка NDJSON: строк на чанк курсора
+EXPORT_CHUNK_SIZE = 1000
+# Выгрузка с ?since= захватывает и записи немного раньше since: метка
+# updated ставится до коммита, и долгая транзакция может закоммитить
+# строку со временем, которое клиент уже прошел. Секунды
+EXPORT_SINCE_OVERLAP = 300
+EXPORT_CONTENT_TYPE = "application/x-ndjson"
+# Массовый импорт рецептов
+IMPORT_BATCH_SIZE = 500
+IMPORT_WORKERS = 4
+# Строк за один запрос к API; большие файлы - командой import_recipes
+IMPORT_MAX_LINES = 5000
+# Поиск дубликатов: число MinHash-функций, полос LSH (по
+# DUPLICATES_PERMUTATIONS / DUPLICATES_BANDS строк) и длина шингла имени
+DUPLICATES_PERMUTATIONS = 64
+DUPLICATES_BANDS = 16
+DUPLICATES_SHINGLE = 3
+# Минимальное оценочное сходство Жаккара для "возможного дубликата"
+DUPLICATES_THRESHOLD = 0.6
+DUPLICATES_LIMIT = 10
+# Сколько кандидатов из корзин LSH сравнивать по сигнатурам
+DUPLICATES_MAX_CANDIDATES = 500
+# Заголовок ответа на создание рецепта со списком возможных дубликатов
+DUPLICATES_HEADER = "X-Possible-Duplicates"
+# Пар в админке и рецептов в одной корзине LSH при ее обходе
+DUPLICATES_ADMIN_PAIRS = 200
+DUPLICATES_MAX_BUCKET = 50
+# Задержка пересчета пар для админки после правки рецепта, с
+DUPLICATES_PAIRS_DELAY = 300
+# Бюджет времени SQL-запросов на действие вьюсета, мс (PostgreSQL).
+# Транзакция с SET LOCAL statement_timeout открывается только для
+# перечисленных действий; остальные (запись, потоковая выгрузка,
+# импорт) идут без нее
+STATEMENT_TIMEOUT = 3000
+STATEMENT_TIMEOUTS = {
+    "list": STATEMENT_TIMEOUT,
+    "retrieve": STATEMENT_TIMEOUT,
+    "download_shopping_cart": 2000,
+    "subscriptions": 2000,
+}
+# Одновременных запросов к тяжелым действиям (на все воркеры для
+# PostgreSQL); сверх лимита - 503 с Retry-After, секунды
+CONCURRENCY_LIMITS = {
+    "download_shopping_cart": 8,
+    "subscriptions": 8,
+    "export": 2,
+    "import_recipes": 2,
+    "export_data": 2,
+}
+OVERLOAD_RETRY_AFTER = 1
+# Токен-бакет на пользователя для избранного, корзины и подписок:
+# запросов подряд и пополнение в секунду
+THROTTLE_WRITE_BURST = 30
+THROTTLE_WRITE_RATE = 0.5
+# Период удаления бакетов, которые уже снова полные, секунды
+THROTTLE_PRUNE_INTERVAL = 3600
+# Очередь фоновых задач: попытки, экспоненциальная задержка повтора
+# (база и потолок, секунды), период опроса пустой очереди
+JOBS_MAX_ATTEMPTS = 5
+JOBS_BACKOFF_BASE = 5
+JOBS_BACKOFF_MAX = 600
+JOBS_POLL_INTERVAL = 1
+JOBS_THREADS = 4
+# Воркер отмечает выполняемые задачи пульсом с этим периодом; задача
+# "running" без пульса дольше JOBS_STALE_TIMEOUT считается брошенной
+# упавшим воркером. Секунды
+JOBS_HEARTBEAT_INTERVAL = 30
+JOBS_STALE_TIMEOUT = 180
+# Период вывода метрик воркера и хранение выполненных задач, секунды
+JOBS_METRICS_INTERVAL = 60
+JOBS_RETENTION = 7 * 24 * 60 * 60
+# План питания: максимум порций в записи
+MEAL_PLAN_MAX_SERVINGS = 50
+# Выгрузка персональных данных: до скольких рецептов архив отдается
+# сразу потоком, иначе собирается фоновой задачей; размер чанка чтения
+# изображений, байт; срок жизни архива и ссылки на него, секунды
+DATA_EXPORT_SYNC_RECIPES = 50
+DATA_EXPORT_MEDIA_CHUNK = 64 * 1024
+DATA_EXPORT_TTL = 24 * 60 * 60
+DATA_EXPORT_CONTENT_TYPE = "application/zip"
+# Аналитика: изменения моложе ANALYTICS_SETTLE секунд ждут следующего
+# обновления (незакоммиченные транзакции), период обновления фоновой
+# задачей, секунды; рабочие часы [начало, конец), когда полный пересчет
+# по рабочим таблицам не запускается
+ANALYTICS_SETTLE = 60
+ANALYTICS_REFRESH_INTERVAL = 15 * 60
+ANALYTICS_BUSINESS_HOURS = (9, 21)
+# Дашборд: строк в рейтингах и дней в графике активности
+ANALYTICS_TOP = 20
+ANALYTICS_DAYS = 30
+# Потоковые ответы под ASGI: чанков впереди отдачи и период проверки
+# отключения клиента, секунды
+STREAM_QUEUE_SIZE = 4
+STREAM_PUT_TIMEOUT = 1
@@ -0,0 +1,55 @@
+import logging
+import threading
+from urllib.error import URLError
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.db import transaction
+
+import api.constants
+
+logger = logging.getLogger(__name__)
+
+
+def urls_for(key):
+    """Адреса, которые нужно обновить в кэше nginx для ключа."""
+    for prefix, name in api.constants.ANONYMOUS_CACHE_PATHS.items():
+        if key == name:
+            return [prefix]
+        if key.startswith(f"{name}-"):
+            object_id = key.split("-", 1)[1]
+            return [prefix, f"{prefix}{object_id}/"]
+    return []
+
+
+def refresh(urls):
+    for url in urls:
+        request = Request(
+            settings.EDGE_CACHE_URL.rstrip("/") + url,
+            headers={api.constants.EDGE_CACHE_REFRESH_HEADER: "1"},
+        )
+        try:
+            urlopen(request, timeout=api.constants.EDGE_CACHE_TIMEOUT).close()
+        except (URLError, OSError) as error:
+            logger.warning("Не удалось обновить кэш %s: %s", url, error)
+
+
+def purge(*keys):
+    """Обновляет записи микрокэша nginx после коммита транзакции.
+
+    Запросы с заголовком обновления идут в обход кэша, и nginx
+    сохраняет свежий ответ. Страницы с параметрами устаревают сами
+    через ANONYMOUS_CACHE_TTL.
+    """
+    if not settings.EDGE_CACHE_URL:
+        return
+    urls = []
+    for key in keys:
+        urls.extend(url for url in urls_for(key) if url not in urls)
+    if not urls:
+        return
+    transaction.on_commit(
+        lambda: threading.Thread(
+            target=refresh, args=(urls,), daemon=True
+        ).start()
+    )
@@ -1,7 +1,12 @@
+from datetime import timedelta
+
+from django.db.models import Count, F, Q
 from django_filters.rest_framework import FilterSet, filters
 from rest_framework.filters import SearchFilter
 
-from recipes.models import Ingredient, Recipe, Tag
+import api.constants
+from recipes.models import Ingredient, MealPlanEntry, Recipe, Tag
+from recipes.shopping import week_of
 
 
 class IngredientFilter(SearchFilter):
@@ -13,24 +18,143 @@ class IngredientFilter(SearchFilter):
 
 
 class RecipeFilter(FilterSet):
+    ORDERINGS = {
+        "popular": ("-popularity", "-id"),
+        "trending": ("-trending", "-id"),
+    }
+
     tags = filters.ModelMultipleChoiceFilter(
         field_name="tags__slug",
         to_field_name="slug",
         queryset=Tag.objects.all(),
+        method="filter_tags",
+    )
+    tags_match = filters.ChoiceFilter(
+        choices=(("any", "Любой из тегов"), ("all", "Все теги")),
+        method="filter_tags_match",
     )
     is_favorited = filters.BooleanFilter(method="filter_is_favorited")
     is_in_shopping_cart = filters.BooleanFilter(
         method="filter_is_in_shopping_cart"
     )
+    min_calories = filters.NumberFilter("calories", lookup_expr="gte")
+    max_calories = filters.NumberFilter("calories", lookup_expr="lte")
+    min_proteins = filters.NumberFilter("proteins", lookup_expr="gte")
+    max_fats = filters.NumberFilter("fats", lookup_expr="lte")
+    max_carbohydrates = filters.NumberFilter(
+        "carbohydrates", lookup_expr="lte"
+    )
+    ordering = filters.ChoiceFilter(
+        choices=(
+            ("popular", "Популярные"),
+            ("trending", "Набирающие популярность"),
+        ),
+        method="filter_ordering",
+    )
 
     class Meta:
         model = Recipe
         fields = (
             "tags",
+            "tags_match",
             "author",
             "is_favorited",
             "is_in_shopping_cart",
+            "min_calories",
+            "max_calories",
+            "min_proteins",
+            "max_fats",
+            "max_carbohydrates",
+            "ordering",
+        )
+
+    def tags_condition(self, alias="matched_tags"):
+        """Выражение для ``alias()`` и условие по маске выбранных тегов."""
+        tags = self.form.cleaned_data.get("tags")
+        if not tags:
+            return None, Q()
+        mask = Tag.mask_for(tags)
+        if self.form.cleaned_data.get("tags_match") == "all":
+            # Тег без бита не отмечен ни в одной маске.
+            condition = (
+                Q(**{alias: mask})
+                if all(tag.bit is not None for tag in tags)
+                else Q(pk__in=())
+            )
+        else:
+            condition = Q(**{f"{alias}__gt": 0})
+        return F("tags_mask").bitand(mask), condition
+
+    def filter_tags(self, queryset, name, value):
+        """Фильтр по маске тегов рецепта, без join с recipes_recipe_tags."""
+        expression, condition = self.tags_condition()
+        if expression is None:
+            return queryset
+        return queryset.alias(matched_tags=expression).filter(condition)
+
+    @property
+    def is_personal(self) -> bool:
+        """Зависит ли выборка от текущего пользователя."""
+        return self.request.user.is_authenticated and any(
+            self.form.cleaned_data.get(name)
+            for name in ("is_favorited", "is_in_shopping_cart")
+        )
+
+    def facets(self) -> dict:
+        """Число рецептов по тегам и интервалам времени готовки одним
+        запросом. Счетчики тегов учитывают все фильтры, кроме самих
+        тегов; интервалы - все фильтры."""
+        queryset = self.queryset
+        for name, value in self.form.cleaned_data.items():
+            if name not in ("tags", "tags_match", "ordering"):
+                queryset = self.filters[name].filter(queryset, value)
+        tags = list(Tag.objects.all())
+        expression, selected = self.tags_condition()
+        if expression is not None:
+            queryset = queryset.alias(matched_tags=expression)
+        queryset = queryset.alias(
+            **{
+                f"tag_bit_{tag.bit}": F("tags_mask").bitand(tag.mask)
+                for tag in tags
+            }
         )
+        counts = {"count": Count("id", filter=selected)}
+        for tag in tags:
+            counts[f"tag_{tag.pk}"] = Count(
+                "id", filter=Q(**{f"tag_bit_{tag.bit}__gt": 0})
+            )
+        for low, high in api.constants.COOKING_TIME_BUCKETS:
+            bucket = selected & Q(cooking_time__gte=low)
+            if high is not None:
+                bucket &= Q(cooking_time__lt=high)
+            counts[f"time_{low}"] = Count("id", filter=bucket)
+        result = queryset.order_by().aggregate(**counts)
+        return {
+            "count": result["count"],
+            "tags": [
+                {
+                    "id": tag.pk,
+                    "name": tag.name,
+                    "slug": tag.slug,
+                    "count": result[f"tag_{tag.pk}"],
+                }
+                for tag in tags
+            ],
+            "cooking_time": [
+                {"min": low, "max": high, "count": result[f"time_{low}"]}
+                for low, high in api.constants.COOKING_TIME_BUCKETS
+            ],
+        }
+
+    def filter_tags_match(self, queryset, name, value):
+        # Учитывается в filter_tags.
+        return queryset
+
+    def filter_ordering(self, queryset, name, value):
+        """Сортировка по индексированным рейтингам рецепта."""
+        if value in self.ORDERINGS:
+            return queryset.order_by(*self.ORDERINGS[value])
+        return queryset
 
     def filter_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
@@ -41,3 +165,17 @@ class RecipeFilter(FilterSet):
         if value and self.request.user.is_authenticated:
             return queryset.filter(shopping_list__user=self.request.user)
         return queryset
+
+
+class MealPlanFilter(FilterSet):
+    week = filters.DateFilter(method="filter_week")
+
+    class Meta:
+        model = MealPlanEntry
+        fields = ("week",)
+
+    def filter_week(self, queryset, name, value):
+        start = week_of(value)
+        return queryset.filter(
+            date__gte=start, date__lt=start + timedelta(days=7)
+        )
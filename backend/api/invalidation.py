@@ -0,0 +1,158 @@
+"""Шина инвалидации кэшей между воркерами.
+
+Изменение данных публикуется сообщением (набор данных и ключи) через
+PostgreSQL ``NOTIFY``; каждый воркер слушает канал в фоновом потоке и
+увеличивает локальную версию набора, а подписчики сбрасывают свои
+кэши в памяти процесса. ``NOTIFY`` доставляется только после коммита
+транзакции. Для SQLite и тестов используется транспорт в памяти
+процесса (``INVALIDATION_TRANSPORT=local``).
+"""
+
+import json
+import logging
+import os
+import select
+import threading
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+
+import api.constants
+
+logger = logging.getLogger(__name__)
+
+
+class LocalTransport:
+    """Доставка только внутри процесса."""
+
+    def send(self, payload):
+        pass
+
+    def listen(self, deliver, reconnected, stop):
+        pass
+
+
+class PostgresTransport:
+    """LISTEN/NOTIFY на отдельном соединении psycopg2."""
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    def send(self, payload):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [self.channel, payload])
+
+    def listen(self, deliver, reconnected, stop):
+        import psycopg2
+
+        while not stop.is_set():
+            listener = None
+            try:
+                listener = psycopg2.connect(
+                    **connection.get_connection_params()
+                )
+                listener.set_session(autocommit=True)
+                with listener.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                # Сообщения, пропущенные без соединения, не восстановить.
+                reconnected()
+                while not stop.is_set():
+                    ready, _, _ = select.select(
+                        [listener], [], [], api.constants.INVALIDATION_POLL
+                    )
+                    if not ready:
+                        continue
+                    listener.poll()
+                    while listener.notifies:
+                        deliver(listener.notifies.pop(0).payload)
+            except psycopg2.Error as error:
+                logger.warning("Шина инвалидации недоступна: %s", error)
+                stop.wait(api.constants.INVALIDATION_RECONNECT_DELAY)
+            finally:
+                if listener is not None:
+                    listener.close()
+
+
+class InvalidationBus:
+    """Версии наборов данных в процессе и подписки на их изменение."""
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.versions = defaultdict(int)
+        self.listeners = defaultdict(list)
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.listener_pid = None
+        # False - слушатель запускается только явным start(): мастер
+        # gunicorn не должен держать поток и соединение к моменту fork.
+        self.autostart = True
+        self.origin_pid = None
+        self.token = None
+
+    @property
+    def origin(self) -> str:
+        """Метка процесса: свои сообщения доставляются без транспорта."""
+        if self.origin_pid != os.getpid():
+            self.origin_pid, self.token = os.getpid(), uuid.uuid4().hex
+        return self.token
+
+    def start(self):
+        """Запускает поток-слушатель; после fork - заново в воркере."""
+        with self.lock:
+            if self.listener_pid == os.getpid():
+                return
+            self.listener_pid = os.getpid()
+        threading.Thread(
+            target=self.transport.listen,
+            args=(self.receive, self.reset, self.stop),
+            name="invalidation-bus",
+            daemon=True,
+        ).start()
+
+    def subscribe(self, name, callback):
+        """``callback(keys)`` вызывается при изменении набора ``name``;
+        ``keys`` пустой, если устареть могло что угодно."""
+        self.listeners[name].append(callback)
+
+    def version(self, name) -> str:
+        """Версия набора для ключей локальных кэшей. Уникальна для
+        процесса, поэтому годится и для общего кэша."""
+        if self.autostart:
+            self.start()
+        return f"{self.origin}:{self.versions[name]}"
+
+    def publish(self, name, *keys):
+        """Рассылает изменение набора ``name`` после коммита."""
+        self.transport.send(
+            json.dumps({"origin": self.origin, "name": name, "keys": keys})
+        )
+        transaction.on_commit(lambda: self.deliver(name, keys))
+
+    def receive(self, payload):
+        message = json.loads(payload)
+        if message["origin"] != self.origin:
+            self.deliver(message["name"], message["keys"])
+
+    def deliver(self, name, keys):
+        with self.lock:
+            self.versions[name] += 1
+        for callback in self.listeners[name]:
+            try:
+                callback(keys)
+            except Exception:
+                logger.exception("Ошибка подписчика шины %s", name)
+
+    def reset(self):
+        for name in set(self.versions) | set(self.listeners):
+            self.deliver(name, ())
+
+
+def get_transport():
+    if settings.INVALIDATION_TRANSPORT == "postgres":
+        return PostgresTransport(api.constants.INVALIDATION_CHANNEL)
+    return LocalTransport()
+
+
+bus = InvalidationBus(get_transport())
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from api import overload, tasks
+from jobs.queue import enqueue
+
+
+class Command(BaseCommand):
+    help = " Удалить снова наполнившиеся токен-бакеты "
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--schedule",
+            action="store_true",
+            help="Поставить периодическую очистку в очередь задач",
+        )
+
+    def handle(self, *args, **options):
+        if options["schedule"]:
+            job = enqueue(
+                "api.prune_throttle_buckets", dedup_key=tasks.PRUNE_JOB_KEY
+            )
+            self.stdout.write(
+                self.style.SUCCESS(
+                    "Очистка поставлена в очередь"
+                    if job
+                    else "Очистка уже в очереди"
+                )
+            )
+            return
+        deleted = overload.prune_buckets()
+        self.stdout.write(self.style.SUCCESS(f"Удалено бакетов: {deleted}"))
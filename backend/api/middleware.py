@@ -0,0 +1,53 @@
+import asyncio
+
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+import api.constants
+
+
+class AnonymousCacheMiddleware:
+    """Заголовки для микрокэша nginx: анонимные GET-ответы каталога
+    кэшируются на несколько секунд, авторизованные - никогда.
+
+    Работает и под WSGI, и под ASGI: асинхронная цепочка не переключается
+    в поток ради этого middleware."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            # Так Django распознает middleware как корутину.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    @staticmethod
+    def is_cached(path) -> bool:
+        return path.startswith(tuple(api.constants.ANONYMOUS_CACHE_PATHS))
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
+        if not self.is_cached(request.path):
+            return response
+        patch_vary_headers(response, ("Authorization",))
+        if (
+            request.method in ("GET", "HEAD")
+            and response.status_code == 200
+            and "HTTP_AUTHORIZATION" not in request.META
+        ):
+            patch_cache_control(
+                response,
+                public=True,
+                max_age=api.constants.ANONYMOUS_CACHE_TTL,
+            )
+        else:
+            patch_cache_control(response, private=True, no_store=True)
+        return response
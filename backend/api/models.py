@@ -0,0 +1,16 @@
+from django.db import models
+
+
+class ThrottleBucket(models.Model):
+    """Состояние токен-бакета: общее для всех воркеров."""
+
+    key = models.CharField("Ключ", max_length=200, primary_key=True)
+    tokens = models.FloatField("Токены")
+    updated = models.FloatField("Обновлен (unix time)")
+
+    class Meta:
+        verbose_name = "Токен-бакет"
+        verbose_name_plural = "Токен-бакеты"
+
+    def __str__(self):
+        return self.key
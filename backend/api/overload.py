@@ -0,0 +1,295 @@
+"""Защита от перегрузки: бюджеты времени SQL, лимиты одновременных
+запросов и ограничение частоты записи.
+
+Один медленный запрос (сводка корзины, большая страница подписок) не
+должен занимать воркер gunicorn и соединение PostgreSQL бесконечно.
+Чтение и тяжелые действия вьюсетов выполняются в транзакции с ``SET
+LOCAL statement_timeout``; тяжелые действия ограничены числом одновременных
+запросов и сверх лимита сразу получают 503 с ``Retry-After``.
+Частота записи ограничена токен-бакетом, общим для всех воркеров.
+"""
+
+import functools
+import math
+import threading
+import time
+import zlib
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.core.cache import cache
+from django.db import OperationalError, connection, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.throttling import BaseThrottle
+
+import api.constants
+
+from .models import ThrottleBucket
+
+# SQLSTATE query_canceled: запрос прерван по statement_timeout.
+QUERY_CANCELED = "57014"
+
+
+class Overloaded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Сервис перегружен, повторите запрос позже."
+    default_code = "overloaded"
+
+    def __init__(self, detail=None, code=None):
+        super().__init__(detail, code)
+        self.wait = api.constants.OVERLOAD_RETRY_AFTER
+
+
+@contextmanager
+def statement_timeout(milliseconds):
+    """Транзакция с ограничением времени каждого SQL-запроса."""
+    if not milliseconds or connection.vendor != "postgresql":
+        yield
+        return
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SET LOCAL statement_timeout = %s", [int(milliseconds)]
+            )
+        yield
+
+
+def is_timeout(exc) -> bool:
+    return (
+        isinstance(exc, OperationalError)
+        and getattr(exc.__cause__, "pgcode", None) == QUERY_CANCELED
+    )
+
+
+class LocalLimiter:
+    """Слоты одновременных запросов внутри процесса."""
+
+    def __init__(self):
+        self.counts = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def acquire(self, key, limit):
+        """Занимает слот; возвращает функцию освобождения или None."""
+        with self.lock:
+            if self.counts[key] >= limit:
+                return None
+            self.counts[key] += 1
+        return functools.partial(self.release, key)
+
+    def release(self, key):
+        with self.lock:
+            self.counts[key] -= 1
+
+
+class AdvisoryLockLimiter:
+    """Слоты на все воркеры: сессионные advisory-локи PostgreSQL.
+    При обрыве соединения воркера лок снимается сам."""
+
+    def acquire(self, key, limit):
+        namespace = zlib.crc32(key.encode()) & 0x7FFFFFFF
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT slot FROM generate_series(0, %s) AS slot "
+                "WHERE pg_try_advisory_lock(%s, slot) LIMIT 1",
+                [limit - 1, namespace],
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        return functools.partial(self.release, namespace, row[0])
+
+    def release(self, namespace, slot):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_advisory_unlock(%s, %s)", [namespace, slot]
+            )
+
+
+def get_limiter():
+    if connection.vendor == "postgresql":
+        return AdvisoryLockLimiter()
+    return LocalLimiter()
+
+
+limiter = get_limiter()
+
+
+class ReleaseOnClose:
+    """Содержимое потокового ответа, освобождающее слот при закрытии
+    ответа. Django закрывает ответ в потоке вьюхи и под ASGI, поэтому
+    advisory-лок снимается в том же соединении, где был взят."""
+
+    def __init__(self, content, release):
+        self.content = content
+        self.release = release
+
+    def __iter__(self):
+        return iter(self.content)
+
+    def close(self):
+        try:
+            if hasattr(self.content, "close"):
+                self.content.close()
+        finally:
+            self.release()
+
+
+@contextmanager
+def protected(key, action):
+    """Лимит одновременных запросов и бюджет времени SQL действия
+    ``action`` вне вьюсета (асинхронные вьюхи), как у
+    ``OverloadProtectionMixin``."""
+    limit = api.constants.CONCURRENCY_LIMITS.get(action)
+    release = limiter.acquire(key, limit) if limit else None
+    if limit and release is None:
+        raise Overloaded()
+    try:
+        with statement_timeout(api.constants.STATEMENT_TIMEOUTS.get(action)):
+            yield
+    finally:
+        if release:
+            release()
+
+
+class OverloadProtectionMixin:
+    """Бюджет времени SQL и лимит одновременных запросов для действий
+    вьюсета (``STATEMENT_TIMEOUTS`` и ``CONCURRENCY_LIMITS``).
+
+    Аутентификация, права и троттлинг идут до транзакции с таймаутом:
+    строка ``ThrottleBucket`` обновляется в своей короткой транзакции и
+    не остается заблокированной до конца запроса."""
+
+    def dispatch(self, request, *args, **kwargs):
+        self.release_slot = None
+        try:
+            with ExitStack() as self.timeout:
+                response = super().dispatch(request, *args, **kwargs)
+        except BaseException:
+            self.release()
+            raise
+        if response.streaming and self.release_slot:
+            response.streaming_content = ReleaseOnClose(
+                response.streaming_content, self.release_slot
+            )
+        else:
+            self.release()
+        return response
+
+    def release(self):
+        if self.release_slot:
+            self.release_slot()
+            self.release_slot = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        limit = api.constants.CONCURRENCY_LIMITS.get(self.action)
+        if limit:
+            self.release_slot = limiter.acquire(
+                f"{type(self).__name__}.{self.action}", limit
+            )
+            if self.release_slot is None:
+                raise Overloaded()
+        self.timeout.enter_context(
+            statement_timeout(
+                api.constants.STATEMENT_TIMEOUTS.get(self.action)
+            )
+        )
+
+    def handle_exception(self, exc):
+        if is_timeout(exc):
+            if connection.in_atomic_block:
+                # Транзакция уже прервана базой: откатить, а не коммитить.
+                transaction.set_rollback(True)
+            exc = Overloaded()
+        return super().handle_exception(exc)
+
+
+class LocalBuckets:
+    """Токен-бакеты в кэше процесса: атомарны и общие только внутри
+    одного воркера, поэтому для разработки на SQLite."""
+
+    lock = threading.Lock()
+
+    def take(self, key, burst, rate, now):
+        """Забирает токен; возвращает None или сколько секунд ждать."""
+        with self.lock:
+            tokens, updated = cache.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens < 1:
+                return (1 - tokens) / rate
+            cache.set(key, (tokens - 1, now), math.ceil(burst / rate))
+        return None
+
+
+class DatabaseBuckets:
+    """Токен-бакеты в строках ``ThrottleBucket``: пополнение и списание
+    токена - один атомарный ``INSERT ... ON CONFLICT DO UPDATE``, так что
+    одновременные запросы разных воркеров не тратят один токен дважды."""
+
+    def take(self, key, burst, rate, now):
+        table = ThrottleBucket._meta.db_table
+        refilled = "LEAST(%s, b.tokens + (%s - b.updated) * %s)"
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} AS b (key, tokens, updated) "
+                "VALUES (%s, %s, %s) "
+                f"ON CONFLICT (key) DO UPDATE SET tokens = {refilled} - 1, "
+                "updated = EXCLUDED.updated "
+                f"WHERE {refilled} >= 1 RETURNING tokens",
+                [key, burst - 1, now, burst, now, rate, burst, now, rate],
+            )
+            if cursor.fetchone() is not None:
+                return None
+            cursor.execute(
+                f"SELECT {refilled} FROM {table} AS b WHERE key = %s",
+                [burst, now, rate, key],
+            )
+            row = cursor.fetchone()
+        return None if row is None else (1 - row[0]) / rate
+
+
+def prune_buckets(now=None) -> int:
+    """Удаляет бакеты, которые за время простоя снова наполнились:
+    полный бакет и отсутствие строки для ``take`` равнозначны."""
+    now = time.time() if now is None else now
+    full_after = (
+        api.constants.THROTTLE_WRITE_BURST / api.constants.THROTTLE_WRITE_RATE
+    )
+    deleted, _ = ThrottleBucket.objects.filter(
+        updated__lt=now - full_after
+    ).delete()
+    return deleted
+
+
+def get_buckets():
+    if connection.vendor == "postgresql":
+        return DatabaseBuckets()
+    return LocalBuckets()
+
+
+buckets = get_buckets()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Токен-бакет на пользователя и действие: ``THROTTLE_WRITE_BURST``
+    запросов подряд, дальше ``THROTTLE_WRITE_RATE`` в секунду."""
+
+    burst = api.constants.THROTTLE_WRITE_BURST
+    rate = api.constants.THROTTLE_WRITE_RATE
+    timer = time.time
+
+    def allow_request(self, request, view):
+        self.delay = None
+        if not request.user.is_authenticated:
+            return True
+        self.delay = buckets.take(
+            f"throttle:{view.action}:{request.user.pk}",
+            self.burst,
+            self.rate,
+            self.timer(),
+        )
+        return self.delay is None
+
+    def wait(self):
+        return self.delay
@@ -1,6 +1,10 @@
 from rest_framework.pagination import PageNumberPagination
 
+import api.constants
+
 
 class CustomPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = "limit"
+    # Большие выборки - через потоковую выгрузку /export/
+    max_page_size = api.constants.MAX_PAGE_SIZE
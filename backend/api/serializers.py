@@ -1,37 +1,78 @@
 import base64
+from urllib.parse import urlencode
 
 from django.core.files.base import ContentFile
+from django.db import transaction
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers, status
 from rest_framework.exceptions import ValidationError
 from rest_framework.fields import SerializerMethodField
+from rest_framework.serializers import ListSerializer
 
 import api.constants
 
+from recipes import shopping
+from recipes.storage import ContentHashStorage
 from recipes.models import (
     Favorite,
     Ingredient,
     IngredientRecipe,
+    MealPlanEntry,
     Recipe,
     ShoppingCart,
     Tag,
 )
-from users.models import User
+from users import data_export
+from users.models import DataExport, User
 
 
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith("data:image"):
-            format, imgstr = data.split(";base64,")
-            ext = format.split("/")[-1]
-
-            data = ContentFile(base64.b64decode(imgstr), name="temp." + ext)
+            imgstr = data.split(";base64,")[-1]
+            data = ContentFile(base64.b64decode(imgstr))
+            # Расширение - по формату изображения, а не по заголовку.
+            data.name = "temp" + ContentHashStorage.extension("", data)
 
         return super().to_internal_value(data)
 
 
-class UserSerializer(UserSerializer):
+def requested_fields(request, fields):
+    """Поля из ``fields``, оставшиеся после ``?fields=`` и ``?omit=``."""
+    if request is None:
+        return set(fields)
+    only = request.query_params.get("fields")
+    omit = request.query_params.get("omit")
+    result = set(fields)
+    if only:
+        result &= set(only.split(","))
+    if omit:
+        result -= set(omit.split(","))
+    return result
+
+
+class SparseFieldsMixin:
+    """Разреженный набор полей: ``?fields=id,name`` и ``?omit=text``.
+    Применяется только к сериализатору верхнего уровня."""
+
+    def is_root(self) -> bool:
+        parent = self.parent
+        if isinstance(parent, ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get("request")
+        if request is None or request.method != "GET" or not self.is_root():
+            return fields
+        keep = requested_fields(request, fields)
+        return {name: field for name, field in fields.items() if name in keep}
+
+
+class UserSerializer(SparseFieldsMixin, UserSerializer):
     """Сериализатор пользователя"""
 
     is_subscribed = SerializerMethodField(read_only=True)
@@ -49,7 +90,11 @@ class UserSerializer(UserSerializer):
 
     def get_is_subscribed(self, obj):
         request = self.context.get("request")
-        return obj.following.filter(user=request.user.id).exists()
+        if not request or request.user.is_anonymous:
+            return False
+        if hasattr(obj, "subscribed"):
+            return obj.subscribed
+        return obj.following.filter(user=request.user).exists()
 
 
 class UserCreateSerializer(UserCreateSerializer):
@@ -159,7 +204,7 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
         )
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeReadSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор просмотра рецепта"""
 
     tags = TagSerializer(read_only=False, many=True)
@@ -194,12 +239,16 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         request = self.context.get("request")
         if not request or request.user.is_anonymous:
             return False
+        if hasattr(obj, "favorited"):
+            return obj.favorited
         return obj.favorites.filter(user=request.user).exists()
 
     def get_is_in_shopping_cart(self, obj):
         request = self.context.get("request")
         if not request or request.user.is_anonymous:
             return False
+        if hasattr(obj, "in_shopping_cart"):
+            return obj.in_shopping_cart
         return obj.shopping_list.filter(user=request.user).exists()
 
 
@@ -274,13 +323,15 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
 
     def create_ingredients_amounts(self, ingredients, recipe):
         ingredient_list = [
-            IngredientRecipe(
-                ingredient=Ingredient.objects.get(id=ingredient["id"]),
-                recipe=recipe,
-                amount=ingredient["amount"],
+            (
+                IngredientRecipe(
+                    ingredient=Ingredient.objects.get(id=ingredient["id"]),
+                    recipe=recipe,
+                    amount=ingredient["amount"],
+                )
+                if Ingredient.objects.filter(id=ingredient["id"]).exists()
+                else None
             )
-            if Ingredient.objects.filter(id=ingredient["id"]).exists()
-            else None
             for ingredient in ingredients
         ]
         if not all(ingredient_list):
@@ -312,6 +363,7 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         self.create_ingredients_amounts(recipe=recipe, ingredients=ingredients)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         if not validated_data.get("ingredients"):
             raise serializers.ValidationError(
@@ -323,13 +375,14 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             )
         tags = validated_data.pop("tags")
         ingredients = validated_data.pop("ingredients")
+        before = shopping.live_totals(instance.id)
         instance = super().update(instance, validated_data)
-        instance.tags.clear()
         instance.tags.set(tags)
         instance.ingredients.clear()
         self.create_ingredients_amounts(
             recipe=instance, ingredients=ingredients
         )
+        shopping.recipe_ingredients_changed(instance.id, before)
         instance.save()
         return instance
 
@@ -339,6 +392,15 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         return RecipeReadSerializer(instance, context=context).data
 
 
+class DuplicateCheckSerializer(serializers.Serializer):
+    """Рецепт для проверки на дубликаты до публикации."""
+
+    name = serializers.CharField(
+        max_length=api.constants.LENGTH_OF_FIELDS_RECIPES
+    )
+    ingredients = IngredientInRecipeWriteSerializer(many=True)
+
+
 class LiteRecipeSerializer(serializers.ModelSerializer):
     image = Base64ImageField()
 
@@ -393,3 +455,44 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
         return LiteRecipeSerializer(
             instance.recipe, context={"request": self.context.get("request")}
         ).data
+
+
+class MealPlanEntrySerializer(serializers.ModelSerializer):
+    """Запись плана питания: рецепт, дата и порции."""
+
+    class Meta:
+        model = MealPlanEntry
+        fields = ("id", "recipe", "date", "servings")
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data["recipe"] = LiteRecipeSerializer(
+            instance.recipe, context=self.context
+        ).data
+        return data
+
+
+class PlanItemSerializer(serializers.Serializer):
+    """Позиция сводки покупок по плану питания."""
+
+    name = serializers.CharField()
+    measurement_unit = serializers.CharField()
+    amount = serializers.FloatField()
+
+
+class DataExportSerializer(serializers.ModelSerializer):
+    """Состояние выгрузки персональных данных и ссылка на готовый архив."""
+
+    url = SerializerMethodField()
+
+    class Meta:
+        model = DataExport
+        fields = ("id", "created", "finished", "size", "url")
+
+    def get_url(self, obj):
+        if obj.finished is None:
+            return None
+        query = urlencode({"token": data_export.download_token(obj)})
+        return self.context["request"].build_absolute_uri(
+            f"{reverse('api:users-download-export')}?{query}"
+        )
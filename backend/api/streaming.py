@@ -0,0 +1,77 @@
+"""Потоковые ответы, которые читают базу по ходу отдачи.
+
+Django 3.2 под ASGI перебирает ``StreamingHttpResponse`` прямо в потоке
+event loop, где ORM запрещен (``SynchronousOnlyOperation``): заголовки
+уже отправлены, а тело обрывается. В режиме ASGI генератор ответа
+выполняется целиком в отдельном потоке со своим соединением к базе, а
+готовые чанки передаются через очередь на ``STREAM_QUEUE_SIZE`` чанков,
+поэтому память по-прежнему не зависит от размера ответа.
+"""
+
+import queue
+import threading
+
+from django.conf import settings
+from django.db import connections
+
+import api.constants
+
+DONE = object()
+
+
+class ThreadedStream:
+    """Чанки генератора ``content``, вычисленные в отдельном потоке."""
+
+    def __init__(self, content):
+        self.content = content
+        self.chunks = queue.Queue(maxsize=api.constants.STREAM_QUEUE_SIZE)
+        self.stop = threading.Event()
+
+    def put(self, item) -> bool:
+        while not self.stop.is_set():
+            try:
+                self.chunks.put(item, timeout=api.constants.STREAM_PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce(self):
+        try:
+            for chunk in self.content:
+                if not self.put((chunk, None)):
+                    return
+            self.put((DONE, None))
+        except Exception as error:
+            self.put((None, error))
+        finally:
+            # Закрывает генератор (и его курсоры) в том же потоке.
+            if hasattr(self.content, "close"):
+                self.content.close()
+            connections.close_all()
+
+    def __iter__(self):
+        threading.Thread(
+            target=self.produce, name="stream", daemon=True
+        ).start()
+        try:
+            while True:
+                chunk, error = self.chunks.get()
+                if error is not None:
+                    raise error
+                if chunk is DONE:
+                    return
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        # Клиент отключился или ответ отдан: поток завершится сам.
+        self.stop.set()
+
+
+def stream(content):
+    """Содержимое потокового ответа, безопасное для режима сервера."""
+    if settings.SERVER_MODE == "asgi":
+        return ThreadedStream(content)
+    return content
@@ -0,0 +1,19 @@
+"""Фоновые задачи API (см. ``jobs.queue``)."""
+
+import api.constants
+from jobs.queue import enqueue, task
+
+from . import overload
+
+PRUNE_JOB_KEY = "throttle-prune"
+
+
+@task("api.prune_throttle_buckets")
+def prune_throttle_buckets():
+    # Следующий запуск ставится сразу, как у обновления аналитики.
+    enqueue(
+        "api.prune_throttle_buckets",
+        dedup_key=PRUNE_JOB_KEY,
+        delay=api.constants.THROTTLE_PRUNE_INTERVAL,
+    )
+    overload.prune_buckets()
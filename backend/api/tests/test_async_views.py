@@ -0,0 +1,75 @@
+import json
+from contextlib import contextmanager
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory, TestCase
+from rest_framework.authtoken.models import Token
+
+import api.constants
+from api import async_views, overload
+from recipes.models import Ingredient, Tag
+from users.models import User
+
+
+class AsyncViewsTest(TestCase):
+    """Асинхронные вьюхи отдают то же, что и вьюсеты."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        for name in ("мука пшеничная", "мука ржаная", "молоко"):
+            Ingredient.objects.create(name=name, measurement_unit="г")
+        Tag.objects.create(name="Завтрак", color="#E26C2D", slug="breakfast")
+
+    def assertSameAsViewSet(self, view, path):
+        response = async_to_sync(view)(self.factory.get(path))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            json.loads(response.content), self.client.get(path).json()
+        )
+
+    def test_ingredient_search(self):
+        for query in ("", "?name=мука", "?name=МУ", "?name=мука ржа"):
+            with self.subTest(query=query):
+                self.assertSameAsViewSet(
+                    async_views.ingredient_list, f"/api/ingredients/{query}"
+                )
+
+    def test_tags(self):
+        self.assertSameAsViewSet(async_views.tag_list, "/api/tags/")
+
+    def test_overload_protection(self):
+        timeouts = []
+
+        @contextmanager
+        def statement_timeout(milliseconds):
+            timeouts.append(milliseconds)
+            yield
+
+        user = User.objects.create_user(
+            email="user@a.ru", username="user", password="x"
+        )
+        token = Token.objects.create(user=user)
+        request = self.factory.get(
+            "/api/recipes/download_shopping_cart/",
+            HTTP_AUTHORIZATION=f"Token {token.key}",
+        )
+        view = async_to_sync(async_views.download_shopping_cart)
+        with mock.patch.object(
+            overload, "statement_timeout", statement_timeout
+        ):
+            self.assertEqual(view(request).status_code, 200)
+            async_to_sync(async_views.tag_list)(self.factory.get("/api/tags/"))
+            with mock.patch.object(
+                overload.limiter, "acquire", return_value=None
+            ):
+                response = view(request)
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response)
+        self.assertEqual(
+            timeouts,
+            [
+                api.constants.STATEMENT_TIMEOUTS["download_shopping_cart"],
+                api.constants.STATEMENT_TIMEOUTS["list"],
+            ],
+        )
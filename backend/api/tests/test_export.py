@@ -0,0 +1,73 @@
+import json
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+import api.constants
+from recipes.models import Ingredient, Recipe
+from users.models import User
+
+
+class CatalogExportTest(TestCase):
+    """Инкрементальная выгрузка каталога с ``?since=``."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="user@a.ru", username="user", password="x"
+        )
+        token = Token.objects.create(user=self.user)
+        self.auth = {"HTTP_AUTHORIZATION": f"Token {token.key}"}
+        self.since = timezone.now()
+
+    def export(self, path, since=None) -> list:
+        query = {} if since is None else {"since": since.isoformat()}
+        response = self.client.get(path, query, **self.auth)
+        self.assertEqual(response.status_code, 200)
+        return [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).splitlines()
+        ]
+
+    def test_since_overlaps_late_commits(self):
+        recipe = Recipe.objects.create(
+            author=self.user,
+            name="Блины",
+            image="recipes/image/x.png",
+            text="...",
+            cooking_time=10,
+        )
+        overlap = timedelta(seconds=api.constants.EXPORT_SINCE_OVERLAP)
+        # Строка закоммичена после прошлой выгрузки, но с меткой раньше.
+        Recipe.all_objects.filter(pk=recipe.pk).update(
+            updated=self.since - overlap / 2
+        )
+        Recipe.all_objects.create(
+            author=self.user,
+            name="Старый",
+            image="recipes/image/x.png",
+            text="...",
+            cooking_time=10,
+        )
+        Recipe.all_objects.filter(name="Старый").update(
+            updated=self.since - overlap * 2
+        )
+        rows = self.export("/api/recipes/export/", self.since)
+        self.assertEqual([row["id"] for row in rows], [recipe.pk])
+
+    def test_ingredient_tombstones(self):
+        kept = Ingredient.objects.create(name="мука", measurement_unit="г")
+        deleted = Ingredient.objects.create(name="соль", measurement_unit="г")
+        deleted_id = deleted.pk
+        deleted.delete()
+        kept.save()
+        rows = self.export("/api/ingredients/export/", self.since)
+        self.assertEqual(
+            [(row["id"], row.get("deleted", False)) for row in rows],
+            [(deleted_id, True), (kept.pk, False)],
+        )
+        self.assertEqual(
+            [row["id"] for row in self.export("/api/ingredients/export/")],
+            [kept.pk],
+        )
@@ -0,0 +1,120 @@
+from django.test import TestCase
+
+from recipes import nutrition
+from recipes.models import (
+    Ingredient,
+    IngredientNutrition,
+    IngredientRecipe,
+    Recipe,
+    Tag,
+)
+from users.models import User
+
+
+class NutritionFilterTest(TestCase):
+    """Фильтры по пищевой ценности и неполные данные о ценности."""
+
+    def setUp(self):
+        author = User.objects.create_user(
+            email="author@a.ru", username="author", password="x"
+        )
+        flour = Ingredient.objects.create(name="мука", measurement_unit="г")
+        salt = Ingredient.objects.create(name="соль", measurement_unit="г")
+        IngredientNutrition.objects.create(
+            ingredient=flour, calories=3, proteins=0.1, fats=0, carbohydrates=1
+        )
+        self.known = self.recipe(author, "Лепешка", {flour: 100})
+        self.unknown = self.recipe(author, "Соленая", {flour: 100, salt: 5})
+        nutrition.refresh_recipes([self.known.pk, self.unknown.pk])
+
+    @staticmethod
+    def recipe(author, name, amounts) -> Recipe:
+        recipe = Recipe.objects.create(
+            author=author,
+            name=name,
+            image="recipes/image/x.png",
+            text="...",
+            cooking_time=10,
+        )
+        for ingredient, amount in amounts.items():
+            IngredientRecipe.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=amount
+            )
+        return recipe
+
+    def names(self, query) -> set:
+        response = self.client.get(f"/api/recipes/?{query}")
+        self.assertEqual(response.status_code, 200)
+        return {recipe["name"] for recipe in response.json()["results"]}
+
+    def test_incomplete_nutrition_is_null(self):
+        self.known.refresh_from_db()
+        self.unknown.refresh_from_db()
+        self.assertAlmostEqual(self.known.calories, 300)
+        self.assertIsNone(self.unknown.calories)
+        self.assertIsNone(self.unknown.carbohydrates)
+
+    def test_filters_skip_unknown_nutrition(self):
+        self.assertEqual(self.names("max_calories=1000"), {"Лепешка"})
+        self.assertEqual(self.names("min_calories=100"), {"Лепешка"})
+        self.assertEqual(self.names("max_calories=100"), set())
+        self.assertEqual(self.names(""), {"Лепешка", "Соленая"})
+
+    def test_unknown_nutrition_is_null_in_response(self):
+        response = self.client.get(
+            f"/api/recipes/{self.unknown.pk}/nutrition/"
+        )
+        self.assertEqual(
+            response.json(),
+            dict.fromkeys(nutrition.NUTRIENTS),
+        )
+        response = self.client.get(f"/api/recipes/{self.known.pk}/nutrition/")
+        self.assertEqual(response.json()["calories"], 300)
+
+
+class TagMaskFilterTest(TestCase):
+    """Фильтр по маске тегов: любой или все выбранные теги."""
+
+    def setUp(self):
+        author = User.objects.create_user(
+            email="author@a.ru", username="author", password="x"
+        )
+        self.lunch = Tag.objects.create(
+            name="Обед", color="#111111", slug="lunch"
+        )
+        self.dinner = Tag.objects.create(
+            name="Ужин", color="#222222", slug="dinner"
+        )
+        for name, tags in (
+            ("Суп", [self.lunch]),
+            ("Рагу", [self.lunch, self.dinner]),
+            ("Каша", []),
+        ):
+            recipe = Recipe.objects.create(
+                author=author,
+                name=name,
+                image="recipes/image/x.png",
+                text="...",
+                cooking_time=10,
+            )
+            recipe.tags.set(tags)
+
+    def names(self, query) -> set:
+        response = self.client.get(f"/api/recipes/?{query}")
+        self.assertEqual(response.status_code, 200)
+        return {recipe["name"] for recipe in response.json()["results"]}
+
+    def test_any_and_all(self):
+        self.assertEqual(self.names("tags=lunch"), {"Суп", "Рагу"})
+        self.assertEqual(self.names("tags=dinner"), {"Рагу"})
+        self.assertEqual(
+            self.names("tags=lunch&tags=dinner&tags_match=all"), {"Рагу"}
+        )
+
+    def test_tag_without_bit(self):
+        Tag.objects.filter(pk=self.dinner.pk).update(bit=None)
+        self.assertEqual(self.names("tags=dinner"), set())
+        self.assertEqual(
+            self.names("tags=lunch&tags=dinner&tags_match=all"), set()
+        )
+        self.assertEqual(self.names("tags=lunch&tags=dinner"), {"Суп", "Рагу"})
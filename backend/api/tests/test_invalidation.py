@@ -0,0 +1,27 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from api.invalidation import InvalidationBus, LocalTransport
+
+
+class InvalidationBusTest(SimpleTestCase):
+    """Запуск слушателя шины."""
+
+    def test_version_starts_listener(self):
+        bus = InvalidationBus(LocalTransport())
+        with mock.patch("api.invalidation.threading.Thread") as thread:
+            bus.version("recipes")
+            bus.version("recipes")
+        thread.assert_called_once()
+
+    def test_no_autostart_before_fork(self):
+        bus = InvalidationBus(LocalTransport())
+        bus.autostart = False
+        with mock.patch("api.invalidation.threading.Thread") as thread:
+            first = bus.version("recipes")
+            bus.publish("recipes")
+            thread.assert_not_called()
+            bus.start()
+        thread.assert_called_once()
+        self.assertNotEqual(bus.version("recipes"), first)
@@ -0,0 +1,44 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from api.middleware import AnonymousCacheMiddleware
+
+
+class AnonymousCacheMiddlewareTest(SimpleTestCase):
+    """Заголовки микрокэша для анонимных и авторизованных запросов."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = AnonymousCacheMiddleware(
+            lambda request: HttpResponse()
+        )
+
+    def test_anonymous_catalog_is_public(self):
+        response = self.middleware(self.factory.get("/api/tags/"))
+        self.assertIn("public", response["Cache-Control"])
+        self.assertIn("max-age", response["Cache-Control"])
+        self.assertIn("Authorization", response["Vary"])
+        self.assertNotIn("Surrogate-Key", response)
+
+    def test_authorized_is_not_cached(self):
+        response = self.middleware(
+            self.factory.get("/api/recipes/", HTTP_AUTHORIZATION="Token abc")
+        )
+        self.assertIn("no-store", response["Cache-Control"])
+        self.assertIn("private", response["Cache-Control"])
+
+    def test_other_paths_untouched(self):
+        response = self.middleware(self.factory.get("/api/users/me/"))
+        self.assertNotIn("Cache-Control", response)
+
+    def test_async_chain(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        middleware = AnonymousCacheMiddleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(self.factory.get("/api/tags/"))
+        self.assertIn("public", response["Cache-Control"])
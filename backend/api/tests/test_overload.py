@@ -0,0 +1,102 @@
+from contextlib import contextmanager
+from unittest import mock
+
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+
+import api.constants
+from api import overload
+from api.models import ThrottleBucket
+from recipes.models import Recipe
+from users.models import User
+
+
+class TokenBucketTest(TestCase):
+    """Токен-бакеты троттлинга и их очистка."""
+
+    def test_bucket_refills_over_time(self):
+        buckets = overload.LocalBuckets()
+        for _ in range(3):
+            self.assertIsNone(buckets.take("test:refill", 3, 1, 100))
+        self.assertAlmostEqual(buckets.take("test:refill", 3, 1, 100), 1)
+        self.assertIsNone(buckets.take("test:refill", 3, 1, 101))
+
+    def test_prune_deletes_full_buckets(self):
+        full_after = (
+            api.constants.THROTTLE_WRITE_BURST
+            / api.constants.THROTTLE_WRITE_RATE
+        )
+        ThrottleBucket.objects.create(key="idle", tokens=0, updated=0)
+        ThrottleBucket.objects.create(key="busy", tokens=0, updated=full_after)
+        self.assertEqual(overload.prune_buckets(now=full_after + 1), 1)
+        self.assertEqual(
+            list(ThrottleBucket.objects.values_list("key", flat=True)),
+            ["busy"],
+        )
+
+
+class OverloadProtectionTest(TestCase):
+    """Троттлинг до транзакции с таймаутом, таймаут только для
+    перечисленных действий, лимит одновременных запросов."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="user@a.ru", username="user", password="x"
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.user,
+            name="Блины",
+            image="recipes/image/x.png",
+            text="...",
+            cooking_time=10,
+        )
+        token = Token.objects.create(user=self.user)
+        self.auth = {"HTTP_AUTHORIZATION": f"Token {token.key}"}
+        self.calls = []
+
+        @contextmanager
+        def statement_timeout(milliseconds):
+            self.calls.append(("timeout", milliseconds))
+            yield
+
+        patcher = mock.patch.object(
+            overload, "statement_timeout", statement_timeout
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_throttle_runs_before_timeout_transaction(self):
+        take = overload.buckets.take
+
+        def recording_take(*args):
+            self.calls.append(("throttle",))
+            return take(*args)
+
+        with mock.patch.object(overload.buckets, "take", recording_take):
+            response = self.client.post(
+                f"/api/recipes/{self.recipe.pk}/shopping_cart/", **self.auth
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.calls, [("throttle",), ("timeout", None)])
+
+    def test_timeout_for_listed_actions(self):
+        self.client.get("/api/recipes/")
+        self.client.get("/api/recipes/download_shopping_cart/", **self.auth)
+        self.assertEqual(
+            self.calls,
+            [
+                ("timeout", api.constants.STATEMENT_TIMEOUTS["list"]),
+                (
+                    "timeout",
+                    api.constants.STATEMENT_TIMEOUTS["download_shopping_cart"],
+                ),
+            ],
+        )
+
+    def test_concurrency_limit_returns_503(self):
+        with mock.patch.object(overload.limiter, "acquire", return_value=None):
+            response = self.client.get(
+                "/api/recipes/download_shopping_cart/", **self.auth
+            )
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response)
@@ -0,0 +1,103 @@
+import asyncio
+import shutil
+import tempfile
+
+from django.core.asgi import get_asgi_application
+from django.test import TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, IngredientRecipe, Recipe
+from users.models import User
+
+# Потоковые ответы, которые читают базу по ходу отдачи.
+ENDPOINTS = (
+    ("GET", "/api/ingredients/export/"),
+    ("GET", "/api/recipes/export/"),
+    # Небольшой архив отдается потоком, большой - 202 и фоновая задача.
+    ("POST", "/api/users/export/"),
+)
+
+
+async def request(application, method, path, token):
+    """Запрос к ASGI-приложению в процессе: статус, тело и ошибка, если
+    ответ оборвался."""
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "root_path": "",
+        "query_string": b"",
+        "headers": [
+            (b"host", b"localhost"),
+            (b"authorization", f"Token {token}".encode()),
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": ("localhost", 80),
+    }
+    error = None
+    try:
+        await application(scope, receive, send)
+    except Exception as exc:
+        error = exc
+    bodies = [m for m in messages if m["type"] == "http.response.body"]
+    if error is None and (not bodies or bodies[-1].get("more_body")):
+        error = "ответ не завершен"
+    return (
+        messages[0]["status"] if messages else None,
+        b"".join(m.get("body", b"") for m in bodies),
+        error,
+    )
+
+
+class AsgiStreamingTest(TransactionTestCase):
+    """Потоковые ответы отдаются целиком в режиме ASGI: генератор с
+    запросами к базе не выполняется в потоке event loop."""
+
+    def setUp(self):
+        exports = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, exports)
+        settings = override_settings(
+            SERVER_MODE="asgi", DATA_EXPORT_ROOT=exports
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        user = User.objects.create_user(
+            email="user@a.ru", username="user", password="x"
+        )
+        self.token = Token.objects.create(user=user).key
+        recipe = Recipe.objects.create(
+            author=user,
+            name="Блины",
+            image="recipes/image/x.png",
+            text="...",
+            cooking_time=10,
+        )
+        IngredientRecipe.objects.create(
+            recipe=recipe,
+            ingredient=Ingredient.objects.create(
+                name="мука", measurement_unit="г"
+            ),
+            amount=100,
+        )
+
+    def test_streaming_responses_complete(self):
+        application = get_asgi_application()
+        for method, path in ENDPOINTS:
+            with self.subTest(path=path):
+                status, body, error = asyncio.run(
+                    request(application, method, path, self.token)
+                )
+                self.assertIsNone(error)
+                self.assertIn(status, (200, 202))
+                self.assertTrue(body)
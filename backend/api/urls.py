@@ -1,7 +1,15 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
+from . import async_views
+from .views import (
+    IngredientViewSet,
+    MealPlanViewSet,
+    RecipeViewSet,
+    TagViewSet,
+    UserViewSet,
+)
 
 app_name = "api"
 
@@ -10,9 +18,26 @@ router.register("ingredients", IngredientViewSet, basename="ingredients")
 router.register("tags", TagViewSet, basename="tags")
 router.register("recipes", RecipeViewSet, basename="recipes")
 router.register("users", UserViewSet, basename="users")
+router.register("meal-plan", MealPlanViewSet, basename="meal-plan")
 
+urlpatterns = []
 
-urlpatterns = [
+if settings.ASYNC_VIEWS:
+    urlpatterns += [
+        path(
+            "recipes/download_shopping_cart/",
+            async_views.download_shopping_cart,
+            name="recipes-download-shopping-cart",
+        ),
+        path("tags/", async_views.tag_list, name="tags-list"),
+        path(
+            "ingredients/",
+            async_views.ingredient_list,
+            name="ingredients-list",
+        ),
+    ]
+
+urlpatterns += [
     path("", include(router.urls)),
     path("", include("djoser.urls")),
     path("auth/", include("djoser.urls.authtoken")),
@@ -0,0 +1,53 @@
+from django.http.response import (
+    FileResponse,
+    HttpResponse,
+    StreamingHttpResponse,
+)
+
+import api.constants
+from recipes import shopping
+from users import data_export
+
+from .streaming import stream
+
+
+def get_shopping_list_ingredients(user):
+    """Сводный список покупок пользователя: (название, единица, итог)."""
+    return list(shopping.shopping_list(user))
+
+
+def render_shopping_list(ingredients) -> str:
+    shopping_list = "Купить в магазине:"
+    for name, measurement_unit, amount in ingredients:
+        shopping_list += f"\n{name} ({measurement_unit}) - {amount:g}"
+    return shopping_list
+
+
+def shopping_list_response(shopping_list: str) -> HttpResponse:
+    file = api.constants.SHOPPING_LIST_NAME
+    response = HttpResponse(shopping_list, content_type="text/plain")
+    response["Content-Disposition"] = f'attachment; filename="{file}.txt"'
+    return response
+
+
+def archive_response(user) -> StreamingHttpResponse:
+    """ZIP с данными пользователя, собираемый по ходу отдачи."""
+    response = StreamingHttpResponse(
+        stream(data_export.archive(user)),
+        content_type=api.constants.DATA_EXPORT_CONTENT_TYPE,
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="foodgram-{user.username}.zip"'
+    )
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def export_file_response(export) -> FileResponse:
+    """Готовый архив выгрузки; файл отдается блоками, не целиком."""
+    return FileResponse(
+        data_export.storage.open(export.file, "rb"),
+        as_attachment=True,
+        filename=f"foodgram-{export.user.username}.zip",
+        content_type=api.constants.DATA_EXPORT_CONTENT_TYPE,
+    )
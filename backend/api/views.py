@@ -1,10 +1,19 @@
-from django.db.models import Sum
+from hashlib import md5
+from itertools import islice
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import BooleanField, Exists, OuterRef, Value
 from django.http.response import HttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.permissions import (
     AllowAny,
     IsAuthenticated,
@@ -13,32 +22,53 @@ from rest_framework.permissions import (
 from rest_framework.response import Response
 
 import api.constants
+from jobs.queue import enqueue
+from recipes import duplicates, nutrition, recommendations, shopping
+from recipes.importer import RecipeImporter
 from recipes.models import (
     Favorite,
     Ingredient,
-    IngredientRecipe,
     Recipe,
     ShoppingCart,
     Tag,
 )
+from users import data_export, graph
 from users.models import Follow, User
 
-from .filters import IngredientFilter, RecipeFilter
+from .cache import get_version
+from .export import export_response, ingredient_lines, recipe_lines
+from .filters import IngredientFilter, MealPlanFilter, RecipeFilter
+from .overload import OverloadProtectionMixin, TokenBucketThrottle
 from .pagination import CustomPagination
 from .permissions import AuthorPermission
 from .serializers import (
     CreateRecipeSerializer,
+    DataExportSerializer,
+    DuplicateCheckSerializer,
     FavoriteSerializer,
     IngredientSerializer,
+    LiteRecipeSerializer,
+    MealPlanEntrySerializer,
+    PlanItemSerializer,
     RecipeReadSerializer,
     ShoppingCartSerializer,
     SubscribeListSerializer,
     TagSerializer,
     UserSerializer,
+    requested_fields,
+)
+from .utils import (
+    archive_response,
+    export_file_response,
+    get_shopping_list_ingredients,
+    render_shopping_list,
+    shopping_list_response,
 )
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(
+    OverloadProtectionMixin, viewsets.ReadOnlyModelViewSet
+):
     """Вывод ингредиентов"""
 
     serializer_class = IngredientSerializer
@@ -48,8 +78,14 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ("^name",)
     pagination_class = None
 
+    @action(
+        detail=False, methods=["GET"], permission_classes=[IsAuthenticated]
+    )
+    def export(self, request):
+        return export_response(ingredient_lines, request)
+
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(OverloadProtectionMixin, viewsets.ReadOnlyModelViewSet):
     """Вывод тегов"""
 
     queryset = Tag.objects.all()
@@ -58,7 +94,7 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(OverloadProtectionMixin, viewsets.ModelViewSet):
     """Вывод работы с рецептами"""
 
     serializer_class = CreateRecipeSerializer
@@ -71,9 +107,39 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filterset_class = RecipeFilter
 
     def get_queryset(self):
-        return Recipe.objects.select_related("author").prefetch_related(
-            "ingredients", "tags"
+        queryset = Recipe.objects.all()
+        if self.action not in ("list", "retrieve"):
+            return queryset
+        fields = requested_fields(
+            self.request, RecipeReadSerializer.Meta.fields
         )
+        if "author" in fields:
+            queryset = queryset.select_related("author")
+        if "ingredients" in fields:
+            queryset = queryset.prefetch_related(
+                "ingredienttorecipe__ingredient"
+            )
+        if "tags" in fields:
+            queryset = queryset.prefetch_related("tags")
+        user = self.request.user
+        if user.is_authenticated:
+            if "is_favorited" in fields:
+                queryset = queryset.annotate(
+                    favorited=Exists(
+                        Favorite.objects.filter(
+                            recipe=OuterRef("pk"), user=user
+                        )
+                    )
+                )
+            if "is_in_shopping_cart" in fields:
+                queryset = queryset.annotate(
+                    in_shopping_cart=Exists(
+                        ShoppingCart.objects.filter(
+                            recipe=OuterRef("pk"), user=user
+                        )
+                    )
+                )
+        return queryset
 
     def get_serializer_class(
         self,
@@ -82,34 +148,166 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeReadSerializer
         return CreateRecipeSerializer
 
-    @staticmethod
-    def send_message(ingredients) -> HttpResponse:
-        shopping_list = "Купить в магазине:"
-        for ingredient in ingredients:
-            shopping_list += (
-                f"\n{ingredient['ingredient__name']} "
-                f"({ingredient['ingredient__measurement_unit']}) - "
-                f"{ingredient['amount']}"
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        if self.possible_duplicates:
+            response[api.constants.DUPLICATES_HEADER] = ",".join(
+                str(recipe_id) for recipe_id, _ in self.possible_duplicates
             )
-        file = api.constants.SHOPPING_LIST_NAME
-        response = HttpResponse(shopping_list, content_type="text/plain")
-        response["Content-Disposition"] = f'attachment; filename="{file}.txt"'
         return response
 
+    def perform_create(self, serializer):
+        recipe = serializer.save()
+        nutrition.refresh_recipes([recipe.pk])
+        signatures = duplicates.index_recipes([recipe.pk])
+        duplicates.schedule_pairs()
+        self.possible_duplicates = duplicates.find(
+            signatures[recipe.pk], exclude=recipe.pk
+        )
+
+    def perform_update(self, serializer):
+        recipe = serializer.save()
+        nutrition.refresh_recipes([recipe.pk])
+        enqueue(
+            "recipes.index_duplicates",
+            recipe.pk,
+            dedup_key=f"duplicates-{recipe.pk}",
+        )
+
+    def perform_destroy(self, instance):
+        instance.soft_delete()
+
+    def recipes_response(self, request, recipe_ids) -> Response:
+        recipes = Recipe.objects.in_bulk(recipe_ids)
+        serializer = LiteRecipeSerializer(
+            [recipes[pk] for pk in recipe_ids if pk in recipes],
+            many=True,
+            context={"request": request},
+        )
+        return Response(serializer.data)
+
+    @action(detail=True, methods=["GET"])
+    def nutrition(self, request, pk) -> Response:
+        """Пищевая ценность рецепта целиком."""
+        recipe = get_object_or_404(Recipe, id=pk)
+        return Response(nutrition.recipe_nutrition(recipe))
+
+    @action(detail=True, methods=["GET"])
+    def recommendations(self, request, pk) -> Response:
+        recipe = get_object_or_404(Recipe, id=pk)
+        recipe_ids = recommendations.index.for_recipe(
+            recipe.id, api.constants.RECOMMENDATIONS_LIMIT
+        )
+        return self.recipes_response(request, recipe_ids)
+
+    @action(
+        detail=False, methods=["GET"], permission_classes=[IsAuthenticated]
+    )
+    def recommended(self, request) -> Response:
+        recipe_ids = recommendations.index.for_user(
+            request.user, api.constants.RECOMMENDATIONS_LIMIT
+        )
+        return self.recipes_response(request, recipe_ids)
+
+    @action(
+        detail=False,
+        methods=["POST"],
+        url_path="duplicates",
+        permission_classes=[IsAuthenticated],
+    )
+    def check_duplicates(self, request) -> Response:
+        """Возможные дубликаты рецепта до публикации."""
+        serializer = DuplicateCheckSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        matches = duplicates.check(
+            serializer.validated_data["name"],
+            [item["id"] for item in serializer.validated_data["ingredients"]],
+        )
+        recipes = Recipe.objects.in_bulk(
+            [recipe_id for recipe_id, _ in matches]
+        )
+        matches = [
+            (recipes[recipe_id], score)
+            for recipe_id, score in matches
+            if recipe_id in recipes
+        ]
+        data = LiteRecipeSerializer(
+            [recipe for recipe, _ in matches],
+            many=True,
+            context={"request": request},
+        ).data
+        for item, (_, score) in zip(data, matches):
+            item["similarity"] = round(score, 2)
+        return Response(data)
+
     @action(detail=False, methods=["GET"])
-    def download_shopping_cart(self, request) -> HttpResponse:
-        ingredients = (
-            IngredientRecipe.objects.filter(
-                recipe__shopping_list__user=request.user
+    def facets(self, request) -> Response:
+        filterset = self.filterset_class(
+            request.GET, queryset=self.get_queryset(), request=request
+        )
+        if not filterset.is_valid():
+            return Response(
+                filterset.errors, status=status.HTTP_400_BAD_REQUEST
             )
-            .order_by("ingredient__name")
-            .values("ingredient__name", "ingredient__measurement_unit")
-            .annotate(amount=Sum("amount"))
+        if filterset.is_personal:
+            return Response(filterset.facets())
+        params = urlencode(sorted(request.GET.lists()), doseq=True)
+        key = "recipe-facets:{}:{}".format(
+            get_version("recipes"), md5(params.encode()).hexdigest()
         )
-        return self.send_message(ingredients)
+        data = cache.get(key)
+        if data is None:
+            data = filterset.facets()
+            cache.set(key, data, api.constants.FACETS_CACHE_TIMEOUT)
+        return Response(data)
 
     @action(
-        detail=True, methods=("POST",), permission_classes=[IsAuthenticated]
+        detail=False, methods=["GET"], permission_classes=[IsAuthenticated]
+    )
+    def export(self, request):
+        return export_response(recipe_lines, request)
+
+    @action(
+        detail=False,
+        methods=["POST"],
+        url_path="import",
+        permission_classes=[IsAuthenticated],
+    )
+    def import_recipes(self, request) -> Response:
+        """Импорт рецептов из тела запроса в NDJSON, по рецепту на строку."""
+        stream = request.stream or ()
+        report = RecipeImporter(request.user).run(
+            islice(stream, api.constants.IMPORT_MAX_LINES)
+        )
+        if stream and stream.readline():
+            report["errors"].append(
+                {
+                    "line": api.constants.IMPORT_MAX_LINES + 1,
+                    "errors": {
+                        "line": "Превышен лимит строк, остальное не "
+                        "импортировано"
+                    },
+                }
+            )
+        return Response(
+            report,
+            status=(
+                status.HTTP_201_CREATED
+                if report["created"]
+                else status.HTTP_400_BAD_REQUEST
+            ),
+        )
+
+    @action(detail=False, methods=["GET"])
+    def download_shopping_cart(self, request) -> HttpResponse:
+        ingredients = get_shopping_list_ingredients(request.user)
+        return shopping_list_response(render_shopping_list(ingredients))
+
+    @action(
+        detail=True,
+        methods=("POST",),
+        permission_classes=[IsAuthenticated],
+        throttle_classes=[TokenBucketThrottle],
     )
     def shopping_cart(self, request, pk):
         if not Recipe.objects.filter(id=pk).exists():
@@ -143,7 +341,10 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
-        detail=True, methods=("POST",), permission_classes=[IsAuthenticated]
+        detail=True,
+        methods=("POST",),
+        permission_classes=[IsAuthenticated],
+        throttle_classes=[TokenBucketThrottle],
     )
     def favorite(self, request, pk):
         if Recipe.objects.filter(id=pk).exists():
@@ -171,7 +372,64 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
-class UserViewSet(UserViewSet):
+class MealPlanViewSet(OverloadProtectionMixin, viewsets.ModelViewSet):
+    """План питания пользователя и сводка покупок по неделям"""
+
+    serializer_class = MealPlanEntrySerializer
+    permission_classes = (IsAuthenticated,)
+    pagination_class = CustomPagination
+    filter_backends = (DjangoFilterBackend,)
+    filterset_class = MealPlanFilter
+
+    def get_queryset(self):
+        return self.request.user.meal_plan.select_related("recipe")
+
+    # Запись и итоги недели меняются в одной транзакции.
+    @transaction.atomic
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        serializer.save()
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+
+    def requested_week(self, request):
+        week = request.query_params.get("week")
+        if not week:
+            return timezone.localdate()
+        value = parse_date(week)
+        if value is None:
+            raise ValidationError({"week": "Ожидается дата ГГГГ-ММ-ДД"})
+        return value
+
+    def plan_items(self, request):
+        return shopping.plan_shopping_list(
+            request.user, self.requested_week(request)
+        )
+
+    @action(detail=False, methods=["GET"])
+    def shopping_list(self, request) -> Response:
+        serializer = PlanItemSerializer(
+            [
+                {"name": name, "measurement_unit": unit, "amount": amount}
+                for name, unit, amount in self.plan_items(request)
+            ],
+            many=True,
+        )
+        return Response(serializer.data)
+
+    @action(detail=False, methods=["GET"])
+    def download_shopping_list(self, request) -> HttpResponse:
+        return shopping_list_response(
+            render_shopping_list(self.plan_items(request))
+        )
+
+
+class UserViewSet(OverloadProtectionMixin, UserViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     pagination_class = CustomPagination
@@ -183,13 +441,41 @@ class UserViewSet(UserViewSet):
             "me",
             "subscriptions",
             "subscribe",
+            "suggestions",
+            "export_data",
         ]:
             return [IsAuthenticated()]
         return [AllowAny()]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if (
+            self.action in ("list", "retrieve")
+            and user.is_authenticated
+            and "is_subscribed"
+            in requested_fields(self.request, UserSerializer.Meta.fields)
+        ):
+            queryset = queryset.annotate(
+                subscribed=Exists(
+                    Follow.objects.filter(author=OuterRef("pk"), user=user)
+                )
+            )
+        return queryset
+
+    def get_instance(self):
+        user = super().get_instance()
+        # На себя подписаться нельзя (ограничение no_self_follow).
+        user.subscribed = False
+        return user
+
+    def perform_destroy(self, instance):
+        instance.soft_delete()
+
     @action(
         detail=True,
         methods=["POST"],
+        throttle_classes=[TokenBucketThrottle],
     )
     def subscribe(self, request, id):
         user = request.user
@@ -214,10 +500,56 @@ class UserViewSet(UserViewSet):
         following.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(detail=False)
+    def suggestions(self, request) -> Response:
+        author_ids = graph.index.suggest(
+            request.user.id, api.constants.SUGGESTIONS_LIMIT
+        )
+        authors = User.objects.in_bulk(author_ids)
+        serializer = UserSerializer(
+            [authors[pk] for pk in author_ids if pk in authors],
+            many=True,
+            context={"request": request},
+        )
+        return Response(serializer.data)
+
+    @action(detail=False, methods=["GET", "POST"], url_path="export")
+    def export_data(self, request) -> Response:
+        """POST - выгрузка персональных данных: небольшой архив сразу
+        потоком, большой - фоновой задачей (202). GET - последняя
+        выгрузка и ссылка на архив, когда он готов."""
+        user = request.user
+        if request.method == "POST":
+            if data_export.is_small(user):
+                return archive_response(user)
+            export = data_export.request_export(user)
+            response_status = status.HTTP_202_ACCEPTED
+        else:
+            export = user.data_exports.first()
+            if export is None:
+                raise NotFound("Выгрузка не запрашивалась")
+            response_status = status.HTTP_200_OK
+        return Response(
+            DataExportSerializer(export, context={"request": request}).data,
+            status=response_status,
+        )
+
+    @action(detail=False, url_path="export/download")
+    def download_export(self, request):
+        export = data_export.from_token(request.query_params.get("token", ""))
+        if export is None:
+            raise NotFound("Ссылка недействительна или устарела")
+        try:
+            return export_file_response(export)
+        except FileNotFoundError:
+            raise NotFound("Архив удален")
+
     @action(detail=False)
     def subscriptions(self, request):
         user = request.user
-        queryset = User.objects.filter(following__user=user)
+        queryset = User.objects.filter(following__user=user).annotate(
+            subscribed=Value(True, output_field=BooleanField())
+        )
         pages = self.paginate_queryset(queryset)
         serializer = SubscribeListSerializer(
             pages, many=True, context={"request": request}
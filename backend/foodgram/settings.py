@@ -25,14 +25,21 @@ INSTALLED_APPS = [
     "users.apps.UsersConfig",
     "recipes.apps.RecipesConfig",
     "api.apps.ApiConfig",
+    "jobs.apps.JobsConfig",
+    "analytics.apps.AnalyticsConfig",
     "rest_framework",
     "rest_framework.authtoken",
     "django_filters",
     "djoser",
-    "drf_yasg",
     "colorfield",
+    "admin_auto_filters",
 ]
 
+# drf_yasg нужен только для генерации схемы API; без него воркеры
+# стартуют быстрее.
+if env.bool("API_SCHEMA", default=False):
+    INSTALLED_APPS.append("drf_yasg")
+
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -41,6 +48,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "api.middleware.AnonymousCacheMiddleware",
 ]
 
 ROOT_URLCONF = "foodgram.urls"
@@ -62,6 +70,12 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "foodgram.wsgi.application"
+ASGI_APPLICATION = "foodgram.asgi.application"
+
+# Режим запуска сервера: "wsgi" (sync gunicorn) или "asgi" (uvicorn workers).
+SERVER_MODE = env.str("SERVER_MODE", default="wsgi")
+# Асинхронные версии read-эндпоинтов и выгрузки списка покупок.
+ASYNC_VIEWS = env.bool("ASYNC_VIEWS", default=SERVER_MODE == "asgi")
 
 
 if DEBUG:
@@ -74,6 +88,17 @@ if DEBUG:
 else:
     DATABASES = {"default": env.dj_db_url("DATABASE_URL")}
 
+# Транспорт шины инвалидации кэшей между воркерами: "postgres"
+# (LISTEN/NOTIFY) или "local" (в памяти процесса).
+INVALIDATION_TRANSPORT = env.str(
+    "INVALIDATION_TRANSPORT",
+    default=(
+        "postgres"
+        if "postgresql" in DATABASES["default"]["ENGINE"]
+        else "local"
+    ),
+)
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -95,7 +120,7 @@ REST_FRAMEWORK = {
         "rest_framework.permissions.AllowAny",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachedTokenAuthentication",
     ],
 }
 
@@ -127,5 +152,10 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 STATIC_URL = "/static/"
 STATIC_ROOT = os.path.join(BASE_DIR, "static")
 
+# Адрес nginx для обновления микрокэша; пустой - обновление выключено
+EDGE_CACHE_URL = env.str("EDGE_CACHE_URL", default="")
+
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+# Архивы персональных данных; nginx их не раздает, только API по ссылке
+DATA_EXPORT_ROOT = os.path.join(BASE_DIR, "exports")
@@ -0,0 +1,48 @@
+import time
+
+from django.db import DatabaseError
+from django.urls import get_resolver
+
+
+def resolve_urls():
+    get_resolver()._populate()
+
+
+def import_views():
+    import api.views  # noqa: F401
+    import recipes.admin  # noqa: F401
+
+
+def load_recommendations():
+    from recipes import recommendations
+
+    recommendations.index.refresh()
+
+
+def load_follow_graph():
+    from users import graph
+
+    graph.index.refresh()
+
+
+WARM_UP_STEPS = (
+    ("urls", resolve_urls),
+    ("views", import_views),
+    ("recommendations", load_recommendations),
+    ("follow_graph", load_follow_graph),
+)
+
+
+def warm_up():
+    """Прогрев резолвера URL, модулей и кэшей процесса. Возвращает
+    время каждого шага."""
+    timings = []
+    for name, step in WARM_UP_STEPS:
+        started = time.monotonic()
+        try:
+            step()
+        except DatabaseError:
+            # База может быть еще недоступна: кэш загрузится по запросу.
+            continue
+        timings.append((name, time.monotonic() - started))
+    return timings
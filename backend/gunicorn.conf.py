@@ -0,0 +1,82 @@
+"""Настройки gunicorn из переменных окружения.
+
+    gunicorn -c gunicorn.conf.py
+
+SERVER_MODE=asgi включает uvicorn-воркеры (см. foodgram/asgi.py).
+"""
+
+import multiprocessing
+import os
+import time
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def env_bool(name, default):
+    return os.environ.get(name, str(default)).lower() in ("1", "true", "yes")
+
+
+server_mode = os.environ.get("SERVER_MODE", "wsgi")
+
+if server_mode == "asgi":
+    wsgi_app = "foodgram.asgi:application"
+    default_worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "foodgram.wsgi:application"
+    default_worker_class = "sync"
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", default_worker_class)
+workers = env_int("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1)
+threads = env_int("GUNICORN_THREADS", 1)
+preload_app = env_bool("GUNICORN_PRELOAD", True)
+# Перезапуск воркеров против утечек памяти; jitter разносит рестарты
+max_requests = env_int("GUNICORN_MAX_REQUESTS", 1000)
+max_requests_jitter = env_int("GUNICORN_MAX_REQUESTS_JITTER", 100)
+timeout = env_int("GUNICORN_TIMEOUT", 30)
+graceful_timeout = env_int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+keepalive = env_int("GUNICORN_KEEPALIVE", 5)
+accesslog = os.environ.get("GUNICORN_ACCESSLOG", "-")
+
+started = time.monotonic()
+
+
+def when_ready(server):
+    # С preload_app приложение уже загружено в мастере: прогретые здесь
+    # данные достаются воркерам через fork без повторной загрузки.
+    if preload_app:
+        from django.db import connections
+
+        from api.invalidation import bus
+        from foodgram.warmup import warm_up
+
+        # Шину слушают воркеры (post_worker_init), а не мастер: поток и
+        # его соединение не переживают fork.
+        bus.autostart = False
+        for name, seconds in warm_up():
+            server.log.info("Прогрев %s: %.3f с", name, seconds)
+        # Соединения мастера не должны достаться воркерам.
+        connections.close_all()
+    server.log.info("Мастер готов за %.3f с", time.monotonic() - started)
+
+
+def post_fork(server, worker):
+    # Каждый воркер открывает свои соединения с БД при первом запросе.
+    if preload_app:
+        from django.db import connections
+
+        connections.close_all()
+
+
+def post_worker_init(worker):
+    # Слушатель шины инвалидации - свой в каждом воркере.
+    from api.invalidation import bus
+
+    bus.start()
+    worker.log.info(
+        "Воркер %s готов через %.3f с после старта мастера",
+        worker.pid,
+        time.monotonic() - started,
+    )
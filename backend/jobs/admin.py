@@ -0,0 +1,36 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Job
+from .queue import requeueable
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "name",
+        "status",
+        "attempts",
+        "run_at",
+        "created",
+        "finished",
+        "worker",
+    )
+    list_filter = ("status", "name")
+    search_fields = ("name", "dedup_key")
+    readonly_fields = (
+        "started",
+        "heartbeat",
+        "finished",
+        "worker",
+        "last_error",
+    )
+    show_full_result_count = False
+    actions = ("retry",)
+
+    @admin.action(description="Повторить выбранные задачи")
+    def retry(self, request, queryset):
+        requeueable().filter(pk__in=queryset, status=Job.FAILED).update(
+            status=Job.QUEUED, run_at=timezone.now(), attempts=0
+        )
@@ -0,0 +1,68 @@
+import json
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+import api.constants
+from jobs.queue import Worker, stats
+
+
+class Command(BaseCommand):
+    help = " Выполнять фоновые задачи из очереди "
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threads", type=int, default=api.constants.JOBS_THREADS
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help="Число процессов-воркеров, у каждого свой пул потоков",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Выполнить готовые задачи и завершиться",
+        )
+        parser.add_argument(
+            "--stats",
+            action="store_true",
+            help="Вывести состояние очереди и завершиться",
+        )
+
+    def report(self, metrics):
+        self.stdout.write(json.dumps(metrics, ensure_ascii=False))
+
+    def work(self, options):
+        worker = Worker(threads=options["threads"], report=self.report)
+        # Текущие задачи дорабатываются, новые не берутся.
+        signal.signal(signal.SIGTERM, lambda *args: worker.stop.set())
+        signal.signal(signal.SIGINT, lambda *args: worker.stop.set())
+        worker.run(once=options["once"])
+
+    def handle(self, *args, **options):
+        if options["stats"]:
+            self.stdout.write(
+                json.dumps(stats(), ensure_ascii=False, indent=2)
+            )
+            return
+        if options["processes"] <= 1:
+            self.work(options)
+            return
+        # Соединения родителя не должны достаться дочерним процессам.
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        children = [
+            context.Process(target=self.work, args=(options,))
+            for _ in range(options["processes"])
+        ]
+        for child in children:
+            child.start()
+        signal.signal(
+            signal.SIGTERM, lambda *args: [c.terminate() for c in children]
+        )
+        for child in children:
+            child.join()
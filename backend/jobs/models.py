@@ -0,0 +1,54 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """Фоновая задача в очереди."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = (
+        (QUEUED, "В очереди"),
+        (RUNNING, "Выполняется"),
+        (DONE, "Выполнена"),
+        (FAILED, "Ошибка"),
+    )
+
+    name = models.CharField("Задача", max_length=200)
+    args = models.JSONField("Аргументы", default=list)
+    status = models.CharField(
+        "Статус", max_length=16, choices=STATUSES, default=QUEUED
+    )
+    dedup_key = models.CharField(
+        "Ключ дедупликации", max_length=200, null=True, blank=True
+    )
+    attempts = models.PositiveSmallIntegerField("Попытки", default=0)
+    max_attempts = models.PositiveSmallIntegerField("Максимум попыток")
+    run_at = models.DateTimeField("Запустить после", default=timezone.now)
+    created = models.DateTimeField("Создана", default=timezone.now)
+    started = models.DateTimeField("Начата", null=True, blank=True)
+    heartbeat = models.DateTimeField("Пульс воркера", null=True, blank=True)
+    finished = models.DateTimeField("Завершена", null=True, blank=True)
+    worker = models.CharField("Воркер", max_length=200, blank=True)
+    last_error = models.TextField("Последняя ошибка", blank=True)
+
+    class Meta:
+        ordering = ("-id",)
+        verbose_name = "Задача"
+        verbose_name_plural = "Задачи"
+        indexes = (
+            models.Index(fields=("status", "run_at"), name="job_claim_idx"),
+        )
+        constraints = (
+            models.UniqueConstraint(
+                fields=("dedup_key",),
+                condition=Q(status="queued"),
+                name="unique_queued_job_dedup_key",
+            ),
+        )
+
+    def __str__(self) -> str:
+        return f"{self.name} #{self.pk} ({self.status})"
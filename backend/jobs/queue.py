@@ -0,0 +1,303 @@
+"""Очередь фоновых задач в таблице ``Job``.
+
+Задача ставится в той же транзакции, что и изменение данных, и видна
+воркерам только после коммита. Воркеры (команда ``run_worker``)
+забирают задачи через ``SELECT ... FOR UPDATE SKIP LOCKED``: несколько
+процессов не получают одну задачу и не ждут друг друга, внешний брокер
+не нужен. Упавшая задача повторяется с экспоненциальной задержкой,
+``dedup_key`` не дает поставить вторую такую же задачу, пока первая ждет
+в очереди. Пока задача выполняется, воркер обновляет ее пульс; задачу
+без пульса (воркер упал) другой воркер возвращает в очередь, как бы
+долго она ни работала до этого.
+"""
+
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.db import (
+    IntegrityError,
+    close_old_connections,
+    connection,
+    transaction,
+)
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+import api.constants
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+def task(name, max_attempts=None):
+    """Регистрирует функцию как задачу ``name``. Аргументы задачи
+    хранятся в JSON."""
+
+    def register(func):
+        func.max_attempts = max_attempts or api.constants.JOBS_MAX_ATTEMPTS
+        TASKS[name] = func
+        return func
+
+    return register
+
+
+def enqueue(name, *args, dedup_key=None, delay=0):
+    """Ставит задачу в очередь. Возвращает задачу или None, если такая
+    же (с тем же ``dedup_key``) уже ждет выполнения."""
+    func = TASKS.get(name)
+    job = Job(
+        name=name,
+        args=list(args),
+        dedup_key=dedup_key,
+        max_attempts=getattr(
+            func, "max_attempts", api.constants.JOBS_MAX_ATTEMPTS
+        ),
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+    if dedup_key is None:
+        job.save()
+        return job
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        return None
+    return job
+
+
+def backoff(attempts) -> float:
+    """Задержка перед повтором: экспонента с потолком и случайным
+    разбросом, чтобы повторы не приходили пачкой."""
+    delay = min(
+        api.constants.JOBS_BACKOFF_BASE * 2 ** (attempts - 1),
+        api.constants.JOBS_BACKOFF_MAX,
+    )
+    return delay * random.uniform(0.5, 1)
+
+
+def requeueable():
+    """Задачи, которые можно вернуть в очередь: нет ожидающего дубля."""
+    queued_keys = Job.objects.filter(
+        status=Job.QUEUED, dedup_key__isnull=False
+    ).values("dedup_key")
+    return Job.objects.exclude(dedup_key__in=queued_keys)
+
+
+def stats() -> dict:
+    """Состояние очереди: число задач по статусам и задержка старейшей
+    готовой к запуску задачи, секунды."""
+    now = timezone.now()
+    counts = defaultdict(dict)
+    for row in Job.objects.values("name", "status").annotate(
+        count=Count("id")
+    ):
+        counts[row["name"]][row["status"]] = row["count"]
+    oldest = Job.objects.filter(status=Job.QUEUED, run_at__lte=now).aggregate(
+        oldest=Min("run_at")
+    )["oldest"]
+    return {
+        "tasks": dict(counts),
+        "lag": (now - oldest).total_seconds() if oldest else 0,
+    }
+
+
+class Metrics:
+    """Счетчики воркера по задачам: выполнено, повторы, ошибки, время."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tasks = defaultdict(
+            lambda: {"done": 0, "retried": 0, "failed": 0, "seconds": 0.0}
+        )
+
+    def record(self, name, outcome, seconds):
+        with self.lock:
+            counters = self.tasks[name]
+            counters[outcome] += 1
+            counters["seconds"] += seconds
+
+    def snapshot(self) -> dict:
+        snapshot = {}
+        with self.lock:
+            for name, counters in self.tasks.items():
+                runs = sum(
+                    counters[outcome]
+                    for outcome in ("done", "retried", "failed")
+                )
+                snapshot[name] = dict(
+                    counters,
+                    seconds=round(counters["seconds"], 3),
+                    mean=round(counters["seconds"] / max(1, runs), 3),
+                )
+        return snapshot
+
+
+class Worker:
+    """Забирает задачи из очереди и выполняет их в пуле потоков."""
+
+    def __init__(self, threads=None, report=None):
+        self.threads = threads or api.constants.JOBS_THREADS
+        self.report = report
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.metrics = Metrics()
+        self.stop = threading.Event()
+        self.maintained = 0
+        self.beaten = 0
+
+    def claim(self, limit) -> list:
+        now = timezone.now()
+        queued = Job.objects.filter(
+            status=Job.QUEUED, run_at__lte=now
+        ).order_by("run_at", "id")
+        claimed = {
+            "status": Job.RUNNING,
+            "started": now,
+            "heartbeat": now,
+            "attempts": F("attempts") + 1,
+            "worker": self.name,
+        }
+        if not connection.features.has_select_for_update_skip_locked:
+            # SQLite: без блокировок строк задачу забирает условный UPDATE.
+            jobs = [
+                job
+                for job in queued[:limit]
+                if Job.objects.filter(pk=job.pk, status=Job.QUEUED).update(
+                    **claimed
+                )
+            ]
+        else:
+            with transaction.atomic():
+                jobs = list(queued.select_for_update(skip_locked=True)[:limit])
+                Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                    **claimed
+                )
+        for job in jobs:
+            job.attempts += 1
+        return jobs
+
+    def execute(self, job):
+        started = time.monotonic()
+        func = TASKS.get(job.name)
+        try:
+            if func is None:
+                raise LookupError(f"Неизвестная задача {job.name}")
+            func(*job.args)
+        except Exception:
+            outcome = self.failed(
+                job, traceback.format_exc(), retry=func is not None
+            )
+        else:
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.DONE, finished=timezone.now()
+            )
+            outcome = "done"
+        finally:
+            close_old_connections()
+        self.metrics.record(job.name, outcome, time.monotonic() - started)
+
+    def failed(self, job, error, retry=True) -> str:
+        logger.warning("Задача %s упала:\n%s", job, error)
+        now = timezone.now()
+        if (
+            retry
+            and job.attempts < job.max_attempts
+            and requeueable()
+            .filter(pk=job.pk)
+            .update(
+                status=Job.QUEUED,
+                run_at=now + timedelta(seconds=backoff(job.attempts)),
+                worker="",
+                last_error=error,
+            )
+        ):
+            return "retried"
+        # Попытки кончились или в очереди уже есть такая же задача.
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.FAILED, finished=now, last_error=error
+        )
+        return "failed"
+
+    def heartbeat(self, job_ids):
+        """Раз в JOBS_HEARTBEAT_INTERVAL отмечает выполняемые задачи:
+        долгая задача живого воркера не считается брошенной."""
+        if not job_ids or time.monotonic() - self.beaten < (
+            api.constants.JOBS_HEARTBEAT_INTERVAL
+        ):
+            return
+        self.beaten = time.monotonic()
+        Job.objects.filter(
+            pk__in=job_ids, status=Job.RUNNING, worker=self.name
+        ).update(heartbeat=timezone.now())
+
+    def maintain(self):
+        """Раз в JOBS_METRICS_INTERVAL: возвращает в очередь задачи без
+        пульса (воркер упал), удаляет старые выполненные, пишет метрики."""
+        if time.monotonic() - self.maintained < (
+            api.constants.JOBS_METRICS_INTERVAL
+        ):
+            return
+        self.maintained = time.monotonic()
+        now = timezone.now()
+        stale_timeout = timedelta(seconds=api.constants.JOBS_STALE_TIMEOUT)
+        deadline = now - stale_timeout
+        stale = Job.objects.filter(
+            Q(heartbeat__lt=deadline)
+            | Q(heartbeat__isnull=True, started__lt=deadline),
+            status=Job.RUNNING,
+        )
+        requeueable().filter(
+            pk__in=stale, attempts__lt=F("max_attempts")
+        ).update(status=Job.QUEUED, run_at=now, worker="")
+        stale.update(
+            status=Job.FAILED, finished=now, last_error="Воркер не ответил"
+        )
+        Job.objects.filter(
+            status=Job.DONE,
+            finished__lt=now - timedelta(seconds=api.constants.JOBS_RETENTION),
+        ).delete()
+        if self.report:
+            self.report({"worker": self.name, **self.metrics.snapshot()})
+
+    def run(self, once=False):
+        """Обрабатывает задачи до ``stop``; с ``once`` - пока в очереди
+        есть готовые к запуску задачи."""
+        running = {}
+        with ThreadPoolExecutor(self.threads) as pool:
+            while not self.stop.is_set():
+                self.maintain()
+                running = {
+                    future: pk
+                    for future, pk in running.items()
+                    if not future.done()
+                }
+                self.heartbeat(list(running.values()))
+                free = self.threads - len(running)
+                jobs = self.claim(free) if free else []
+                running.update(
+                    (pool.submit(self.execute, job), job.pk) for job in jobs
+                )
+                if jobs and len(running) < self.threads:
+                    continue
+                if running:
+                    wait(
+                        running,
+                        timeout=api.constants.JOBS_POLL_INTERVAL,
+                        return_when=FIRST_COMPLETED,
+                    )
+                elif once:
+                    break
+                else:
+                    self.stop.wait(api.constants.JOBS_POLL_INTERVAL)
+        if self.report:
+            self.report({"worker": self.name, **self.metrics.snapshot()})
@@ -0,0 +1,68 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+import api.constants
+from jobs.models import Job
+from jobs.queue import Worker, enqueue, task
+
+calls = []
+
+
+@task("tests.record")
+def record(value):
+    calls.append(value)
+
+
+class QueueTest(TestCase):
+    """Постановка, захват и возврат брошенных задач."""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_dedup_only_while_queued(self):
+        self.assertIsNotNone(enqueue("tests.record", 1, dedup_key="one"))
+        self.assertIsNone(enqueue("tests.record", 2, dedup_key="one"))
+        Worker().claim(10)
+        self.assertIsNotNone(enqueue("tests.record", 3, dedup_key="one"))
+        self.assertEqual(Job.objects.count(), 2)
+
+    def test_claim_once_and_not_before_run_at(self):
+        for value in range(3):
+            enqueue("tests.record", value)
+        enqueue("tests.record", 9, delay=60)
+        first, second = Worker(), Worker()
+        second.name += ":2"
+        claimed = first.claim(2) + second.claim(10)
+        self.assertEqual(len({job.pk for job in claimed}), 3)
+        self.assertEqual(Job.objects.filter(status=Job.QUEUED).get().args, [9])
+
+    def test_execute(self):
+        worker = Worker()
+        enqueue("tests.record", "ok")
+        enqueue("tests.missing")
+        with self.assertLogs("jobs.queue", "WARNING"):
+            for job in worker.claim(10):
+                worker.execute(job)
+        self.assertEqual(calls, ["ok"])
+        self.assertEqual(
+            dict(Job.objects.values_list("name", "status")),
+            {"tests.record": Job.DONE, "tests.missing": Job.FAILED},
+        )
+
+    def test_heartbeat_keeps_long_jobs(self):
+        worker = Worker()
+        enqueue("tests.record", "long")
+        enqueue("tests.record", "lost")
+        long, lost = worker.claim(10)
+        long_ago = timezone.now() - timedelta(
+            seconds=api.constants.JOBS_STALE_TIMEOUT * 10
+        )
+        Job.objects.update(started=long_ago, heartbeat=long_ago)
+        worker.heartbeat([long.pk])
+        worker.maintain()
+        self.assertEqual(
+            dict(Job.objects.values_list("id", "status")),
+            {long.pk: Job.RUNNING, lost.pk: Job.QUEUED},
+        )
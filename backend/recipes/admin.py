@@ -1,9 +1,22 @@
+from admin_auto_filters.filters import AutocompleteFilterFactory
 from django.contrib import admin
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
 
+from api.cache import invalidate
+from jobs.queue import enqueue
+
+from . import nutrition, shopping
 from .models import (
+    DuplicatePair,
     Favorite,
     Ingredient,
+    IngredientNutrition,
     IngredientRecipe,
+    MealPlanEntry,
     Recipe,
     ShoppingCart,
     Tag,
@@ -14,6 +27,7 @@ class IngredientInline(admin.TabularInline):
     model = IngredientRecipe
     extra = 3
     min_num = 1
+    autocomplete_fields = ("ingredient",)
 
 
 @admin.register(Recipe)
@@ -25,15 +39,34 @@ class RecipeAdmin(admin.ModelAdmin):
         "get_favorites",
         "get_ingredients",
     )
-    search_fields = ("name", "author", "tags")
-    list_filter = ("author", "name", "tags")
+    list_select_related = ("author",)
+    search_fields = ("name", "author__username", "author__email")
+    list_filter = (AutocompleteFilterFactory("Автор", "author"), "tags")
+    autocomplete_fields = ("author",)
+    show_full_result_count = False
     inlines = (IngredientInline,)
     empty_value_display = "-пусто-"
 
+    def get_queryset(self, request):
+        favorites = (
+            Favorite.objects.filter(recipe=OuterRef("pk"))
+            .order_by()
+            .values("recipe")
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(favorites_count=Subquery(favorites))
+            .prefetch_related("ingredients")
+        )
+
     def get_favorites(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count or 0
 
     get_favorites.short_description = "Избранное"
+    get_favorites.admin_order_field = "favorites_count"
 
     def get_ingredients(self, obj):
         return ", ".join(
@@ -42,13 +75,75 @@ class RecipeAdmin(admin.ModelAdmin):
 
     get_ingredients.short_description = "Ингридиенты"
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        nutrition.refresh_recipes([form.instance.pk])
+        enqueue(
+            "recipes.index_duplicates",
+            form.instance.pk,
+            dedup_key=f"duplicates-{form.instance.pk}",
+        )
+
+    def get_urls(self):
+        return [
+            path(
+                "duplicates/",
+                self.admin_site.admin_view(self.duplicates_view),
+                name="recipes_recipe_duplicates",
+            ),
+        ] + super().get_urls()
+
+    def duplicates_view(self, request):
+        """Пары рецептов - возможных дубликатов."""
+        pairs = DuplicatePair.objects.filter(
+            first__is_deleted=False, second__is_deleted=False
+        ).select_related("first__author", "second__author")
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Возможные дубликаты",
+            "pairs": [(pair.first, pair.second, pair.score) for pair in pairs],
+            "updated": pairs.aggregate(Max("updated"))["updated__max"],
+        }
+        return TemplateResponse(
+            request, "admin/recipes/recipe/duplicates.html", context
+        )
+
+    def delete_model(self, request, obj):
+        obj.soft_delete()
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            recipe_ids = list(
+                queryset.filter(is_deleted=False).values_list("pk", flat=True)
+            )
+            Recipe.all_objects.filter(pk__in=recipe_ids).update(
+                is_deleted=True, updated=timezone.now()
+            )
+            shopping.recipes_deleted(recipe_ids)
+            for recipe_id in recipe_ids:
+                enqueue(
+                    "recipes.purge_recipe",
+                    recipe_id,
+                    dedup_key=f"purge-recipe-{recipe_id}",
+                )
+        invalidate(
+            "recipes", *(f"recipes-{recipe_id}" for recipe_id in recipe_ids)
+        )
+
+
+class NutritionInline(admin.StackedInline):
+    model = IngredientNutrition
+    can_delete = False
+
 
 class IngredientAdmin(admin.ModelAdmin):
     """Админ панель управление ингридиентами"""
 
+    inlines = (NutritionInline,)
     list_display = ("name", "measurement_unit")
     search_fields = ("name",)
-    list_filter = ("name",)
+    list_filter = ("measurement_unit",)
     empty_value_display = "-пусто-"
 
 
@@ -65,8 +160,14 @@ class FavoriteAdmin(admin.ModelAdmin):
     """Админ панель управление подписками"""
 
     list_display = ("user", "recipe")
-    list_filter = ("user", "recipe")
-    search_fields = ("user", "recipe")
+    list_select_related = ("user", "recipe")
+    list_filter = (
+        AutocompleteFilterFactory("Пользователь", "user"),
+        AutocompleteFilterFactory("Рецепт", "recipe"),
+    )
+    search_fields = ("user__username", "user__email", "recipe__name")
+    autocomplete_fields = ("user", "recipe")
+    show_full_result_count = False
     empty_value_display = "-пусто-"
 
 
@@ -74,12 +175,32 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     """Админ панель списка покупок"""
 
     list_display = ("recipe", "user")
-    list_filter = ("recipe", "user")
-    search_fields = ("user",)
+    list_select_related = ("recipe", "user")
+    list_filter = (
+        AutocompleteFilterFactory("Рецепт", "recipe"),
+        AutocompleteFilterFactory("Пользователь", "user"),
+    )
+    search_fields = ("user__username", "user__email")
+    autocomplete_fields = ("user", "recipe")
+    show_full_result_count = False
+    empty_value_display = "-пусто-"
+
+
+class MealPlanEntryAdmin(admin.ModelAdmin):
+    """Админ панель плана питания"""
+
+    list_display = ("user", "date", "recipe", "servings")
+    list_select_related = ("user", "recipe")
+    list_filter = (AutocompleteFilterFactory("Пользователь", "user"),)
+    search_fields = ("user__username", "user__email", "recipe__name")
+    autocomplete_fields = ("user", "recipe")
+    date_hierarchy = "date"
+    show_full_result_count = False
     empty_value_display = "-пусто-"
 
 
 admin.site.register(ShoppingCart, ShoppingCartAdmin)
+admin.site.register(MealPlanEntry, MealPlanEntryAdmin)
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Tag, TagAdmin)
 admin.site.register(Favorite, FavoriteAdmin)
@@ -0,0 +1,244 @@
+"""Поиск почти одинаковых рецептов: MinHash и LSH.
+
+Рецепт описывается множеством признаков: id ингредиентов и символьные
+шинглы нормализованного названия. MinHash-сигнатура из
+``DUPLICATES_PERMUTATIONS`` значений оценивает сходство Жаккара двух
+множеств долей совпавших позиций. Сигнатура делится на
+``DUPLICATES_BANDS`` полос, хэш каждой полосы хранится в
+``RecipeBucket`` с индексом (band, bucket). Кандидаты в дубликаты -
+рецепты, у которых совпала хотя бы одна полоса: они находятся по
+индексу, без попарного сравнения со всем каталогом. Самые похожие пары
+по всему каталогу считает фоновая задача ``recipes.refresh_duplicate_pairs``
+и хранит в ``DuplicatePair``: админка читает готовый список.
+"""
+
+import hashlib
+import random
+import re
+from array import array
+from collections import defaultdict
+from itertools import combinations, groupby
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+import api.constants
+from jobs.queue import enqueue
+
+from .models import (
+    DuplicatePair,
+    IngredientRecipe,
+    Recipe,
+    RecipeBucket,
+    RecipeSignature,
+)
+
+# Простое число Мерсенна 2^61 - 1: модуль хэш-функций вида a * x + b.
+PRIME = (1 << 61) - 1
+# Параметры фиксированы: сигнатуры должны совпадать между процессами.
+_random = random.Random(20240601)
+PERMUTATIONS = tuple(
+    (_random.randrange(1, PRIME), _random.randrange(PRIME))
+    for _ in range(api.constants.DUPLICATES_PERMUTATIONS)
+)
+ROWS = api.constants.DUPLICATES_PERMUTATIONS // api.constants.DUPLICATES_BANDS
+NON_WORD = re.compile(r"[\W_]+")
+
+
+def token_hash(token) -> int:
+    # hash() строк зависит от процесса, нужен стабильный хэш.
+    return int.from_bytes(
+        hashlib.blake2b(token.encode(), digest_size=8).digest(), "big"
+    )
+
+
+def normalize(name) -> str:
+    return NON_WORD.sub(" ", name.lower().replace("ё", "е")).strip()
+
+
+def features(name, ingredient_ids) -> set:
+    """Признаки рецепта: ингредиенты и шинглы названия."""
+    tokens = {f"i:{ingredient_id}" for ingredient_id in ingredient_ids}
+    text = normalize(name)
+    size = api.constants.DUPLICATES_SHINGLE
+    for start in range(max(1, len(text) - size + 1)):
+        end = start + size
+        tokens.add(f"n:{text[start:end]}")
+    return tokens
+
+
+def signature(tokens) -> array:
+    hashes = [token_hash(token) for token in tokens]
+    return array(
+        "q",
+        (
+            min((a * value + b) % PRIME for value in hashes)
+            for a, b in PERMUTATIONS
+        ),
+    )
+
+
+def bands(values):
+    """Пары (полоса, хэш полосы) сигнатуры."""
+    for band in range(api.constants.DUPLICATES_BANDS):
+        start = band * ROWS
+        end = start + ROWS
+        digest = hashlib.blake2b(
+            values[start:end].tobytes(), digest_size=8
+        ).digest()
+        yield band, int.from_bytes(digest, "big", signed=True)
+
+
+def similarity(first, second) -> float:
+    """Оценка сходства Жаккара по двум сигнатурам."""
+    return sum(a == b for a, b in zip(first, second)) / len(first)
+
+
+def load(value) -> array:
+    values = array("q")
+    values.frombytes(bytes(value))
+    return values
+
+
+def recipe_signatures(recipe_ids) -> dict:
+    """Сигнатуры рецептов по составу и названию из базы."""
+    ingredients = defaultdict(list)
+    for recipe_id, ingredient_id in IngredientRecipe.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list("recipe_id", "ingredient_id"):
+        ingredients[recipe_id].append(ingredient_id)
+    return {
+        recipe_id: signature(features(name, ingredients[recipe_id]))
+        for recipe_id, name in Recipe.all_objects.filter(
+            pk__in=recipe_ids
+        ).values_list("id", "name")
+    }
+
+
+def store(signatures) -> None:
+    """Заменяет сигнатуры и корзины LSH рецептов ``{id: сигнатура}``."""
+    with transaction.atomic():
+        RecipeSignature.objects.filter(recipe_id__in=signatures).delete()
+        RecipeBucket.objects.filter(recipe_id__in=signatures).delete()
+        RecipeSignature.objects.bulk_create(
+            RecipeSignature(recipe_id=recipe_id, signature=values.tobytes())
+            for recipe_id, values in signatures.items()
+        )
+        RecipeBucket.objects.bulk_create(
+            RecipeBucket(recipe_id=recipe_id, band=band, bucket=bucket)
+            for recipe_id, values in signatures.items()
+            for band, bucket in bands(values)
+        )
+
+
+def index_recipes(recipe_ids) -> dict:
+    """Пересчитывает индекс для рецептов. Возвращает их сигнатуры."""
+    signatures = recipe_signatures(recipe_ids)
+    store(signatures)
+    return signatures
+
+
+def find(values, exclude=None, limit=None) -> list:
+    """Возможные дубликаты для сигнатуры: пары (id рецепта, сходство)
+    по убыванию сходства."""
+    query = Q()
+    for band, bucket in bands(values):
+        query |= Q(band=band, bucket=bucket)
+    candidates = (
+        RecipeBucket.objects.filter(query, recipe__is_deleted=False)
+        .exclude(recipe_id=exclude)
+        .values_list("recipe_id", flat=True)
+        .distinct()[: api.constants.DUPLICATES_MAX_CANDIDATES]
+    )
+    matches = [
+        (recipe_id, score)
+        for recipe_id, stored in RecipeSignature.objects.filter(
+            recipe_id__in=list(candidates)
+        ).values_list("recipe_id", "signature")
+        for score in (similarity(values, load(stored)),)
+        if score >= api.constants.DUPLICATES_THRESHOLD
+    ]
+    matches.sort(key=lambda match: (-match[1], match[0]))
+    return matches[: limit or api.constants.DUPLICATES_LIMIT]
+
+
+def check(name, ingredient_ids, exclude=None) -> list:
+    """Возможные дубликаты рецепта, который еще не сохранен."""
+    return find(signature(features(name, ingredient_ids)), exclude)
+
+
+def candidate_pairs():
+    """Пары рецептов, попавших в одну корзину LSH. Слишком большие
+    корзины (типовые рецепты) пропускаются."""
+    collisions = RecipeBucket.objects.filter(
+        band=OuterRef("band"),
+        bucket=OuterRef("bucket"),
+        recipe__is_deleted=False,
+    ).exclude(recipe_id=OuterRef("recipe_id"))
+    rows = (
+        RecipeBucket.objects.filter(
+            Exists(collisions), recipe__is_deleted=False
+        )
+        .order_by("band", "bucket", "recipe_id")
+        .values_list("band", "bucket", "recipe_id")
+    )
+    pairs = set()
+    for _, group in groupby(rows.iterator(), key=lambda row: row[:2]):
+        recipe_ids = [row[2] for row in group]
+        if len(recipe_ids) <= api.constants.DUPLICATES_MAX_BUCKET:
+            pairs.update(combinations(recipe_ids, 2))
+    return pairs
+
+
+def duplicate_pairs(limit=None) -> list:
+    """Самые похожие пары (id, id, сходство) по всему каталогу."""
+    pairs = candidate_pairs()
+    signatures = {
+        recipe_id: load(stored)
+        for recipe_id, stored in RecipeSignature.objects.filter(
+            recipe_id__in={recipe_id for pair in pairs for recipe_id in pair}
+        ).values_list("recipe_id", "signature")
+    }
+    scored = [
+        (first, second, score)
+        for first, second in pairs
+        if first in signatures and second in signatures
+        for score in (similarity(signatures[first], signatures[second]),)
+        if score >= api.constants.DUPLICATES_THRESHOLD
+    ]
+    scored.sort(key=lambda pair: (-pair[2], pair[0], pair[1]))
+    return scored[: limit or api.constants.DUPLICATES_ADMIN_PAIRS]
+
+
+def refresh_pairs() -> int:
+    """Пересчитывает список пар для админки."""
+    pairs = duplicate_pairs()
+    with transaction.atomic():
+        DuplicatePair.objects.all().delete()
+        DuplicatePair.objects.bulk_create(
+            DuplicatePair(first_id=first, second_id=second, score=score)
+            for first, second, score in pairs
+        )
+    return len(pairs)
+
+
+def schedule_pairs() -> None:
+    """Ставит пересчет пар с задержкой: правки рецептов за это время
+    учитываются одним обходом индекса."""
+    enqueue(
+        "recipes.refresh_duplicate_pairs",
+        dedup_key="duplicate-pairs",
+        delay=api.constants.DUPLICATES_PAIRS_DELAY,
+    )
+
+
+def rebuild(batch_size=500, progress=None) -> int:
+    """Пересчитывает индекс для всех рецептов и список пар."""
+    recipe_ids = list(Recipe.objects.values_list("id", flat=True))
+    for start in range(0, len(recipe_ids), batch_size):
+        end = start + batch_size
+        index_recipes(recipe_ids[start:end])
+        if progress:
+            progress(min(end, len(recipe_ids)), len(recipe_ids))
+    refresh_pairs()
+    return len(recipe_ids)
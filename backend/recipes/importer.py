@@ -0,0 +1,271 @@
+"""Массовый импорт рецептов из NDJSON.
+
+Каждая строка - рецепт в формате ``POST /api/recipes/``. Теги и
+ингредиенты проверяются по заранее загруженным множествам id, без
+запросов на каждую строку; изображения декодируются и сохраняются в
+пуле потоков. Рецепты, строки тегов и ``IngredientRecipe`` пишутся
+пачками через ``bulk_create`` в одной транзакции на пачку. Ошибочные
+строки попадают в отчет и не прерывают импорт остальных. Сигнатуры
+для поиска дубликатов считаются по данным строк.
+"""
+
+import base64
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.core.files.base import ContentFile
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+from PIL import Image
+
+import api.constants
+from api.cache import invalidate
+
+from . import duplicates, nutrition, scores, storage
+from .models import Ingredient, IngredientRecipe, Recipe, Tag
+
+IMAGE_FIELD = Recipe._meta.get_field("image")
+
+
+class LineError(ValueError):
+    """Ошибки одной строки: поле -> сообщение."""
+
+
+def is_int(value) -> bool:
+    """Целое число JSON: ``true`` и ``false`` не считаются."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def decode_image(value) -> str:
+    """Декодирует data URI, проверяет изображение и сохраняет файл.
+    Возвращает имя файла в хранилище. Расширение берется из формата
+    изображения, а не из заголовка data URI."""
+    if not isinstance(value, str) or ";base64," not in value:
+        raise LineError({"image": "Ожидается изображение в base64"})
+    data = value.split(";base64,", 1)[1]
+    try:
+        content = base64.b64decode(data, validate=True)
+        image = Image.open(io.BytesIO(content))
+        image_format = image.format
+        image.verify()
+    except Image.DecompressionBombError:
+        raise LineError({"image": "Слишком большое изображение"})
+    except Exception:
+        # PIL на битых файлах бросает что угодно: OSError, SyntaxError,
+        # struct.error и т.д. Это ошибка строки, а не импорта.
+        raise LineError({"image": "Некорректное изображение"})
+    ext = storage.image_extension(image_format)
+    return IMAGE_FIELD.storage.save(
+        IMAGE_FIELD.upload_to + f"import.{ext}", ContentFile(content)
+    )
+
+
+def delete_images(names) -> None:
+    """Удаляет сохраненные файлы, на которые не ссылается ни один
+    рецепт: одинаковое содержимое хранится под одним именем."""
+    used = set(
+        Recipe.all_objects.filter(image__in=names).values_list(
+            "image", flat=True
+        )
+    )
+    for name in set(names) - used:
+        IMAGE_FIELD.storage.delete(name)
+
+
+class RecipeImporter:
+    def __init__(self, author, batch_size=None, workers=None):
+        self.author = author
+        self.batch_size = batch_size or api.constants.IMPORT_BATCH_SIZE
+        self.workers = workers or api.constants.IMPORT_WORKERS
+        self.tag_masks = {tag.pk: tag.mask for tag in Tag.objects.all()}
+        self.ingredient_ids = set(
+            Ingredient.objects.values_list("id", flat=True)
+        )
+        self.created = 0
+        self.errors = []
+
+    def validate(self, line) -> dict:
+        try:
+            data = json.loads(line)
+        except ValueError:
+            raise LineError({"line": "Некорректный JSON"})
+        if not isinstance(data, dict):
+            raise LineError({"line": "Ожидается объект JSON"})
+        errors = {
+            field: error
+            for field, error in (
+                ("name", self.name_error(data.get("name"))),
+                ("text", self.text_error(data.get("text"))),
+                ("cooking_time", self.time_error(data.get("cooking_time"))),
+                ("tags", self.tags_error(data.get("tags"))),
+                (
+                    "ingredients",
+                    self.ingredients_error(data.get("ingredients")),
+                ),
+            )
+            if error
+        }
+        if errors:
+            raise LineError(errors)
+        return data
+
+    @staticmethod
+    def name_error(name):
+        if not isinstance(name, str) or not name.strip():
+            return "Обязательное поле"
+        if len(name) > api.constants.LENGTH_OF_FIELDS_RECIPES:
+            return "Слишком длинное название"
+        return None
+
+    @staticmethod
+    def text_error(text):
+        if not isinstance(text, str) or not text.strip():
+            return "Обязательное поле"
+        return None
+
+    @staticmethod
+    def time_error(cooking_time):
+        if not is_int(cooking_time) or not (
+            api.constants.COOKING_TIME_MIN_VALUE
+            <= cooking_time
+            <= api.constants.COOKING_TIME_MAX_VALUE
+        ):
+            return "Некорректное время готовки"
+        return None
+
+    def tags_error(self, tags):
+        if not isinstance(tags, list) or not tags:
+            return "Отсутствует тег"
+        if not all(is_int(tag) and tag in self.tag_masks for tag in tags):
+            return "Несуществующий тег"
+        if len(set(tags)) != len(tags):
+            return "Одинаковые теги"
+        return None
+
+    def ingredients_error(self, ingredients):
+        if not isinstance(ingredients, list) or not ingredients:
+            return "Отсутствуют ингридиенты"
+        seen = set()
+        for item in ingredients:
+            if not isinstance(item, dict):
+                return "Некорректный ингредиент"
+            ingredient_id, amount = item.get("id"), item.get("amount")
+            if (
+                not is_int(ingredient_id)
+                or ingredient_id not in self.ingredient_ids
+            ):
+                return f"Несуществующий ингредиент: {ingredient_id}"
+            if ingredient_id in seen:
+                return "Ингридиенты должны быть уникальны"
+            seen.add(ingredient_id)
+            if not is_int(amount) or amount < 1:
+                return "Количество ингредиента больше 0"
+        return None
+
+    def build(self, data, image, now) -> Recipe:
+        tags_mask = 0
+        for tag in data["tags"]:
+            tags_mask |= self.tag_masks[tag]
+        return Recipe(
+            author=self.author,
+            name=data["name"],
+            text=data["text"],
+            cooking_time=data["cooking_time"],
+            image=image,
+            tags_mask=tags_mask,
+            trending=scores.activity_score(
+                now, api.constants.TRENDING_PUBLISH_WEIGHT
+            ),
+        )
+
+    def write(self, rows) -> None:
+        """Пишет пачку проверенных строк (номер, данные, изображение)."""
+        now = timezone.now()
+        recipes = [self.build(data, image, now) for _, data, image in rows]
+        with transaction.atomic():
+            if connection.features.can_return_rows_from_bulk_insert:
+                Recipe.objects.bulk_create(recipes)
+            else:
+                # Без RETURNING id (SQLite) - по одной; рейтинг новизны
+                # выставит сигнал post_save.
+                for recipe in recipes:
+                    recipe.trending = 0
+                    recipe.save()
+            Recipe.tags.through.objects.bulk_create(
+                Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag)
+                for recipe, (_, data, _) in zip(recipes, rows)
+                for tag in data["tags"]
+            )
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(
+                    recipe_id=recipe.pk,
+                    ingredient_id=item["id"],
+                    amount=item["amount"],
+                )
+                for recipe, (_, data, _) in zip(recipes, rows)
+                for item in data["ingredients"]
+            )
+            nutrition.refresh_recipes([recipe.pk for recipe in recipes])
+            duplicates.store(
+                {
+                    recipe.pk: duplicates.signature(
+                        duplicates.features(
+                            data["name"],
+                            [item["id"] for item in data["ingredients"]],
+                        )
+                    )
+                    for recipe, (_, data, _) in zip(recipes, rows)
+                }
+            )
+        self.created += len(recipes)
+
+    def validate_batch(self, batch):
+        for number, line in batch:
+            if not line.strip():
+                continue
+            try:
+                yield number, self.validate(line)
+            except LineError as error:
+                self.errors.append({"line": number, "errors": error.args[0]})
+
+    def decode_images(self, pool, valid):
+        futures = [
+            pool.submit(decode_image, data.get("image")) for _, data in valid
+        ]
+        for (number, data), future in zip(valid, futures):
+            try:
+                yield number, data, future.result()
+            except LineError as error:
+                self.errors.append({"line": number, "errors": error.args[0]})
+
+    def import_batch(self, pool, batch) -> None:
+        rows = list(self.decode_images(pool, list(self.validate_batch(batch))))
+        if not rows:
+            return
+        try:
+            self.write(rows)
+        except DatabaseError as error:
+            delete_images([image for _, _, image in rows])
+            self.errors.extend(
+                {"line": number, "errors": {"database": str(error)}}
+                for number, _, _ in rows
+            )
+
+    def run(self, lines, progress=None) -> dict:
+        """Импортирует строки ``lines``. Возвращает отчет: число
+        созданных рецептов и ошибки по номерам строк."""
+        numbered = enumerate(lines, start=1)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while True:
+                batch = list(islice(numbered, self.batch_size))
+                if not batch:
+                    break
+                self.import_batch(pool, batch)
+                if progress:
+                    progress(batch[-1][0], self.created, len(self.errors))
+        if self.created:
+            invalidate("recipes")
+        self.errors.sort(key=lambda error: error["line"])
+        return {"created": self.created, "errors": self.errors}
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from recipes import recommendations
+
+
+class Command(BaseCommand):
+    help = " Пересчитать рекомендации похожих рецептов "
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Пересчитать все рецепты, а не только измененные",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.NOTICE("Старт"))
+        total = recommendations.build(
+            full=options["full"],
+            batch_size=options["batch_size"],
+            progress=lambda done, total: self.stdout.write(f"{done}/{total}"),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Пересчитано рецептов: {total}"))
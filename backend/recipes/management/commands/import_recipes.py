@@ -0,0 +1,50 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.importer import RecipeImporter
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = " Импортировать рецепты из NDJSON (по рецепту на строку) "
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Файл NDJSON или - для stdin")
+        parser.add_argument(
+            "--author", required=True, help="email автора рецептов"
+        )
+        parser.add_argument("--batch-size", type=int)
+        parser.add_argument(
+            "--workers", type=int, help="Потоков для декодирования картинок"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            author = User.objects.get(email=options["author"])
+        except User.DoesNotExist:
+            raise CommandError(f"Нет пользователя {options['author']}")
+        importer = RecipeImporter(
+            author,
+            batch_size=options["batch_size"],
+            workers=options["workers"],
+        )
+        self.stdout.write(self.style.NOTICE("Старт"))
+        path = options["path"]
+        lines = sys.stdin if path == "-" else open(path, encoding="utf-8")
+        with lines:
+            report = importer.run(
+                lines,
+                progress=lambda line, created, errors: self.stdout.write(
+                    f"строк: {line}, создано: {created}, ошибок: {errors}"
+                ),
+            )
+        for error in report["errors"]:
+            self.stderr.write(json.dumps(error, ensure_ascii=False))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Создано рецептов: {report['created']}, "
+                f"ошибок: {len(report['errors'])}"
+            )
+        )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import nutrition
+
+
+class Command(BaseCommand):
+    help = " Загрузить пищевую ценность ингредиентов из CSV "
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="./data/nutrition.csv")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.NOTICE("Старт"))
+        try:
+            loaded, missing, recipes = nutrition.load(
+                options["path"], options["batch_size"]
+            )
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Загружено: {loaded}, неизвестных ингредиентов: "
+                f"{missing}, пересчитано рецептов: {recipes}"
+            )
+        )
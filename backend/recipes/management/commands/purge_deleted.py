@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.purge import purge_deleted
+
+
+class Command(BaseCommand):
+    help = " Удалить помеченные рецепты и пользователей пачками "
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Работать постоянно, проверяя очередь раз в --interval",
+        )
+        parser.add_argument("--interval", type=float, default=30)
+
+    def progress(self, name, deleted):
+        self.stdout.write(f"{name}: удалено {deleted}")
+
+    def handle(self, *args, **options):
+        while True:
+            recipes, users = purge_deleted(
+                batch_size=options["batch_size"], progress=self.progress
+            )
+            if recipes or users:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"Удалено рецептов: {recipes}, "
+                        f"пользователей: {users}"
+                    )
+                )
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from recipes import duplicates
+
+
+class Command(BaseCommand):
+    help = " Пересчитать индекс поиска дубликатов рецептов "
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.NOTICE("Старт"))
+        total = duplicates.rebuild(
+            batch_size=options["batch_size"],
+            progress=lambda done, total: self.stdout.write(f"{done}/{total}"),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Пересчитано рецептов: {total}"))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from recipes import shopping
+from recipes.models import (
+    MealPlanEntry,
+    MealPlanItem,
+    ShoppingCart,
+    ShoppingListItem,
+)
+
+
+class Command(BaseCommand):
+    help = " Пересчитать сводные списки покупок и планов питания с нуля "
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.NOTICE("Старт"))
+        user_ids = set(
+            ShoppingCart.objects.values_list("user_id", flat=True)
+        ) | set(ShoppingListItem.objects.values_list("user_id", flat=True))
+        for user_id in user_ids:
+            shopping.rebuild(user_id)
+        plan_user_ids = set(
+            MealPlanEntry.objects.values_list("user_id", flat=True)
+        ) | set(MealPlanItem.objects.values_list("user_id", flat=True))
+        for user_id in plan_user_ids:
+            shopping.rebuild_plan(user_id)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Пересчитано списков: {len(user_ids)}, "
+                f"планов питания: {len(plan_user_ids)}"
+            )
+        )
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from recipes.models import Recipe, Tag
+
+
+class Command(BaseCommand):
+    help = " Назначить биты тегам и пересчитать маски тегов рецептов "
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--if-needed",
+            action="store_true",
+            help="Только если есть теги без бита (после миграции)",
+        )
+
+    def handle(self, *args, **options):
+        if options["if_needed"] and not Tag.objects.filter(bit=None).exists():
+            self.stdout.write("Биты назначены всем тегам, пересчет не нужен")
+            return
+        self.stdout.write(self.style.NOTICE("Старт"))
+        for tag in Tag.objects.filter(bit=None):
+            tag.save()
+        masks = {tag.pk: tag.mask for tag in Tag.objects.all()}
+        through = Recipe.tags.through.objects
+        recipe_ids = list(Recipe.all_objects.values_list("pk", flat=True))
+        batch_size = options["batch_size"]
+        for start in range(0, len(recipe_ids), batch_size):
+            end = start + batch_size
+            batch = recipe_ids[start:end]
+            recipe_masks = dict.fromkeys(batch, 0)
+            for recipe_id, tag_id in through.filter(
+                recipe_id__in=batch
+            ).values_list("recipe_id", "tag_id"):
+                recipe_masks[recipe_id] |= masks[tag_id]
+            for recipe_id, mask in recipe_masks.items():
+                Recipe.all_objects.filter(
+                    ~Q(tags_mask=mask), pk=recipe_id
+                ).update(tags_mask=mask)
+            self.stdout.write(f"{start + len(batch)}/{len(recipe_ids)}")
+        self.stdout.write(self.style.SUCCESS("Маски тегов пересчитаны"))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from recipes import scores
+
+
+class Command(BaseCommand):
+    help = " Пересчитать рейтинги popular и trending "
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.NOTICE("Старт"))
+        total = scores.refresh(
+            batch_size=options["batch_size"],
+            progress=lambda done, total: self.stdout.write(f"{done}/{total}"),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Рейтинги пересчитаны: {total}"))
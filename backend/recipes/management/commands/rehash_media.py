@@ -0,0 +1,82 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.models import Recipe
+
+IMAGE_DIR = Recipe._meta.get_field("image").upload_to
+
+
+class Command(BaseCommand):
+    help = " Перевести изображения рецептов на имена по хэшу и удалить сирот "
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать, что будет сделано",
+        )
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=3600,
+            help="Не удалять файлы моложе указанного числа секунд",
+        )
+
+    def rehash(self, dry_run):
+        storage = Recipe._meta.get_field("image").storage
+        moved = 0
+        for recipe in Recipe.all_objects.exclude(image="").only("image"):
+            name = recipe.image.name
+            if storage.is_hashed(name) or not storage.exists(name):
+                continue
+            moved += 1
+            if dry_run:
+                self.stdout.write(f"{name}: будет переименован")
+                continue
+            with storage.open(name) as content:
+                new_name = storage.save(name, content)
+            # Адрес изображения сменился: выгрузка с ?since= и кэши должны
+            # увидеть рецепт измененным.
+            Recipe.all_objects.filter(pk=recipe.pk).update(
+                image=new_name, updated=timezone.now()
+            )
+        return moved
+
+    def walk(self, storage, path):
+        directories, files = storage.listdir(path)
+        for filename in files:
+            yield os.path.join(path, filename)
+        for directory in directories:
+            yield from self.walk(storage, os.path.join(path, directory))
+
+    def remove_orphans(self, dry_run, min_age):
+        storage = Recipe._meta.get_field("image").storage
+        if not storage.exists(IMAGE_DIR):
+            return 0
+        used = set(Recipe.all_objects.values_list("image", flat=True))
+        deadline = time.time() - min_age
+        removed = 0
+        for name in self.walk(storage, IMAGE_DIR.rstrip("/")):
+            if name in used:
+                continue
+            if os.path.getmtime(storage.path(name)) > deadline:
+                continue
+            removed += 1
+            if dry_run:
+                self.stdout.write(f"{name}: будет удален")
+            else:
+                storage.delete(name)
+        return removed
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.NOTICE("Старт"))
+        moved = self.rehash(options["dry_run"])
+        removed = self.remove_orphans(options["dry_run"], options["min_age"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Переименовано: {moved}, удалено сирот: {removed}"
+            )
+        )
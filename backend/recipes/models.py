@@ -1,19 +1,28 @@
 from colorfield.fields import ColorField
+from django.core.exceptions import ValidationError
 from django.core.validators import (
     MaxValueValidator,
     MinValueValidator,
     RegexValidator,
 )
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.db.models import UniqueConstraint
+from django.utils import timezone
 
 import api.constants
+from api.cache import invalidate
+from jobs.queue import enqueue
 from users.models import User
 
+from .storage import ContentHashStorage
+
 
 class Ingredient(models.Model):
     name = models.CharField("Название", max_length=256)
     measurement_unit = models.CharField("Единица измерения", max_length=32)
+    updated = models.DateTimeField(
+        "Дата изменения", auto_now=True, db_index=True
+    )
 
     class Meta:
         verbose_name = "Ингредиент"
@@ -30,6 +39,29 @@ class Ingredient(models.Model):
         return f"{self.name}, {self.measurement_unit}"
 
 
+class IngredientNutrition(models.Model):
+    """Пищевая ценность одной единицы измерения ингредиента."""
+
+    ingredient = models.OneToOneField(
+        Ingredient,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name="Ингредиент",
+        related_name="nutrition",
+    )
+    calories = models.FloatField("Калории, ккал", default=0)
+    proteins = models.FloatField("Белки, г", default=0)
+    fats = models.FloatField("Жиры, г", default=0)
+    carbohydrates = models.FloatField("Углеводы, г", default=0)
+
+    class Meta:
+        verbose_name = "Пищевая ценность"
+        verbose_name_plural = "Пищевая ценность"
+
+    def __str__(self) -> str:
+        return f"{self.ingredient}: {self.calories:g} ккал"
+
+
 class Tag(models.Model):
     """Модель тегов."""
 
@@ -56,6 +88,12 @@ class Tag(models.Model):
         verbose_name="Slug",
         unique=True,
     )
+    bit = models.PositiveSmallIntegerField(
+        verbose_name="Бит в маске тегов",
+        unique=True,
+        null=True,
+        editable=False,
+    )
 
     class Meta:
         ordering = ("name",)
@@ -65,6 +103,65 @@ class Tag(models.Model):
     def __str__(self) -> str:
         return self.name
 
+    @property
+    def mask(self) -> int:
+        # Тег, созданный до появления масок, не отмечен ни в одной маске
+        # рецепта, пока rebuild_tag_masks (выполняется при деплое после
+        # migrate) не назначит ему бит.
+        if self.bit is None:
+            return 0
+        return 1 << self.bit
+
+    @classmethod
+    def mask_for(cls, tags) -> int:
+        mask = 0
+        for tag in tags:
+            mask |= tag.mask
+        return mask
+
+    def free_bit(self) -> int:
+        used = set(
+            Tag.objects.exclude(bit=None)
+            .exclude(pk=self.pk)
+            .values_list("bit", flat=True)
+        )
+        for bit in range(api.constants.MAX_TAG_BITS):
+            if bit not in used:
+                return bit
+        raise ValidationError(
+            "Превышено число тегов: " f"{api.constants.MAX_TAG_BITS}"
+        )
+
+    def save(self, *args, **kwargs):
+        if self.bit is not None:
+            super().save(*args, **kwargs)
+            return
+        # Одновременно создаваемые теги могут выбрать один свободный бит:
+        # вставку второго отклонит уникальный индекс, и он возьмет
+        # следующий.
+        while True:
+            self.bit = self.free_bit()
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+                return
+            except IntegrityError:
+                taken = (
+                    Tag.objects.filter(bit=self.bit)
+                    .exclude(pk=self.pk)
+                    .exists()
+                )
+                self.bit = None
+                if not taken:
+                    raise
+
+
+class RecipeManager(models.Manager):
+    """Менеджер, скрывающий удаленные рецепты."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
+
 
 class Recipe(models.Model):
     """Модель рецептов."""
@@ -80,13 +177,18 @@ class Recipe(models.Model):
         max_length=api.constants.LENGTH_OF_FIELDS_RECIPES,
     )
     image = models.ImageField(
-        upload_to="recipes/image/", verbose_name="Изображение"
+        upload_to="recipes/image/",
+        storage=ContentHashStorage(),
+        verbose_name="Изображение",
     )
     text = models.TextField(verbose_name="Описание")
     ingredients = models.ManyToManyField(
         Ingredient, verbose_name="Ингридиенты", through="IngredientRecipe"
     )
     tags = models.ManyToManyField(Tag, verbose_name="Теги")
+    tags_mask = models.BigIntegerField(
+        verbose_name="Маска тегов", default=0, editable=False
+    )
     cooking_time = models.PositiveSmallIntegerField(
         verbose_name="Время готовки",
         validators=[
@@ -102,15 +204,84 @@ class Recipe(models.Model):
     pub_date = models.DateTimeField(
         verbose_name="Дата публикации", auto_now_add=True
     )
+    updated = models.DateTimeField(
+        verbose_name="Дата изменения", auto_now=True, db_index=True
+    )
+    is_deleted = models.BooleanField(
+        verbose_name="Удален", default=False, db_index=True
+    )
+    popularity = models.FloatField(
+        verbose_name="Популярность", default=0, editable=False
+    )
+    trending = models.FloatField(
+        verbose_name="Рейтинг новизны", default=0, editable=False
+    )
+    # Пищевая ценность всего рецепта, пересчитывается при изменении
+    # состава (recipes/nutrition.py). NULL - ценность известна не для
+    # всех ингредиентов.
+    calories = models.FloatField(
+        verbose_name="Калории, ккал",
+        null=True,
+        editable=False,
+        db_index=True,
+    )
+    proteins = models.FloatField(
+        verbose_name="Белки, г", null=True, editable=False, db_index=True
+    )
+    fats = models.FloatField(
+        verbose_name="Жиры, г", null=True, editable=False, db_index=True
+    )
+    carbohydrates = models.FloatField(
+        verbose_name="Углеводы, г",
+        null=True,
+        editable=False,
+        db_index=True,
+    )
+
+    objects = RecipeManager()
+    all_objects = models.Manager()
 
     class Meta:
         ordering = ("-pub_date",)
+        indexes = (
+            models.Index(
+                fields=("-popularity", "-id"), name="recipe_popularity_idx"
+            ),
+            models.Index(
+                fields=("-trending", "-id"), name="recipe_trending_idx"
+            ),
+        )
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
 
     def __str__(self) -> str:
         return self.name
 
+    def refresh_tags_mask(self):
+        self.tags_mask = Tag.mask_for(self.tags.all())
+        Recipe.all_objects.filter(pk=self.pk).update(
+            tags_mask=self.tags_mask, updated=timezone.now()
+        )
+
+    def soft_delete(self):
+        """Помечает рецепт удаленным. Зависимые записи удаляет фоновая
+        задача, итоги рецепта сразу вычитаются из сводок покупок."""
+        # shopping импортирует модели.
+        from . import shopping
+
+        with transaction.atomic():
+            if Recipe.all_objects.filter(pk=self.pk, is_deleted=False).update(
+                is_deleted=True, updated=timezone.now()
+            ):
+                shopping.recipes_deleted([self.pk])
+            enqueue(
+                "recipes.purge_recipe",
+                self.pk,
+                dedup_key=f"purge-recipe-{self.pk}",
+            )
+        self.is_deleted = True
+        invalidate("recipes", f"recipes-{self.pk}")
+
 
 class FavoriteShoppingCart(models.Model):
     """Связывающая модель списка покупок и избранного."""
@@ -125,6 +296,9 @@ class FavoriteShoppingCart(models.Model):
         on_delete=models.CASCADE,
         verbose_name="Рецепт",
     )
+    created = models.DateTimeField(
+        "Дата добавления", default=timezone.now, db_index=True
+    )
 
     class Meta:
         abstract = True
@@ -184,3 +358,235 @@ class IngredientRecipe(models.Model):
             f"{self.ingredient.name} :: {self.ingredient.measurement_unit}"
             f" - {self.amount} "
         )
+
+
+class ShoppingListItem(models.Model):
+    """Материализованная сводка корзины: итог по ингредиенту."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name="Пользователь",
+        related_name="shopping_list_items",
+    )
+    name = models.CharField("Название", max_length=256)
+    measurement_unit = models.CharField("Единица измерения", max_length=32)
+    amount = models.DecimalField(
+        "Количество",
+        max_digits=14,
+        decimal_places=api.constants.AMOUNT_PRECISION,
+        default=0,
+    )
+
+    class Meta:
+        ordering = ("name",)
+        verbose_name = "Позиция списка покупок"
+        verbose_name_plural = "Список покупок"
+        constraints = (
+            models.UniqueConstraint(
+                fields=("user", "name", "measurement_unit"),
+                name="unique_shopping_list_item",
+            ),
+        )
+
+    def __str__(self) -> str:
+        return f"{self.name} ({self.measurement_unit}) - {self.amount:g}"
+
+
+class MealPlanEntry(models.Model):
+    """Рецепт в плане питания на дату. ``servings`` - во сколько раз
+    умножить количества рецепта."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name="Пользователь",
+        related_name="meal_plan",
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name="Рецепт",
+        related_name="meal_plan_entries",
+    )
+    date = models.DateField("Дата")
+    servings = models.PositiveSmallIntegerField(
+        "Порции",
+        default=1,
+        validators=[
+            MinValueValidator(1, message="Не меньше одной порции"),
+            MaxValueValidator(api.constants.MEAL_PLAN_MAX_SERVINGS),
+        ],
+    )
+
+    class Meta:
+        ordering = ("date", "id")
+        verbose_name = "Запись плана питания"
+        verbose_name_plural = "План питания"
+        indexes = (
+            models.Index(fields=("user", "date"), name="meal_plan_user_idx"),
+        )
+
+    def __str__(self) -> str:
+        return f"{self.date}: {self.recipe} x{self.servings}"
+
+
+class MealPlanItem(models.Model):
+    """Материализованная сводка покупок по плану питания за неделю."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name="Пользователь",
+        related_name="meal_plan_items",
+    )
+    week = models.DateField("Неделя (понедельник)")
+    name = models.CharField("Название", max_length=256)
+    measurement_unit = models.CharField("Единица измерения", max_length=32)
+    amount = models.DecimalField(
+        "Количество",
+        max_digits=14,
+        decimal_places=api.constants.AMOUNT_PRECISION,
+        default=0,
+    )
+
+    class Meta:
+        ordering = ("name",)
+        verbose_name = "Позиция покупок по плану"
+        verbose_name_plural = "Покупки по плану питания"
+        constraints = (
+            models.UniqueConstraint(
+                fields=("user", "week", "name", "measurement_unit"),
+                name="unique_meal_plan_item",
+            ),
+        )
+
+    def __str__(self) -> str:
+        return f"{self.name} ({self.measurement_unit}) - {self.amount:g}"
+
+
+class RecipeRecommendation(models.Model):
+    """Похожие рецепты (top-K), упакованные в массивы."""
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name="Рецепт",
+        related_name="recommendation",
+    )
+    similar_ids = models.BinaryField("Похожие рецепты")
+    scores = models.BinaryField("Оценки сходства")
+    updated = models.DateTimeField("Дата расчета", db_index=True)
+
+    class Meta:
+        verbose_name = "Рекомендации"
+        verbose_name_plural = "Рекомендации"
+
+    def __str__(self) -> str:
+        return f"Рекомендации для {self.recipe_id}"
+
+
+class FavoriteRemoval(models.Model):
+    """Удаление из избранного: у него нет своей метки времени, а
+    рекомендации рецепта и соседей нужно пересчитать."""
+
+    recipe_id = models.PositiveIntegerField("Рецепт")
+    user_id = models.PositiveIntegerField("Пользователь")
+    created = models.DateTimeField("Дата", default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = "Удаление из избранного"
+        verbose_name_plural = "Удаления из избранного"
+
+
+class IngredientDeletion(models.Model):
+    """Удаленный ингредиент: строка ``"deleted": true`` в выгрузке
+    каталога с ``?since=``."""
+
+    ingredient_id = models.PositiveIntegerField("Ингредиент")
+    updated = models.DateTimeField(
+        "Дата удаления", default=timezone.now, db_index=True
+    )
+
+    class Meta:
+        verbose_name = "Удаление ингредиента"
+        verbose_name_plural = "Удаления ингредиентов"
+
+
+class RecipeSignature(models.Model):
+    """MinHash-сигнатура рецепта для поиска дубликатов."""
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name="Рецепт",
+        related_name="signature",
+    )
+    signature = models.BinaryField("Сигнатура")
+    updated = models.DateTimeField("Дата расчета", auto_now=True)
+
+    class Meta:
+        verbose_name = "Сигнатура рецепта"
+        verbose_name_plural = "Сигнатуры рецептов"
+
+    def __str__(self) -> str:
+        return f"Сигнатура {self.recipe_id}"
+
+
+class RecipeBucket(models.Model):
+    """Корзина LSH: хэш полосы сигнатуры рецепта."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name="Рецепт",
+        related_name="buckets",
+    )
+    band = models.PositiveSmallIntegerField("Полоса")
+    bucket = models.BigIntegerField("Хэш полосы")
+
+    class Meta:
+        verbose_name = "Корзина LSH"
+        verbose_name_plural = "Корзины LSH"
+        indexes = (
+            models.Index(
+                fields=("band", "bucket"), name="recipe_bucket_band_idx"
+            ),
+        )
+        constraints = (
+            models.UniqueConstraint(
+                fields=("recipe", "band"), name="unique_recipe_band"
+            ),
+        )
+
+    def __str__(self) -> str:
+        return f"{self.recipe_id}: {self.band}/{self.bucket}"
+
+
+class DuplicatePair(models.Model):
+    """Пара возможных дубликатов для админки: считается в фоне."""
+
+    first = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name="Рецепт",
+        related_name="+",
+    )
+    second = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name="Похожий рецепт",
+        related_name="+",
+    )
+    score = models.FloatField("Сходство", db_index=True)
+    updated = models.DateTimeField("Дата расчета", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Возможный дубликат"
+        verbose_name_plural = "Возможные дубликаты"
+        ordering = ("-score", "first_id", "second_id")
+
+    def __str__(self) -> str:
+        return f"{self.first_id} ~ {self.second_id}"
@@ -0,0 +1,122 @@
+"""Пищевая ценность рецептов.
+
+Для ингредиента хранится вектор (калории, белки, жиры, углеводы) на
+одну его единицу измерения. Итог рецепта - скалярное произведение
+количеств ``IngredientRecipe`` на эти векторы; оно считается в базе
+одним ``UPDATE`` на пачку рецептов и хранится в индексированных
+колонках ``Recipe``, поэтому фильтр ``?max_calories=`` - поиск по
+индексу, без join на каждый запрос списка.
+
+Если ценность известна не для всех ингредиентов рецепта, итог - NULL:
+частичная сумма занижала бы ценность, и фильтры ``?max_*=`` находили бы
+такие рецепты. Фильтры NULL не пропускают.
+"""
+
+import csv
+
+from django.db import transaction
+from django.db.models import Count, F, FloatField, OuterRef, Subquery, Sum
+
+from .models import Ingredient, IngredientNutrition, IngredientRecipe, Recipe
+
+NUTRIENTS = ("calories", "proteins", "fats", "carbohydrates")
+
+
+def total(nutrient):
+    """Подзапрос: сумма количеств ингредиентов рецепта на их ценность.
+    Строки нет (NULL), если ценность известна не для всех ингредиентов."""
+    value = f"ingredient__nutrition__{nutrient}"
+    return Subquery(
+        IngredientRecipe.objects.filter(recipe=OuterRef("pk"))
+        .order_by()
+        .values("recipe")
+        .annotate(
+            total=Sum(F("amount") * F(value), output_field=FloatField()),
+            known=Count(value),
+            count=Count("pk"),
+        )
+        .filter(known=F("count"))
+        .values("total"),
+        output_field=FloatField(),
+    )
+
+
+def refresh_recipes(recipe_ids) -> int:
+    """Пересчитывает пищевую ценность рецептов."""
+    return Recipe.all_objects.filter(pk__in=recipe_ids).update(
+        **{nutrient: total(nutrient) for nutrient in NUTRIENTS}
+    )
+
+
+def refresh_for_ingredients(ingredient_ids, batch_size=1000) -> int:
+    """Пересчитывает рецепты, в которых есть ингредиенты."""
+    recipe_ids = sorted(
+        set(
+            IngredientRecipe.objects.filter(
+                ingredient_id__in=ingredient_ids
+            ).values_list("recipe_id", flat=True)
+        )
+    )
+    for start in range(0, len(recipe_ids), batch_size):
+        end = start + batch_size
+        refresh_recipes(recipe_ids[start:end])
+    return len(recipe_ids)
+
+
+def read_csv(path):
+    """Строки CSV: название, единица, калории, белки, жиры, углеводы и
+    необязательное количество единиц, к которому относятся значения
+    (по умолчанию 1, например 100 для таблиц "на 100 г")."""
+    with open(path, encoding="utf-8") as file:
+        for number, row in enumerate(csv.reader(file), start=1):
+            if not row:
+                continue
+            try:
+                name, unit = row[0].strip(), row[1].strip()
+                values = [float(value) for value in row[2:6]]
+                per = float(row[6]) if len(row) > 6 and row[6] else 1
+                if len(values) != len(NUTRIENTS) or per <= 0:
+                    raise ValueError
+            except (IndexError, ValueError):
+                raise ValueError(f"Строка {number}: некорректные данные")
+            yield name, unit, [value / per for value in values]
+
+
+def load(path, batch_size=1000):
+    """Загружает таблицу ценности из CSV и пересчитывает затронутые
+    рецепты. Возвращает число загруженных строк, неизвестных
+    ингредиентов и пересчитанных рецептов."""
+    ingredient_ids = {
+        (name, unit): pk
+        for pk, name, unit in Ingredient.objects.values_list(
+            "id", "name", "measurement_unit"
+        )
+    }
+    rows, missing = {}, 0
+    for name, unit, values in read_csv(path):
+        ingredient_id = ingredient_ids.get((name, unit))
+        if ingredient_id is None:
+            missing += 1
+            continue
+        rows[ingredient_id] = IngredientNutrition(
+            ingredient_id=ingredient_id, **dict(zip(NUTRIENTS, values))
+        )
+    with transaction.atomic():
+        IngredientNutrition.objects.filter(ingredient_id__in=rows).delete()
+        IngredientNutrition.objects.bulk_create(
+            rows.values(), batch_size=batch_size
+        )
+        recipes = refresh_for_ingredients(rows, batch_size)
+    return len(rows), missing, recipes
+
+
+def recipe_nutrition(recipe) -> dict:
+    """Ценность рецепта; ``None``, если она известна не полностью."""
+    return {
+        nutrient: (
+            None
+            if getattr(recipe, nutrient) is None
+            else round(getattr(recipe, nutrient), 1)
+        )
+        for nutrient in NUTRIENTS
+    }
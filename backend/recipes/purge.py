@@ -0,0 +1,104 @@
+"""Фоновое удаление помеченных рецептов и пользователей.
+
+Зависимые записи удаляются пачками в отдельных транзакциях, чтобы
+удаление популярного рецепта или активного автора не блокировало
+большие таблицы одной долгой транзакцией. Пачка удаляется одним DELETE
+без сигналов моделей: сводки удаленного рецепта уже вычтены при пометке,
+а то, что касается живых данных (рейтинги чужих рецептов, журналы
+изменений, граф подписок), обработчики сигнала ``purged`` делают сразу
+для всей пачки.
+"""
+
+from django.db import transaction
+from django.dispatch import Signal
+
+from users import data_export
+from users.models import DataExport, Follow, User
+
+from .models import (
+    Favorite,
+    IngredientRecipe,
+    MealPlanEntry,
+    MealPlanItem,
+    Recipe,
+    RecipeBucket,
+    RecipeRecommendation,
+    RecipeSignature,
+    ShoppingCart,
+    ShoppingListItem,
+)
+
+# Отправляется перед удалением пачки: ``sender`` - модель, ``queryset`` -
+# записи пачки.
+purged = Signal()
+
+
+def delete_in_batches(queryset, batch_size, progress=None) -> int:
+    """Удаляет записи ``queryset`` пачками по ``batch_size``."""
+    model = queryset.model
+    deleted = 0
+    while True:
+        batch = list(queryset.values_list("pk", flat=True)[:batch_size])
+        if not batch:
+            return deleted
+        with transaction.atomic():
+            rows = model._base_manager.filter(pk__in=batch)
+            purged.send(sender=model, queryset=rows)
+            rows._raw_delete(rows.db)
+        deleted += len(batch)
+        if progress:
+            progress(model._meta.verbose_name_plural, deleted)
+
+
+def purge_recipe(recipe_id, batch_size=1000, progress=None) -> None:
+    for queryset in (
+        Favorite.objects.filter(recipe_id=recipe_id),
+        ShoppingCart.objects.filter(recipe_id=recipe_id),
+        MealPlanEntry.objects.filter(recipe_id=recipe_id),
+        IngredientRecipe.objects.filter(recipe_id=recipe_id),
+        Recipe.tags.through.objects.filter(recipe_id=recipe_id),
+        RecipeRecommendation.objects.filter(recipe_id=recipe_id),
+        RecipeSignature.objects.filter(recipe_id=recipe_id),
+        RecipeBucket.objects.filter(recipe_id=recipe_id),
+    ):
+        delete_in_batches(queryset, batch_size, progress)
+    Recipe.all_objects.filter(pk=recipe_id, is_deleted=True).delete()
+
+
+def purge_user(user_id, batch_size=1000, progress=None) -> None:
+    # Рецепты удаленного автора очищаются пачками, а не каскадом от
+    # удаления пользователя.
+    for recipe_id in Recipe.all_objects.filter(author_id=user_id).values_list(
+        "pk", flat=True
+    ):
+        purge_recipe(recipe_id, batch_size, progress)
+    for queryset in (
+        Favorite.objects.filter(user_id=user_id),
+        ShoppingCart.objects.filter(user_id=user_id),
+        ShoppingListItem.objects.filter(user_id=user_id),
+        MealPlanEntry.objects.filter(user_id=user_id),
+        MealPlanItem.objects.filter(user_id=user_id),
+        Follow.objects.filter(user_id=user_id),
+        Follow.objects.filter(author_id=user_id),
+    ):
+        delete_in_batches(queryset, batch_size, progress)
+    data_export.delete_exports(DataExport.objects.filter(user_id=user_id))
+    User.all_objects.filter(pk=user_id, is_deleted=True).delete()
+
+
+def purge_deleted(batch_size=1000, progress=None):
+    """Удаляет все помеченные рецепты и пользователей. Возвращает число
+    удаленных рецептов и пользователей."""
+    recipe_ids = list(
+        Recipe.all_objects.filter(is_deleted=True)
+        .exclude(author__is_deleted=True)
+        .values_list("pk", flat=True)
+    )
+    for recipe_id in recipe_ids:
+        purge_recipe(recipe_id, batch_size, progress)
+    user_ids = list(
+        User.all_objects.filter(is_deleted=True).values_list("pk", flat=True)
+    )
+    for user_id in user_ids:
+        purge_user(user_id, batch_size, progress)
+    return len(recipe_ids), len(user_ids)
@@ -0,0 +1,250 @@
+"""Рекомендации рецептов по совместному добавлению в избранное.
+
+Матрица сходства item-item строится офлайн (команда
+``build_recommendations``): косинус по разреженным векторам
+"рецепт x пользователи" из ``Favorite`` плюс косинус по составу
+ингредиентов. Для каждого рецепта хранится только top-K похожих,
+упакованный в массивы, а выдача идет из памяти процесса.
+
+Инкрементальный расчет пересчитывает рецепты, затронутые с прошлого
+расчета: новые и удаленные (журнал ``FavoriteRemoval``) избранные,
+публикации и правки рецептов (``Recipe.updated``), и все рецепты,
+делящие с ними пользователей или ингредиенты.
+"""
+
+import heapq
+import math
+import time
+from array import array
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+import api.constants
+from api.invalidation import bus
+
+from .models import (
+    Favorite,
+    FavoriteRemoval,
+    IngredientRecipe,
+    Recipe,
+    RecipeRecommendation,
+)
+
+
+class SimilarityBuilder:
+    """Разреженные индексы избранного и ингредиентов для расчета top-K."""
+
+    def __init__(self):
+        self.recipe_users = defaultdict(list)
+        self.user_recipes = defaultdict(list)
+        favorites = Favorite.objects.order_by("user_id", "-created")
+        for user_id, recipe_id in favorites.values_list(
+            "user_id", "recipe_id"
+        ).iterator():
+            items = self.user_recipes[user_id]
+            if len(items) < api.constants.RECOMMENDATIONS_USER_ITEMS:
+                items.append(recipe_id)
+                self.recipe_users[recipe_id].append(user_id)
+
+        self.recipe_ingredients = defaultdict(list)
+        self.ingredient_recipes = defaultdict(list)
+        for recipe_id, ingredient_id in IngredientRecipe.objects.values_list(
+            "recipe_id", "ingredient_id"
+        ).iterator():
+            self.recipe_ingredients[recipe_id].append(ingredient_id)
+            self.ingredient_recipes[ingredient_id].append(recipe_id)
+        max_postings = max(
+            2,
+            int(
+                len(self.recipe_ingredients)
+                * api.constants.RECOMMENDATIONS_MAX_INGREDIENT_SHARE
+            ),
+        )
+        self.ingredient_recipes = {
+            ingredient_id: recipes
+            for ingredient_id, recipes in self.ingredient_recipes.items()
+            if len(recipes) <= max_postings
+        }
+
+    def cosine(self, target, vectors, postings) -> dict:
+        """Косинус бинарного вектора ``target`` со всеми, с кем он
+        пересекается; ``postings`` - обратный индекс."""
+        features = vectors.get(target, ())
+        if not features:
+            return {}
+        overlap = defaultdict(int)
+        for feature in features:
+            for other in postings.get(feature, ()):
+                if other != target:
+                    overlap[other] += 1
+        norm = len(features)
+        return {
+            other: count / math.sqrt(norm * len(vectors[other]))
+            for other, count in overlap.items()
+        }
+
+    def top_k(self, recipe_id):
+        scores = defaultdict(float)
+        for other, score in self.cosine(
+            recipe_id, self.recipe_users, self.user_recipes
+        ).items():
+            scores[other] += (
+                api.constants.RECOMMENDATIONS_FAVORITE_WEIGHT * score
+            )
+        for other, score in self.cosine(
+            recipe_id, self.recipe_ingredients, self.ingredient_recipes
+        ).items():
+            scores[other] += (
+                api.constants.RECOMMENDATIONS_INGREDIENT_WEIGHT * score
+            )
+        return heapq.nlargest(
+            api.constants.RECOMMENDATIONS_TOP_K,
+            scores.items(),
+            key=lambda item: item[1],
+        )
+
+    def co_favorited(self, recipe_ids) -> set:
+        """Рецепты, которые делят пользователей с ``recipe_ids``."""
+        result = set(recipe_ids)
+        for recipe_id in recipe_ids:
+            for user_id in self.recipe_users.get(recipe_id, ()):
+                result.update(self.user_recipes[user_id])
+        return result
+
+    def co_ingredient(self, recipe_ids) -> set:
+        """Рецепты, которые делят ингредиенты с ``recipe_ids``."""
+        result = set(recipe_ids)
+        for recipe_id in recipe_ids:
+            for ingredient_id in self.recipe_ingredients.get(recipe_id, ()):
+                result.update(self.ingredient_recipes.get(ingredient_id, ()))
+        return result
+
+
+def last_build_time():
+    return RecipeRecommendation.objects.aggregate(last=Max("updated"))["last"]
+
+
+def changed_recipes(builder, since) -> set:
+    """Рецепты, чьи рекомендации могли измениться после ``since``:
+    с новыми избранными; опубликованные или измененные (в том числе
+    состав) и делящие с ними ингредиенты; убранные из избранного и
+    остальные избранные тех, кто их убрал. Рецепты, которые делили
+    ингредиенты только с прежним составом, обновит полный расчет."""
+    changed = set(
+        Favorite.objects.filter(created__gt=since).values_list(
+            "recipe_id", flat=True
+        )
+    ) | builder.co_ingredient(
+        Recipe.objects.filter(updated__gt=since).values_list("id", flat=True)
+    )
+    for recipe_id, user_id in FavoriteRemoval.objects.filter(
+        created__gt=since
+    ).values_list("recipe_id", "user_id"):
+        changed.add(recipe_id)
+        changed.update(builder.user_recipes.get(user_id, ()))
+    return changed
+
+
+def build(full=False, batch_size=1000, progress=None) -> int:
+    """Пересчитывает top-K. Без ``full`` - только для рецептов, затронутых
+    изменениями с прошлого расчета (см. ``changed_recipes``)."""
+    since = None if full else last_build_time()
+    # Момент расчета фиксируется до чтения данных: изменения, сделанные
+    # во время чтения, попадут в следующий инкрементальный расчет.
+    now = timezone.now()
+    builder = SimilarityBuilder()
+    if since is None:
+        targets = set(Recipe.objects.values_list("id", flat=True))
+    else:
+        targets = builder.co_favorited(changed_recipes(builder, since))
+    targets = sorted(targets)
+    for start in range(0, len(targets), batch_size):
+        end = start + batch_size
+        batch = targets[start:end]
+        rows = []
+        for recipe_id in batch:
+            top = builder.top_k(recipe_id)
+            rows.append(
+                RecipeRecommendation(
+                    recipe_id=recipe_id,
+                    similar_ids=array("q", (i for i, _ in top)).tobytes(),
+                    scores=array("f", (s for _, s in top)).tobytes(),
+                    updated=now,
+                )
+            )
+        with transaction.atomic():
+            RecipeRecommendation.objects.filter(recipe_id__in=batch).delete()
+            RecipeRecommendation.objects.bulk_create(rows)
+        if progress:
+            progress(start + len(batch), len(targets))
+    FavoriteRemoval.objects.filter(created__lte=now).delete()
+    bus.publish("recommendations")
+    return len(targets)
+
+
+class RecommendationIndex:
+    """Top-K похожих рецептов в памяти процесса."""
+
+    def __init__(self):
+        self.similar = {}
+        self.version = None
+        self.bus_version = None
+        self.checked = 0.0
+
+    def refresh(self):
+        """Перезагружает top-K после сообщения шины о новом расчете или
+        раз в ``RECOMMENDATIONS_RELOAD_INTERVAL`` секунд."""
+        now = time.monotonic()
+        bus_version = bus.version("recommendations")
+        if (
+            bus_version == self.bus_version
+            and now - self.checked
+            < api.constants.RECOMMENDATIONS_RELOAD_INTERVAL
+        ):
+            return
+        self.checked, self.bus_version = now, bus_version
+        version = last_build_time()
+        if version == self.version:
+            return
+        similar = {}
+        for recipe_id, ids, scores in RecipeRecommendation.objects.values_list(
+            "recipe_id", "similar_ids", "scores"
+        ).iterator():
+            similar[recipe_id] = (
+                array("q", bytes(ids)),
+                array("f", bytes(scores)),
+            )
+        self.similar, self.version = similar, version
+
+    def for_recipe(self, recipe_id, limit):
+        self.refresh()
+        ids, _ = self.similar.get(recipe_id, ((), ()))
+        return list(ids[:limit])
+
+    def for_user(self, user, limit):
+        """Сумма top-K списков по последним избранным пользователя."""
+        self.refresh()
+        favorites = list(
+            user.favorites.order_by("-created").values_list(
+                "recipe_id", flat=True
+            )[: api.constants.RECOMMENDATIONS_USER_ITEMS]
+        )
+        seen = set(favorites)
+        scores = defaultdict(float)
+        for recipe_id in favorites:
+            ids, weights = self.similar.get(recipe_id, ((), ()))
+            for other, weight in zip(ids, weights):
+                if other not in seen:
+                    scores[other] += weight
+        return [
+            recipe_id
+            for recipe_id, _ in heapq.nlargest(
+                limit, scores.items(), key=lambda item: item[1]
+            )
+        ]
+
+
+index = RecommendationIndex()
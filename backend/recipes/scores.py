@@ -0,0 +1,166 @@
+"""Рейтинги рецептов для сортировки ``popular`` и ``trending``.
+
+``popularity`` - взвешенное число добавлений в избранное и корзину.
+``trending`` - логарифм суммы весов активности с экспоненциальным
+затуханием: вклад события ``w * 2 ** ((t - epoch) / half_life)``
+отсчитывается от фиксированной точки, поэтому старые значения не нужно
+пересчитывать со временем, а новое событие прибавляется одним UPDATE
+через log-sum-exp. Обе колонки индексированы, сортировка по ним - это
+проход по индексу. Команда ``refresh_recipe_scores`` пересчитывает
+рейтинги целиком.
+"""
+
+import math
+
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Exp, Greatest, Ln
+
+import api.constants
+
+from .models import Favorite, Recipe, ShoppingCart
+
+DECAY_TIME = api.constants.TRENDING_HALF_LIFE / math.log(2)
+# Нижняя граница показателя экспоненты: ниже PostgreSQL дает underflow
+MIN_EXPONENT = -700.0
+# Остаток после вычитания последнего вклада
+MIN_SHARE = 1e-12
+
+
+def activity_score(when, weight) -> float:
+    """Логарифм вклада события с весом ``weight`` в момент ``when``."""
+    return (
+        math.log(weight)
+        + (when.timestamp() - api.constants.TRENDING_EPOCH) / DECAY_TIME
+    )
+
+
+def add_activity(recipe_id, when, weight, popularity=True) -> None:
+    score = Value(activity_score(when, weight))
+    changes = {
+        "trending": score
+        + Ln(Value(1.0) + Exp(Greatest(F("trending") - score, MIN_EXPONENT)))
+    }
+    if popularity:
+        changes["popularity"] = F("popularity") + weight
+    Recipe.all_objects.filter(pk=recipe_id).update(**changes)
+
+
+def remove_activity(recipe_id, when, weight) -> None:
+    score = Value(activity_score(when, weight))
+    Recipe.all_objects.filter(pk=recipe_id).update(
+        popularity=F("popularity") - weight,
+        trending=F("trending")
+        + Ln(
+            Greatest(
+                Value(1.0)
+                - Exp(Greatest(score - F("trending"), MIN_EXPONENT)),
+                MIN_SHARE,
+            )
+        ),
+    )
+
+
+def favorite_added(favorite) -> None:
+    add_activity(
+        favorite.recipe_id,
+        favorite.created,
+        api.constants.POPULARITY_FAVORITE_WEIGHT,
+    )
+
+
+def favorite_removed(favorite) -> None:
+    remove_activity(
+        favorite.recipe_id,
+        favorite.created,
+        api.constants.POPULARITY_FAVORITE_WEIGHT,
+    )
+
+
+def cart_added(cart) -> None:
+    add_activity(
+        cart.recipe_id, cart.created, api.constants.POPULARITY_CART_WEIGHT
+    )
+
+
+def cart_removed(cart) -> None:
+    remove_activity(
+        cart.recipe_id, cart.created, api.constants.POPULARITY_CART_WEIGHT
+    )
+
+
+def recipe_published(recipe) -> None:
+    add_activity(
+        recipe.pk,
+        recipe.pub_date,
+        api.constants.TRENDING_PUBLISH_WEIGHT,
+        popularity=False,
+    )
+
+
+class ScoreAccumulator:
+    """Сумма весов и log-sum-exp вкладов по рецептам за один проход."""
+
+    def __init__(self):
+        self.popularity = {}
+        self.peak = {}
+        self.total = {}
+
+    def add(self, recipe_id, when, weight, popularity=True):
+        if popularity:
+            self.popularity[recipe_id] = (
+                self.popularity.get(recipe_id, 0) + weight
+            )
+        score = activity_score(when, weight)
+        peak = self.peak.get(recipe_id)
+        if peak is None:
+            self.peak[recipe_id], self.total[recipe_id] = score, 1.0
+        elif score > peak:
+            self.total[recipe_id] = (
+                self.total[recipe_id] * math.exp(peak - score) + 1
+            )
+            self.peak[recipe_id] = score
+        else:
+            self.total[recipe_id] += math.exp(score - peak)
+
+    def trending(self, recipe_id) -> float:
+        return self.peak[recipe_id] + math.log(self.total[recipe_id])
+
+
+def refresh(batch_size=1000, progress=None) -> int:
+    """Полный пересчет рейтингов всех рецептов."""
+    scores = ScoreAccumulator()
+    for recipe_id, pub_date in Recipe.all_objects.values_list(
+        "id", "pub_date"
+    ).iterator():
+        scores.add(
+            recipe_id,
+            pub_date,
+            api.constants.TRENDING_PUBLISH_WEIGHT,
+            popularity=False,
+        )
+    for model, weight in (
+        (Favorite, api.constants.POPULARITY_FAVORITE_WEIGHT),
+        (ShoppingCart, api.constants.POPULARITY_CART_WEIGHT),
+    ):
+        for recipe_id, created in model.objects.values_list(
+            "recipe_id", "created"
+        ).iterator():
+            if recipe_id in scores.peak:
+                scores.add(recipe_id, created, weight)
+    recipe_ids = sorted(scores.peak)
+    for start in range(0, len(recipe_ids), batch_size):
+        end = start + batch_size
+        batch = [
+            Recipe(
+                pk=recipe_id,
+                popularity=scores.popularity.get(recipe_id, 0),
+                trending=scores.trending(recipe_id),
+            )
+            for recipe_id in recipe_ids[start:end]
+        ]
+        with transaction.atomic():
+            Recipe.all_objects.bulk_update(batch, ("popularity", "trending"))
+        if progress:
+            progress(start + len(batch), len(recipe_ids))
+    return len(recipe_ids)
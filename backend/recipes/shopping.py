@@ -0,0 +1,328 @@
+"""Сводный список покупок.
+
+Строки ``IngredientRecipe`` приводятся к каноническому названию и базовой
+единице измерения и суммируются за один проход. Итоги хранятся в
+``ShoppingListItem`` и обновляются инкрементально при изменении корзины,
+поэтому выгрузка списка не пересчитывает GROUP BY. Так же по неделям
+ведется сводка плана питания (``MealPlanItem``) с учетом порций.
+
+Все изменения сводок пользователя идут под блокировкой его строки
+``User``: одновременные добавления не создают одну строку итогов дважды
+и не теряют прибавку, а полный пересчет не затирает изменения, сделанные
+во время чтения. Удаленный рецепт вычитается из сводок сразу при
+пометке, поэтому последующее удаление его записей фоновой задачей их
+уже не меняет. Смена состава рецепта прибавляет к сводкам его
+пользователей разницу итогов до и после изменения.
+
+Количества хранятся в ``Decimal``: многократные прибавки и вычитания не
+накапливают ошибку округления, и сводка совпадает с полным пересчетом.
+"""
+
+import re
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+
+import api.constants
+
+from .models import (
+    IngredientRecipe,
+    MealPlanEntry,
+    MealPlanItem,
+    Recipe,
+    ShoppingCart,
+    ShoppingListItem,
+)
+
+ROW_FIELDS = ("ingredient__name", "ingredient__measurement_unit", "amount")
+SPACES = re.compile(r"\s+")
+
+
+def canonical_name(name: str) -> str:
+    name = SPACES.sub(" ", name.strip().lower().replace("ё", "е"))
+    return api.constants.INGREDIENT_SYNONYMS.get(name, name)
+
+
+def canonical_unit(unit: str):
+    """Базовая единица и множитель перевода в нее."""
+    unit = SPACES.sub(" ", unit.strip().lower())
+    base_unit, multiplier = api.constants.UNIT_CONVERSIONS.get(unit, (unit, 1))
+    return base_unit, Decimal(str(multiplier))
+
+
+def aggregate(rows, factor=1) -> dict:
+    """Суммирует строки (название, единица, количество) по каноническому
+    ключу (название, базовая единица)."""
+    totals = defaultdict(Decimal)
+    for name, unit, amount in rows:
+        base_unit, multiplier = canonical_unit(unit)
+        totals[canonical_name(name), base_unit] += amount * multiplier * factor
+    return totals
+
+
+def recipe_totals(recipe_ids, factor=1) -> dict:
+    return aggregate(
+        IngredientRecipe.objects.filter(recipe__in=recipe_ids).values_list(
+            *ROW_FIELDS
+        ),
+        factor,
+    )
+
+
+def live_totals(recipe_id, factor=1) -> dict:
+    """Итоги рецепта; пустые, если он помечен удаленным (его итоги уже
+    вычтены из сводок)."""
+    return recipe_totals(Recipe.objects.filter(pk=recipe_id), factor)
+
+
+def display_amount(unit: str, amount: Decimal):
+    """Переводит итог в крупную единицу, если он достаточно велик."""
+    if unit in api.constants.UNIT_DISPLAY:
+        big_unit, threshold = api.constants.UNIT_DISPLAY[unit]
+        if amount >= threshold:
+            unit, amount = big_unit, amount / threshold
+    return unit, float(round(amount, api.constants.AMOUNT_PRECISION))
+
+
+def lock_users(user_ids) -> None:
+    """Блокирует строки пользователей до конца транзакции; порядок по
+    ``pk`` исключает взаимную блокировку."""
+    list(
+        get_user_model()
+        .objects.select_for_update()
+        .filter(pk__in=user_ids)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+
+
+def apply_totals(
+    user_ids, totals: dict, sign=1, model=ShoppingListItem, **scope
+) -> None:
+    """Прибавляет (или вычитает) итоги к сводкам пользователей: по
+    запросу на ингредиент для всех пользователей сразу. Итоги могут быть
+    разного знака (разница составов рецепта). ``scope`` - дополнительные
+    поля ключа сводки (неделя плана)."""
+    user_ids = set(user_ids)
+    if not totals or not user_ids:
+        return
+    with transaction.atomic():
+        lock_users(user_ids)
+        for (name, unit), amount in totals.items():
+            amount *= sign
+            items = model.objects.filter(
+                user_id__in=user_ids, name=name, measurement_unit=unit, **scope
+            )
+            items.update(amount=F("amount") + amount)
+            if amount <= 0:
+                continue
+            missing = user_ids - set(items.values_list("user_id", flat=True))
+            model.objects.bulk_create(
+                model(
+                    user_id=user_id,
+                    name=name,
+                    measurement_unit=unit,
+                    amount=amount,
+                    **scope,
+                )
+                for user_id in sorted(missing)
+            )
+        model.objects.filter(
+            user_id__in=user_ids, amount__lte=0, **scope
+        ).delete()
+
+
+def difference(after: dict, before: dict) -> dict:
+    """Ненулевая разница итогов ``after - before``."""
+    delta = {
+        key: after.get(key, 0) - before.get(key, 0)
+        for key in after.keys() | before.keys()
+    }
+    return {key: amount for key, amount in delta.items() if amount}
+
+
+def scaled(totals: dict, factor) -> dict:
+    return {key: amount * factor for key, amount in totals.items()}
+
+
+def week_of(date):
+    """Понедельник недели, к которой относится дата."""
+    return date - timedelta(days=date.weekday())
+
+
+def cart_added(user_id, recipe_id, sign=1) -> None:
+    with transaction.atomic():
+        # Итоги читаются под блокировкой: пометка рецепта удаленным
+        # (recipes_deleted) либо уже видна, либо еще не вычитала их.
+        lock_users([user_id])
+        apply_totals([user_id], live_totals(recipe_id), sign)
+
+
+def cart_removed(user_id, recipe_id) -> None:
+    cart_added(user_id, recipe_id, sign=-1)
+
+
+def cart_users(recipe_ids) -> dict:
+    """Пользователи, у которых рецепт в корзине: рецепт -> множество."""
+    users = defaultdict(set)
+    for user_id, recipe_id in ShoppingCart.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list("user_id", "recipe_id"):
+        users[recipe_id].add(user_id)
+    return users
+
+
+def plan_users(recipe_ids) -> dict:
+    """Пользователи рецепта в плане питания: (рецепт, неделя, порции за
+    неделю) -> множество пользователей."""
+    servings = defaultdict(int)
+    for (
+        user_id,
+        recipe_id,
+        date,
+        entry_servings,
+    ) in MealPlanEntry.objects.filter(recipe_id__in=recipe_ids).values_list(
+        "user_id", "recipe_id", "date", "servings"
+    ):
+        servings[user_id, recipe_id, week_of(date)] += entry_servings
+    users = defaultdict(set)
+    for (user_id, recipe_id, week), factor in servings.items():
+        users[recipe_id, week, factor].add(user_id)
+    return users
+
+
+def apply_to_users(recipe_totals_by_id: dict, sign=1) -> None:
+    """Прибавляет итоги рецептов к корзинам и планам всех их
+    пользователей. Вызывается в транзакции изменения рецептов."""
+    with transaction.atomic():
+        recipe_ids = list(recipe_totals_by_id)
+        lock_users(
+            set(
+                ShoppingCart.objects.filter(
+                    recipe_id__in=recipe_ids
+                ).values_list("user_id", flat=True)
+            )
+            | set(
+                MealPlanEntry.objects.filter(
+                    recipe_id__in=recipe_ids
+                ).values_list("user_id", flat=True)
+            )
+        )
+        # Корзины и план читаются заново уже под блокировкой.
+        for recipe_id, user_ids in cart_users(recipe_ids).items():
+            apply_totals(user_ids, recipe_totals_by_id[recipe_id], sign)
+        for (recipe_id, week, factor), user_ids in plan_users(
+            recipe_ids
+        ).items():
+            apply_totals(
+                user_ids,
+                scaled(recipe_totals_by_id[recipe_id], factor),
+                sign,
+                model=MealPlanItem,
+                week=week,
+            )
+
+
+def recipe_ingredients_changed(recipe_id, before: dict) -> None:
+    """Прибавляет к сводкам пользователей рецепта разницу его итогов
+    после изменения состава и до него (``before`` - ``live_totals``,
+    прочитанные до изменения). Вызывается в транзакции изменения."""
+    delta = difference(live_totals(recipe_id), before)
+    if delta:
+        apply_to_users({recipe_id: delta})
+
+
+def plan_entry_added(entry, sign=1) -> None:
+    with transaction.atomic():
+        lock_users([entry.user_id])
+        apply_totals(
+            [entry.user_id],
+            live_totals(entry.recipe_id, entry.servings),
+            sign,
+            model=MealPlanItem,
+            week=week_of(entry.date),
+        )
+
+
+def plan_entry_removed(entry) -> None:
+    plan_entry_added(entry, sign=-1)
+
+
+def recipes_deleted(recipe_ids) -> None:
+    """Вычитает рецепты, только что помеченные удаленными, из сводок
+    всех, у кого они в корзине или в плане питания. Вызывается в одной
+    транзакции с пометкой."""
+    apply_to_users(
+        {recipe_id: recipe_totals([recipe_id]) for recipe_id in recipe_ids},
+        sign=-1,
+    )
+
+
+def rebuild(user_id) -> None:
+    """Полный пересчет сводки пользователя."""
+    with transaction.atomic():
+        lock_users([user_id])
+        totals = aggregate(
+            IngredientRecipe.objects.filter(
+                recipe__shopping_list__user=user_id,
+                recipe__is_deleted=False,
+            ).values_list(*ROW_FIELDS)
+        )
+        ShoppingListItem.objects.filter(user_id=user_id).delete()
+        ShoppingListItem.objects.bulk_create(
+            ShoppingListItem(
+                user_id=user_id,
+                name=name,
+                measurement_unit=unit,
+                amount=amount,
+            )
+            for (name, unit), amount in totals.items()
+        )
+
+
+def rebuild_plan(user_id) -> None:
+    """Полный пересчет сводок плана питания пользователя."""
+    recipe_cache = {}
+    totals = defaultdict(lambda: defaultdict(Decimal))
+    with transaction.atomic():
+        lock_users([user_id])
+        for recipe_id, date, servings in MealPlanEntry.objects.filter(
+            user_id=user_id, recipe__is_deleted=False
+        ).values_list("recipe_id", "date", "servings"):
+            if recipe_id not in recipe_cache:
+                recipe_cache[recipe_id] = recipe_totals([recipe_id])
+            week_totals = totals[week_of(date)]
+            for key, amount in recipe_cache[recipe_id].items():
+                week_totals[key] += amount * servings
+        MealPlanItem.objects.filter(user_id=user_id).delete()
+        MealPlanItem.objects.bulk_create(
+            MealPlanItem(
+                user_id=user_id,
+                week=week,
+                name=name,
+                measurement_unit=unit,
+                amount=amount,
+            )
+            for week, week_totals in totals.items()
+            for (name, unit), amount in week_totals.items()
+        )
+
+
+def shopping_list(user):
+    """Итоги для вывода: (название, единица, количество)."""
+    for item in ShoppingListItem.objects.filter(user=user).order_by("name"):
+        unit, amount = display_amount(item.measurement_unit, item.amount)
+        yield item.name, unit, amount
+
+
+def plan_shopping_list(user, week):
+    """Итоги плана питания за неделю для вывода."""
+    for item in MealPlanItem.objects.filter(
+        user=user, week=week_of(week)
+    ).order_by("name"):
+        unit, amount = display_amount(item.measurement_unit, item.amount)
+        yield item.name, unit, amount
@@ -0,0 +1,168 @@
+from django.db.models import F
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from api.cache import invalidate
+from jobs.queue import enqueue
+
+from . import purge, scores, shopping
+from .models import (
+    Favorite,
+    FavoriteRemoval,
+    IngredientDeletion,
+    Ingredient,
+    IngredientNutrition,
+    MealPlanEntry,
+    Recipe,
+    ShoppingCart,
+    Tag,
+)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_added(sender, instance, created, **kwargs):
+    if created:
+        shopping.cart_added(instance.user_id, instance.recipe_id)
+        scores.cart_added(instance)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def shopping_cart_removed(sender, instance, **kwargs):
+    # pre_delete: при каскадном удалении рецепта его ингредиенты
+    # еще не удалены и итоги можно вычесть.
+    shopping.cart_removed(instance.user_id, instance.recipe_id)
+    scores.cart_removed(instance)
+
+
+@receiver(pre_save, sender=MealPlanEntry)
+def meal_plan_entry_changing(sender, instance, **kwargs):
+    # Прежние рецепт, дата и порции - чтобы вычесть их из сводки.
+    instance.previous = (
+        MealPlanEntry.objects.filter(pk=instance.pk).first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=MealPlanEntry)
+def meal_plan_entry_saved(sender, instance, **kwargs):
+    if instance.previous is not None:
+        shopping.plan_entry_removed(instance.previous)
+    shopping.plan_entry_added(instance)
+
+
+@receiver(pre_delete, sender=MealPlanEntry)
+def meal_plan_entry_removed(sender, instance, **kwargs):
+    shopping.plan_entry_removed(instance)
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_added(sender, instance, created, **kwargs):
+    if created:
+        scores.favorite_added(instance)
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_removed(sender, instance, **kwargs):
+    scores.favorite_removed(instance)
+    FavoriteRemoval.objects.create(
+        recipe_id=instance.recipe_id, user_id=instance.user_id
+    )
+
+
+@receiver(purge.purged, sender=Favorite)
+def favorites_purged(sender, queryset, **kwargs):
+    # Избранное удаленного пользователя у живых рецептов.
+    favorites = list(queryset.filter(recipe__is_deleted=False))
+    for favorite in favorites:
+        scores.favorite_removed(favorite)
+    FavoriteRemoval.objects.bulk_create(
+        FavoriteRemoval(recipe_id=favorite.recipe_id, user_id=favorite.user_id)
+        for favorite in favorites
+    )
+
+
+@receiver(purge.purged, sender=ShoppingCart)
+def carts_purged(sender, queryset, **kwargs):
+    for cart in queryset.filter(recipe__is_deleted=False):
+        scores.cart_removed(cart)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        invalidate("recipes")
+    else:
+        invalidate("recipes", f"recipes-{instance.pk}")
+    if not reverse:
+        instance.refresh_tags_mask()
+        return
+    recipes = Recipe.all_objects.filter(pk__in=pk_set or ())
+    if action == "post_add":
+        recipes.update(
+            tags_mask=F("tags_mask").bitor(instance.mask),
+            updated=timezone.now(),
+        )
+    else:
+        for recipe in recipes:
+            recipe.refresh_tags_mask()
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    # Бит освобождается для нового тега, поэтому снимаем его с рецептов.
+    if instance.bit is not None:
+        Recipe.all_objects.filter(tags=instance).update(
+            tags_mask=F("tags_mask").bitand(~instance.mask),
+            updated=timezone.now(),
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, **kwargs):
+    if created:
+        scores.recipe_published(instance)
+    invalidate("recipes", f"recipes-{instance.pk}")
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    invalidate("recipes", f"recipes-{instance.pk}")
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    invalidate("recipes")
+    invalidate("tags", f"tags-{instance.pk}")
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    invalidate("ingredients", f"ingredients-{instance.pk}")
+
+
+@receiver(post_delete, sender=Ingredient)
+def ingredient_deleted(sender, instance, **kwargs):
+    IngredientDeletion.objects.create(ingredient_id=instance.pk)
+
+
+@receiver(post_save, sender=IngredientNutrition)
+@receiver(post_delete, sender=IngredientNutrition)
+def nutrition_changed(sender, instance, **kwargs):
+    # Рецептов с ингредиентом может быть много - пересчет в фоне.
+    enqueue(
+        "recipes.refresh_nutrition",
+        instance.ingredient_id,
+        dedup_key=f"nutrition-{instance.ingredient_id}",
+    )
@@ -0,0 +1,78 @@
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+from PIL import Image
+
+HASHED_NAME = re.compile(r"(^|/)[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$")
+# Форматы PIL, у которых расширение не совпадает с названием.
+FORMAT_EXTENSIONS = {"JPEG": "jpg", "MPO": "jpg"}
+
+
+def image_extension(image_format) -> str:
+    """Расширение файла по формату, определенному PIL."""
+    return FORMAT_EXTENSIONS.get(image_format, image_format.lower())
+
+
+@deconstructible
+class ContentHashStorage(FileSystemStorage):
+    """Хранилище с именами по sha256 содержимого.
+
+    Файл сохраняется как ``<каталог>/<2 символа хэша>/<хэш>.<расширение>``:
+    одинаковые загрузки хранятся один раз, а адрес файла никогда не
+    меняет содержимое, поэтому его можно кэшировать навсегда.
+    """
+
+    @staticmethod
+    def content_hash(content) -> str:
+        digest = hashlib.sha256()
+        if hasattr(content, "seek"):
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, "seek"):
+            content.seek(0)
+        return digest.hexdigest()
+
+    @staticmethod
+    def is_hashed(name) -> bool:
+        return bool(HASHED_NAME.search(name))
+
+    @staticmethod
+    def extension(filename, content) -> str:
+        """Расширение по формату изображения, а не по имени: из data URI
+        приходят и такие, как ``svg+xml``. Для прочих файлов - буквы и
+        цифры расширения имени."""
+        try:
+            with Image.open(content) as image:
+                ext = image_extension(image.format)
+        except Exception:
+            ext = os.path.splitext(filename)[1]
+        finally:
+            if hasattr(content, "seek"):
+                content.seek(0)
+        ext = re.sub(r"\W", "", ext.lower())
+        return f".{ext}" if ext else ""
+
+    def hashed_name(self, name, content) -> str:
+        directory, filename = os.path.split(name)
+        ext = self.extension(filename, content)
+        digest = self.content_hash(content)
+        return os.path.join(directory, digest[:2], digest + ext)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # Имя уже уникально по содержимому; суффикс нужен только при
+        # одновременной загрузке одинаковых файлов.
+        if not self.exists(name):
+            return name
+        return super().get_available_name(name, max_length)
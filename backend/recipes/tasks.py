@@ -0,0 +1,31 @@
+"""Фоновые задачи рецептов (см. ``jobs.queue``)."""
+
+from jobs.queue import task
+
+from . import duplicates, nutrition, purge
+
+
+@task("recipes.purge_recipe")
+def purge_recipe(recipe_id):
+    purge.purge_recipe(recipe_id)
+
+
+@task("recipes.purge_user")
+def purge_user(user_id):
+    purge.purge_user(user_id)
+
+
+@task("recipes.index_duplicates")
+def index_duplicates(recipe_id):
+    duplicates.index_recipes([recipe_id])
+    duplicates.schedule_pairs()
+
+
+@task("recipes.refresh_duplicate_pairs")
+def refresh_duplicate_pairs():
+    duplicates.refresh_pairs()
+
+
+@task("recipes.refresh_nutrition")
+def refresh_nutrition(ingredient_id):
+    nutrition.refresh_for_ingredients([ingredient_id])
@@ -0,0 +1,125 @@
+import base64
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from recipes import importer
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+
+def png_uri(header="data:image/png", color="red") -> str:
+    buffer = io.BytesIO()
+    Image.new("RGB", (2, 2), color).save(buffer, format="PNG")
+    return header + ";base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+class RecipeImporterTest(TestCase):
+    """Ошибки строк импорта не прерывают остальные строки."""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        settings = override_settings(MEDIA_ROOT=self.media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.author = User.objects.create_user(
+            email="author@a.ru", username="author", password="x"
+        )
+        self.tag = Tag.objects.create(
+            name="Завтрак", color="#E26C2D", slug="breakfast"
+        )
+        self.ingredient = Ingredient.objects.create(
+            name="мука", measurement_unit="г"
+        )
+
+    def line(self, **fields) -> str:
+        data = {
+            "name": "Блины",
+            "text": "...",
+            "cooking_time": 10,
+            "tags": [self.tag.pk],
+            "ingredients": [{"id": self.ingredient.pk, "amount": 100}],
+            "image": png_uri(),
+        }
+        data.update(fields)
+        return json.dumps(data)
+
+    def run_import(self, *lines) -> dict:
+        return importer.RecipeImporter(self.author, workers=2).run(lines)
+
+    def errors(self, report) -> dict:
+        return {error["line"]: error["errors"] for error in report["errors"]}
+
+    def test_broken_images_are_line_errors(self):
+        broken = (
+            "data:image/png;base64,"
+            + base64.b64encode(b"\x89PNG\r\n\x1a\n" + b"\x00" * 64).decode()
+        )
+        report = self.run_import(
+            self.line(image=broken), self.line(image="нет"), self.line()
+        )
+        self.assertEqual(report["created"], 1)
+        self.assertEqual(set(self.errors(report)), {1, 2})
+
+    def test_pil_exceptions_do_not_abort_import(self):
+        for error in (Image.DecompressionBombError("bomb"), SyntaxError()):
+            with self.subTest(error=type(error).__name__):
+                with mock.patch.object(
+                    importer.Image, "open", side_effect=error
+                ):
+                    report = self.run_import(self.line())
+                self.assertEqual(report["created"], 0)
+                self.assertIn("image", self.errors(report)[1])
+
+    def test_extension_from_image_format(self):
+        report = self.run_import(
+            self.line(image=png_uri("data:image/svg+xml"))
+        )
+        self.assertEqual(report["created"], 1)
+        self.assertTrue(Recipe.objects.get().image.name.endswith(".png"))
+
+    def test_booleans_are_not_integers(self):
+        report = self.run_import(
+            self.line(cooking_time=True),
+            self.line(tags=[True]),
+            self.line(
+                ingredients=[{"id": self.ingredient.pk, "amount": True}]
+            ),
+        )
+        self.assertEqual(report["created"], 0)
+        self.assertEqual(
+            self.errors(report),
+            {
+                1: {"cooking_time": "Некорректное время готовки"},
+                2: {"tags": "Несуществующий тег"},
+                3: {"ingredients": "Количество ингредиента больше 0"},
+            },
+        )
+
+    def test_failed_batch_deletes_saved_images(self):
+        self.run_import(self.line(image=png_uri(color="blue")))
+        kept = Recipe.objects.get().image.name
+        with mock.patch.object(
+            importer.nutrition,
+            "refresh_recipes",
+            side_effect=DatabaseError("fail"),
+        ):
+            report = self.run_import(
+                self.line(image=png_uri(color="blue")), self.line()
+            )
+        self.assertEqual(report["created"], 0)
+        self.assertIn("database", self.errors(report)[1])
+        files = [
+            os.path.join(directory, name)
+            for directory, _, names in os.walk(self.media)
+            for name in names
+        ]
+        self.assertEqual(files, [os.path.join(self.media, kept)])
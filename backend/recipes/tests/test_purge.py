@@ -0,0 +1,141 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from analytics.models import RecipeChange
+from jobs.models import Job
+from recipes import purge
+from recipes.models import (
+    Favorite,
+    FavoriteRemoval,
+    Ingredient,
+    IngredientRecipe,
+    Recipe,
+    ShoppingCart,
+    ShoppingListItem,
+)
+from users.models import Follow, User
+
+
+class SoftDeleteUserTest(TestCase):
+    """Мягкое удаление автора и фоновая очистка его данных."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            email="author@a.ru", username="author", password="x"
+        )
+        self.reader = User.objects.create_user(
+            email="reader@a.ru", username="reader", password="x"
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author,
+            name="Блины",
+            image="recipes/image/blini.png",
+            text="...",
+            cooking_time=10,
+        )
+        IngredientRecipe.objects.create(
+            recipe=self.recipe,
+            ingredient=Ingredient.objects.create(
+                name="мука", measurement_unit="г"
+            ),
+            amount=200,
+        )
+        ShoppingCart.objects.create(user=self.reader, recipe=self.recipe)
+
+    def test_flags_subtracts_and_enqueues_together(self):
+        self.author.soft_delete()
+        self.assertTrue(User.all_objects.get(pk=self.author.pk).is_deleted)
+        self.assertFalse(Recipe.objects.filter(pk=self.recipe.pk).exists())
+        self.assertFalse(
+            ShoppingListItem.objects.filter(user=self.reader).exists()
+        )
+        self.assertTrue(
+            Job.objects.filter(
+                name="recipes.purge_user", status=Job.QUEUED
+            ).exists()
+        )
+
+    def test_purge_job_is_not_committed_without_flags(self):
+        with mock.patch(
+            "recipes.shopping.recipes_deleted", side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                self.author.soft_delete()
+        self.assertFalse(Job.objects.exists())
+        self.assertFalse(User.all_objects.get(pk=self.author.pk).is_deleted)
+        self.assertTrue(Recipe.objects.filter(pk=self.recipe.pk).exists())
+
+    def test_purge_user_removes_everything(self):
+        self.author.soft_delete()
+        purge.purge_user(self.author.pk)
+        self.assertFalse(User.all_objects.filter(pk=self.author.pk).exists())
+        self.assertFalse(Recipe.all_objects.exists())
+        self.assertFalse(ShoppingCart.objects.exists())
+        self.assertFalse(IngredientRecipe.objects.exists())
+        self.assertTrue(User.objects.filter(pk=self.reader.pk).exists())
+
+
+class PurgeBatchesTest(TestCase):
+    """Пачки удаляются без сигналов моделей, живые данные поправляются
+    обработчиками ``purged``."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            email="author@a.ru", username="author", password="x"
+        )
+        self.fan = User.objects.create_user(
+            email="fan@a.ru", username="fan", password="x"
+        )
+        self.live = Recipe.objects.create(
+            author=self.author,
+            name="Щи",
+            image="recipes/image/shchi.png",
+            text="...",
+            cooking_time=10,
+        )
+        self.deleted = Recipe.objects.create(
+            author=self.fan,
+            name="Борщ",
+            image="recipes/image/borsch.png",
+            text="...",
+            cooking_time=10,
+        )
+        for recipe in (self.live, self.deleted):
+            Favorite.objects.create(user=self.fan, recipe=recipe)
+        Follow.objects.create(user=self.fan, author=self.author)
+        FavoriteRemoval.objects.all().delete()
+        RecipeChange.objects.all().delete()
+
+    def test_deleted_recipe_rows_need_no_compensation(self):
+        self.deleted.soft_delete()
+        with mock.patch("recipes.signals.scores") as scores:
+            purge.purge_recipe(self.deleted.pk)
+        scores.favorite_removed.assert_not_called()
+        self.assertFalse(FavoriteRemoval.objects.exists())
+        self.assertFalse(RecipeChange.objects.exists())
+        self.assertFalse(
+            Recipe.all_objects.filter(pk=self.deleted.pk).exists()
+        )
+        self.assertTrue(Favorite.objects.filter(recipe=self.live).exists())
+
+    def test_user_purge_updates_live_recipes_in_bulk(self):
+        popularity = Recipe.objects.get(pk=self.live.pk).popularity
+        self.fan.soft_delete()
+        with mock.patch("users.signals.bus") as bus:
+            purge.purge_user(self.fan.pk)
+        self.assertLess(
+            Recipe.objects.get(pk=self.live.pk).popularity, popularity
+        )
+        self.assertEqual(
+            list(FavoriteRemoval.objects.values_list("recipe_id", "user_id")),
+            [(self.live.pk, self.fan.pk)],
+        )
+        self.assertEqual(
+            list(RecipeChange.objects.values_list("recipe_id", flat=True)),
+            [self.live.pk],
+        )
+        bus.publish.assert_called_once_with(
+            "follows", f"unfollow:{self.fan.pk}:{self.author.pk}"
+        )
+        self.assertFalse(Favorite.objects.exists())
@@ -0,0 +1,100 @@
+import datetime
+from decimal import Decimal
+
+from django.test import TestCase
+
+from recipes import shopping
+from recipes.models import (
+    Ingredient,
+    IngredientRecipe,
+    MealPlanEntry,
+    MealPlanItem,
+    Recipe,
+    ShoppingCart,
+    ShoppingListItem,
+)
+from users.models import User
+
+
+class ShoppingSummaryTest(TestCase):
+    """Инкрементальные сводки покупок совпадают с полным пересчетом."""
+
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(
+                email=f"{name}@a.ru", username=name, password="x"
+            )
+            for name in ("anna", "boris")
+        ]
+        self.recipe = Recipe.objects.create(
+            author=self.users[0],
+            name="Блины",
+            image="recipes/image/x.png",
+            text="...",
+            cooking_time=10,
+        )
+        self.flour = self.ingredient("мука", "г", 200)
+        self.milk = self.ingredient("молоко", "л", 1)
+        for user in self.users:
+            ShoppingCart.objects.create(user=user, recipe=self.recipe)
+        MealPlanEntry.objects.create(
+            user=self.users[0],
+            recipe=self.recipe,
+            date=datetime.date(2024, 5, 6),
+            servings=2,
+        )
+
+    def ingredient(self, name, unit, amount) -> IngredientRecipe:
+        return IngredientRecipe.objects.create(
+            recipe=self.recipe,
+            ingredient=Ingredient.objects.create(
+                name=name, measurement_unit=unit
+            ),
+            amount=amount,
+        )
+
+    def summaries(self):
+        return (
+            set(
+                ShoppingListItem.objects.values_list(
+                    "user_id", "name", "measurement_unit", "amount"
+                )
+            ),
+            set(
+                MealPlanItem.objects.values_list(
+                    "user_id", "week", "name", "measurement_unit", "amount"
+                )
+            ),
+        )
+
+    def rebuilt(self):
+        for user in self.users:
+            shopping.rebuild(user.pk)
+            shopping.rebuild_plan(user.pk)
+        return self.summaries()
+
+    def test_ingredients_change_applies_delta(self):
+        before = shopping.live_totals(self.recipe.pk)
+        self.milk.delete()
+        self.flour.amount = 300
+        self.flour.save()
+        self.ingredient("ваниль", "мг", 7)
+        shopping.recipe_ingredients_changed(self.recipe.pk, before)
+        incremental = self.summaries()
+        self.assertIn(
+            (self.users[1].pk, "мука", "г", Decimal(300)), incremental[0]
+        )
+        self.assertNotIn(
+            "молоко", {item[1] for item in incremental[0] | incremental[1]}
+        )
+        self.assertEqual(incremental, self.rebuilt())
+
+    def test_totals_are_exact(self):
+        vanilla = self.ingredient("ваниль", "мг", 1)
+        totals = shopping.aggregate(
+            [("ваниль", "мг", vanilla.amount)] * 10, factor=3
+        )
+        self.assertEqual(totals["ваниль", "г"], Decimal("0.030"))
+        self.assertEqual(
+            shopping.display_amount("г", Decimal("1500")), ("кг", 1.5)
+        )
@@ -0,0 +1,69 @@
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from recipes.models import Recipe
+from recipes.storage import ContentHashStorage
+from users.models import User
+
+
+def png() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (2, 2), "red").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class ContentHashStorageTest(TestCase):
+    """Имена файлов по хэшу содержимого и формату изображения."""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        settings = override_settings(MEDIA_ROOT=self.media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.storage = Recipe._meta.get_field("image").storage
+
+    def test_extension_from_image_format(self):
+        name = self.storage.save("recipes/image/x.svg+xml", ContentFile(png()))
+        self.assertTrue(name.endswith(".png"))
+        self.assertTrue(self.storage.is_hashed(name))
+
+    def test_extension_of_other_files(self):
+        self.assertEqual(
+            ContentHashStorage.extension("a.T+xt", ContentFile(b"text")),
+            ".txt",
+        )
+        self.assertEqual(
+            ContentHashStorage.extension("a", ContentFile(b"text")), ""
+        )
+
+    def test_rehash_media_bumps_updated(self):
+        os.makedirs(os.path.join(self.media, "recipes/image"))
+        with open(
+            os.path.join(self.media, "recipes/image/old.png"), "wb"
+        ) as file:
+            file.write(png())
+        recipe = Recipe.objects.create(
+            author=User.objects.create_user(
+                email="author@a.ru", username="author", password="x"
+            ),
+            name="Блины",
+            image="recipes/image/old.png",
+            text="...",
+            cooking_time=10,
+        )
+        long_ago = timezone.now() - timedelta(days=1)
+        Recipe.objects.filter(pk=recipe.pk).update(updated=long_ago)
+        call_command("rehash_media", stdout=io.StringIO())
+        recipe.refresh_from_db()
+        self.assertTrue(self.storage.is_hashed(recipe.image.name))
+        self.assertGreater(recipe.updated, long_ago)
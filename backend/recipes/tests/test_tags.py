@@ -0,0 +1,33 @@
+from unittest import mock
+
+from django.db import IntegrityError
+from django.test import TestCase
+
+from recipes.models import Tag
+
+
+class TagBitTest(TestCase):
+    """Биты маски тегов."""
+
+    def test_concurrent_bit_is_retried(self):
+        first = Tag.objects.create(name="Обед", color="#111111", slug="lunch")
+        second = Tag(name="Ужин", color="#222222", slug="dinner")
+        # Как будто второй тег выбрал бит до вставки первого.
+        with mock.patch.object(
+            Tag, "free_bit", side_effect=[first.bit, first.bit + 1]
+        ):
+            second.save()
+        self.assertEqual(second.bit, first.bit + 1)
+
+    def test_other_integrity_errors_are_raised(self):
+        Tag.objects.create(name="Обед", color="#111111", slug="lunch")
+        duplicate = Tag(name="Обед", color="#222222", slug="dinner")
+        with self.assertRaises(IntegrityError):
+            duplicate.save()
+        self.assertIsNone(duplicate.bit)
+
+    def test_tag_without_bit_has_empty_mask(self):
+        tag = Tag.objects.create(name="Обед", color="#111111", slug="lunch")
+        Tag.objects.filter(pk=tag.pk).update(bit=None)
+        tag.refresh_from_db()
+        self.assertEqual(tag.mask, 0)
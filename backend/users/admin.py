@@ -10,5 +10,12 @@ class UserAdmin(admin.ModelAdmin):
     ordering = ("username",)
     empty_value_display = "-пусто-"
 
+    def delete_model(self, request, obj):
+        obj.soft_delete()
+
+    def delete_queryset(self, request, queryset):
+        for user in queryset:
+            user.soft_delete()
+
 
 admin.site.register(User, UserAdmin)
@@ -0,0 +1,254 @@
+"""Выгрузка персональных данных пользователя в ZIP.
+
+Архив пишет ``zipfile`` в файловый объект без ``seek``: записи идут с
+дескрипторами данных, а готовые байты забираются сразу после записи.
+Строки читаются курсором (``iterator``) и пишутся в NDJSON, изображения
+рецептов читаются из хранилища чанками ``DATA_EXPORT_MEDIA_CHUNK`` и
+кладутся без сжатия. В памяти остаются только текущий чанк и оглавление
+архива. Небольшой архив API отдает сразу потоком (под ASGI генератор
+выполняется в отдельном потоке, см. ``api.streaming``), большой собирает
+фоновая задача ``users.build_export`` в ``DATA_EXPORT_ROOT``, откуда он
+скачивается по подписанной ссылке.
+"""
+
+import json
+import os
+import posixpath
+import time
+import zipfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.signing import BadSignature, TimestampSigner
+from django.db.models import F
+from django.utils import timezone
+
+import api.constants
+from api.export import RECIPE_FIELDS, chunked, encode, recipe_chunk
+from jobs.queue import enqueue
+from recipes.models import Favorite, MealPlanEntry, Recipe, ShoppingCart, Tag
+
+from .models import DataExport, Follow
+
+IMAGE_STORAGE = Recipe._meta.get_field("image").storage
+PROFILE_FIELDS = ("id", "email", "username", "first_name", "last_name")
+
+storage = FileSystemStorage(location=settings.DATA_EXPORT_ROOT)
+signer = TimestampSigner(salt="users.data_export")
+
+
+class StreamBuffer:
+    """Файловый объект только для записи и без ``seek``: ``zipfile``
+    пишет в него, ``drain`` забирает накопленные байты."""
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        if self.chunks:
+            data = b"".join(self.chunks)
+            self.chunks.clear()
+            yield data
+
+
+def image_entry(name) -> str:
+    return posixpath.join("images", posixpath.basename(name))
+
+
+def ndjson(queryset, *fields, **expressions):
+    rows = queryset.values(*fields, **expressions).iterator(
+        chunk_size=api.constants.EXPORT_CHUNK_SIZE
+    )
+    for chunk in chunked(rows, api.constants.EXPORT_CHUNK_SIZE):
+        yield encode(chunk)
+
+
+def profile(user):
+    data = {field: getattr(user, field) for field in PROFILE_FIELDS}
+    data["date_joined"] = user.date_joined
+    yield json.dumps(
+        data, ensure_ascii=False, indent=2, cls=DjangoJSONEncoder
+    ).encode()
+
+
+def recipe_lines(user, images):
+    """Рецепты автора; имена их изображений добавляются в ``images``."""
+    tags = {
+        tag["id"]: tag
+        for tag in Tag.objects.values("id", "name", "color", "slug")
+    }
+
+    def image_path(name):
+        if not name:
+            return None
+        images.add(name)
+        return image_entry(name)
+
+    rows = (
+        Recipe.objects.filter(author=user)
+        .order_by("id")
+        .values(*RECIPE_FIELDS)
+        .iterator(chunk_size=api.constants.EXPORT_CHUNK_SIZE)
+    )
+    for chunk in chunked(rows, api.constants.EXPORT_CHUNK_SIZE):
+        yield encode(recipe_chunk(chunk, tags, image_path))
+
+
+def entries(user, images):
+    """Файлы архива с данными: имя и генератор байтов."""
+    recipe = {
+        "recipe_name": F("recipe__name"),
+        "recipe_author": F("recipe__author__username"),
+    }
+    yield "profile.json", profile(user)
+    yield "recipes.ndjson", recipe_lines(user, images)
+    yield "favorites.ndjson", ndjson(
+        Favorite.objects.filter(user=user).order_by("id"),
+        "recipe_id",
+        "created",
+        **recipe,
+    )
+    yield "shopping_cart.ndjson", ndjson(
+        ShoppingCart.objects.filter(user=user).order_by("id"),
+        "recipe_id",
+        "created",
+        **recipe,
+    )
+    yield "meal_plan.ndjson", ndjson(
+        MealPlanEntry.objects.filter(user=user).order_by("date", "id"),
+        "date",
+        "recipe_id",
+        "servings",
+        recipe_name=F("recipe__name"),
+    )
+    yield "subscriptions.ndjson", ndjson(
+        Follow.objects.filter(user=user).order_by("id"),
+        "author_id",
+        username=F("author__username"),
+        first_name=F("author__first_name"),
+        last_name=F("author__last_name"),
+    )
+
+
+def write_image(zip_file, buffer, name):
+    info = zipfile.ZipInfo(image_entry(name), time.localtime()[:6])
+    # JPEG и PNG уже сжаты.
+    info.compress_type = zipfile.ZIP_STORED
+    try:
+        file = IMAGE_STORAGE.open(name, "rb")
+    except FileNotFoundError:
+        return
+    with file, zip_file.open(info, "w") as entry:
+        for chunk in file.chunks(api.constants.DATA_EXPORT_MEDIA_CHUNK):
+            entry.write(chunk)
+            yield from buffer.drain()
+
+
+def archive(user):
+    """Байты ZIP-архива с данными ``user`` по мере сборки."""
+    buffer = StreamBuffer()
+    images = set()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        for name, content in entries(user, images):
+            with zip_file.open(name, "w") as entry:
+                for chunk in content:
+                    entry.write(chunk)
+                    yield from buffer.drain()
+        for name in sorted(images):
+            yield from write_image(zip_file, buffer, name)
+    yield from buffer.drain()
+
+
+def is_small(user) -> bool:
+    """Архив можно отдать сразу, не занимая воркер надолго."""
+    return (
+        Recipe.objects.filter(author=user).count()
+        <= api.constants.DATA_EXPORT_SYNC_RECIPES
+    )
+
+
+def expires():
+    return timezone.now() - timedelta(seconds=api.constants.DATA_EXPORT_TTL)
+
+
+def request_export(user) -> DataExport:
+    """Ставит сборку архива в очередь. Пока архив собирается, повторный
+    запрос возвращает ту же выгрузку."""
+    pending = user.data_exports.filter(
+        finished__isnull=True, created__gte=expires()
+    ).first()
+    if pending is not None:
+        return pending
+    export = DataExport.objects.create(user=user)
+    enqueue("users.build_export", export.pk)
+    return export
+
+
+def delete_exports(queryset) -> None:
+    """Удаляет выгрузки вместе с файлами архивов."""
+    for export in queryset.exclude(file=""):
+        storage.delete(export.file)
+    queryset.delete()
+
+
+def build(export_id) -> None:
+    """Собирает архив выгрузки ``export_id``; прежние выгрузки
+    пользователя и все просроченные удаляются."""
+    export = (
+        DataExport.objects.select_related("user")
+        .filter(pk=export_id, finished__isnull=True)
+        .first()
+    )
+    if export is None:
+        return
+    name = f"{export.user_id}/{export.pk}.zip"
+    path = storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    size = 0
+    # Недописанный архив не виден под итоговым именем.
+    with open(path + ".part", "wb") as file:
+        for chunk in archive(export.user):
+            size += file.write(chunk)
+    os.replace(path + ".part", path)
+    export.file, export.size, export.finished = name, size, timezone.now()
+    export.save(update_fields=("file", "size", "finished"))
+    delete_exports(
+        DataExport.objects.exclude(pk=export.pk).filter(
+            user_id=export.user_id, created__lt=export.created
+        )
+    )
+    delete_exports(
+        DataExport.objects.exclude(pk=export.pk).filter(created__lt=expires())
+    )
+
+
+def download_token(export) -> str:
+    return signer.sign(str(export.pk))
+
+
+def from_token(token):
+    """Готовая выгрузка по токену ссылки; None, если токен неверен,
+    ссылка или архив просрочены."""
+    try:
+        pk = signer.unsign(token, max_age=api.constants.DATA_EXPORT_TTL)
+    except BadSignature:
+        return None
+    return (
+        DataExport.objects.select_related("user")
+        .filter(pk=pk, finished__isnull=False, created__gte=expires())
+        .first()
+    )
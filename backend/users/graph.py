@@ -0,0 +1,218 @@
+"""Подсказки авторов по графу подписок и избранного.
+
+Подписки и избранное хранятся в памяти процесса в формате CSR: для
+каждого узла - смещение в общем массиве соседей (``array``), поэтому
+обход друзей друзей не ходит в базу. Подписки и отписки приходят во
+все воркеры через шину инвалидации и применяются к индексу через
+небольшой слой изменений поверх CSR, полная
+перезагрузка выполняется при изменении данных в базе не чаще раза в
+``SUGGESTIONS_RELOAD_INTERVAL`` секунд. Изменения, пришедшие во время
+перезагрузки, копятся в отдельном слое и накладываются на новый CSR.
+"""
+
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.db.models import Count, Max
+
+import api.constants
+from api.invalidation import bus
+from recipes.models import Favorite, Recipe
+
+from .models import Follow
+
+
+class CSR:
+    """Списки смежности: отсортированные ключи, смещения и соседи."""
+
+    def __init__(self, pairs, limit=None):
+        self.keys = array("q")
+        self.offsets = array("q", [0])
+        self.values = array("q")
+        for key, value in pairs:
+            if not self.keys or self.keys[-1] != key:
+                self.keys.append(key)
+                self.offsets.append(self.offsets[-1])
+            elif limit and self.offsets[-1] - self.offsets[-2] >= limit:
+                continue
+            self.values.append(value)
+            self.offsets[-1] += 1
+
+    def __getitem__(self, key):
+        row = bisect_left(self.keys, key)
+        if row == len(self.keys) or self.keys[row] != key:
+            return ()
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return self.values[start:end]
+
+
+class FollowGraph:
+    """Граф подписок с инкрементальными изменениями поверх CSR."""
+
+    def __init__(self):
+        self.following = CSR(())
+        self.favorites = CSR(())
+        self.fans = CSR(())
+        self.authors = CSR(())
+        self.added = defaultdict(set)
+        self.removed = defaultdict(set)
+        self.pending = None
+        self.version = None
+        self.checked = 0.0
+        self.lock = threading.Lock()
+        self.loading = threading.Lock()
+
+    @staticmethod
+    def current_version():
+        return (
+            tuple(Follow.objects.aggregate(Count("id"), Max("id")).values()),
+            tuple(
+                Favorite.objects.aggregate(
+                    Count("id"), Max("created")
+                ).values()
+            ),
+        )
+
+    def refresh(self):
+        now = time.monotonic()
+        if now - self.checked < api.constants.SUGGESTIONS_RELOAD_INTERVAL:
+            return
+        self.checked = now
+        version = self.current_version()
+        if version == self.version or not self.loading.acquire(False):
+            return
+        try:
+            self.load(version)
+        finally:
+            with self.lock:
+                self.pending = None
+            self.loading.release()
+
+    def load(self, version):
+        # Изменения с этого момента пишутся и в новый слой: в снимок
+        # базы они могут не попасть.
+        with self.lock:
+            self.pending = (defaultdict(set), defaultdict(set))
+        user_items = api.constants.RECOMMENDATIONS_USER_ITEMS
+        following = CSR(
+            Follow.objects.order_by("user_id", "author_id")
+            .values_list("user_id", "author_id")
+            .iterator()
+        )
+        favorites = CSR(
+            Favorite.objects.order_by("user_id", "-created")
+            .values_list("user_id", "recipe_id")
+            .iterator(),
+            limit=user_items,
+        )
+        fans = CSR(
+            Favorite.objects.order_by("recipe_id", "-created")
+            .values_list("recipe_id", "user_id")
+            .iterator(),
+            limit=api.constants.SUGGESTIONS_FANS_PER_RECIPE,
+        )
+        authors = CSR(
+            Recipe.objects.order_by("id").values_list("id", "author_id")
+        )
+        with self.lock:
+            self.following, self.favorites = following, favorites
+            self.fans, self.authors = fans, authors
+            self.added, self.removed = self.pending
+            self.version = version
+
+    def overlays(self):
+        yield self.added, self.removed
+        if self.pending is not None:
+            yield self.pending
+
+    def followed(self, user_id, author_id):
+        with self.lock:
+            for added, removed in self.overlays():
+                removed[user_id].discard(author_id)
+                added[user_id].add(author_id)
+
+    def unfollowed(self, user_id, author_id):
+        with self.lock:
+            for added, removed in self.overlays():
+                added[user_id].discard(author_id)
+                removed[user_id].add(author_id)
+
+    def follows_changed(self, keys):
+        """Подписки и отписки из шины инвалидации (всех воркеров)."""
+        if not keys:
+            self.checked = 0.0
+            return
+        for key in keys:
+            change, user_id, author_id = key.split(":")
+            if change == "follow":
+                self.followed(int(user_id), int(author_id))
+            else:
+                self.unfollowed(int(user_id), int(author_id))
+
+    def following_of(self, user_id):
+        authors = self.following[user_id]
+        if user_id not in self.added and user_id not in self.removed:
+            return authors
+        with self.lock:
+            removed = set(self.removed.get(user_id, ()))
+            added = list(self.added.get(user_id, ()))
+        return [author for author in authors if author not in removed] + [
+            author for author in added if author not in authors
+        ]
+
+    def score_follows(self, followed, scores, deadline):
+        """Друзья друзей: на кого подписаны авторы из ``followed``."""
+        weight = api.constants.SUGGESTIONS_FOLLOW_WEIGHT
+        for author_id in followed:
+            for candidate in self.following_of(author_id):
+                scores[candidate] += weight
+            if time.perf_counter() > deadline:
+                return
+
+    def score_favorites(self, user_id, scores, deadline):
+        """Авторы избранных рецептов и подписки тех, кто добавил в
+        избранное те же рецепты."""
+        author_weight = api.constants.SUGGESTIONS_FAVORITE_AUTHOR_WEIGHT
+        co_favorite_weight = api.constants.SUGGESTIONS_CO_FAVORITE_WEIGHT
+        for recipe_id in self.favorites[user_id]:
+            for author_id in self.authors[recipe_id]:
+                scores[author_id] += author_weight
+            for fan_id in self.fans[recipe_id]:
+                if fan_id != user_id:
+                    for candidate in self.following_of(fan_id):
+                        scores[candidate] += co_favorite_weight
+            if time.perf_counter() > deadline:
+                return
+
+    def suggest(self, user_id, limit, budget=None):
+        """Авторы по друзьям друзей и пересечению избранного. При
+        исчерпании бюджета времени возвращает то, что успели набрать."""
+        self.refresh()
+        deadline = time.perf_counter() + (
+            budget or api.constants.SUGGESTIONS_TIME_BUDGET
+        )
+        followed = set(self.following_of(user_id))
+        scores = defaultdict(float)
+        self.score_follows(followed, scores, deadline)
+        self.score_favorites(user_id, scores, deadline)
+        scores.pop(user_id, None)
+        for author_id in followed:
+            scores.pop(author_id, None)
+        return [
+            author_id
+            for author_id, _ in heapq.nlargest(
+                limit, scores.items(), key=lambda item: item[1]
+            )
+        ]
+
+
+def follow_key(change, user_id, author_id) -> str:
+    return f"{change}:{user_id}:{author_id}"
+
+
+index = FollowGraph()
+bus.subscribe("follows", index.follows_changed)
@@ -1,11 +1,22 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.contrib.auth.validators import UnicodeUsernameValidator
-from django.db import models
+from django.db import models, transaction
 from django.db.models import F, Q, UniqueConstraint
+from django.utils import timezone
+
+from api.cache import invalidate
+from jobs.queue import enqueue
 
 LENGTH_OF_FIELDS = 150
 
 
+class ActiveUserManager(UserManager):
+    """Менеджер, скрывающий удаленных пользователей."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
+
+
 class User(AbstractUser):
     """Модель пользователя."""
 
@@ -33,6 +44,12 @@ class User(AbstractUser):
         unique=True,
         validators=(UnicodeUsernameValidator(),),
     )
+    is_deleted = models.BooleanField(
+        verbose_name="Удален", default=False, db_index=True
+    )
+
+    objects = ActiveUserManager()
+    all_objects = UserManager()
 
     class Meta:
         ordering = ("username",)
@@ -42,6 +59,37 @@ class User(AbstractUser):
     def __str__(self):
         return self.username
 
+    def soft_delete(self):
+        """Помечает пользователя и его рецепты удаленными. Зависимые
+        записи удаляет фоновая задача."""
+        # recipes импортирует модели пользователей.
+        from recipes import shopping
+
+        # Задача очистки коммитится вместе с пометками: воркер не удалит
+        # пользователя каскадом раньше, чем помечены его рецепты.
+        with transaction.atomic():
+            recipe_ids = list(
+                self.recipes.filter(is_deleted=False).values_list(
+                    "pk", flat=True
+                )
+            )
+            self.recipes.filter(pk__in=recipe_ids).update(
+                is_deleted=True, updated=timezone.now()
+            )
+            shopping.recipes_deleted(recipe_ids)
+            User.all_objects.filter(pk=self.pk).update(
+                is_deleted=True, is_active=False
+            )
+            enqueue(
+                "recipes.purge_user",
+                self.pk,
+                dedup_key=f"purge-user-{self.pk}",
+            )
+        if recipe_ids:
+            invalidate("recipes")
+        invalidate("users", f"users-{self.pk}")
+        self.is_deleted, self.is_active = True, False
+
 
 class Follow(models.Model):
     """Модель подписки на автора."""
@@ -72,3 +120,30 @@ class Follow(models.Model):
 
     def __str__(self) -> str:
         return f"{self.user} подписан на {self.author}"
+
+
+class DataExport(models.Model):
+    """Архив персональных данных, собранный фоновой задачей."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name="Пользователь",
+        related_name="data_exports",
+    )
+    file = models.CharField(verbose_name="Файл", max_length=255, blank=True)
+    size = models.PositiveBigIntegerField(
+        verbose_name="Размер, байт", default=0
+    )
+    created = models.DateTimeField(verbose_name="Запрошен", auto_now_add=True)
+    finished = models.DateTimeField(
+        verbose_name="Собран", null=True, blank=True
+    )
+
+    class Meta:
+        ordering = ("-created",)
+        verbose_name = "Выгрузка данных"
+        verbose_name_plural = "Выгрузки данных"
+
+    def __str__(self) -> str:
+        return f"Выгрузка {self.user} от {self.created:%d.%m.%Y}"
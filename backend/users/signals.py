@@ -0,0 +1,49 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.cache import invalidate
+from api.invalidation import bus
+from recipes.purge import purged
+
+from . import graph
+from .models import Follow, User
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        bus.publish(
+            "follows",
+            graph.follow_key("follow", instance.user_id, instance.author_id),
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    bus.publish(
+        "follows",
+        graph.follow_key("unfollow", instance.user_id, instance.author_id),
+    )
+
+
+@receiver(purged, sender=Follow)
+def follows_purged(sender, queryset, **kwargs):
+    keys = [
+        graph.follow_key("unfollow", user_id, author_id)
+        for user_id, author_id in queryset.values_list("user_id", "author_id")
+    ]
+    if keys:
+        bus.publish("follows", *keys)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    invalidate("users", f"users-{instance.pk}")
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def token_changed(sender, instance, **kwargs):
+    invalidate("users", f"users-{instance.user_id}")
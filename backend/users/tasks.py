@@ -0,0 +1,10 @@
+"""Фоновые задачи пользователей (см. ``jobs.queue``)."""
+
+from jobs.queue import task
+
+from . import data_export
+
+
+@task("users.build_export")
+def build_export(export_id):
+    data_export.build(export_id)
@@ -0,0 +1,63 @@
+"""Профиль времени импорта при старте воркера.
+
+Запускает ``python -X importtime`` для загрузки WSGI/ASGI-приложения и
+показывает общее время и самые дорогие пакеты:
+
+    python benchmarks/import_time.py --app foodgram.wsgi --top 15
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "backend")
+
+
+def profile(app):
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {app}"],
+        cwd=BACKEND_DIR,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=False,
+    )
+    elapsed = time.perf_counter() - started
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line.removeprefix("import time:").split("|")
+        self_us, cumulative_us, name = fields
+        if not self_us.strip().isdigit():
+            continue
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    if result.returncode:
+        sys.stderr.write(result.stderr[-2000:])
+    return elapsed, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", default="foodgram.wsgi")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    elapsed, modules = profile(args.app)
+    packages = defaultdict(int)
+    for name, self_us, _ in modules:
+        packages[name.split(".")[0]] += self_us
+
+    print(f"Загрузка {args.app}: {elapsed:.3f} с, модулей: {len(modules)}")
+    print(f"\n{'пакет':<30}{'мс':>10}")
+    for package, self_us in sorted(
+        packages.items(), key=lambda item: item[1], reverse=True
+    )[: args.top]:
+        print(f"{package:<30}{self_us / 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
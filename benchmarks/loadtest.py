@@ -0,0 +1,385 @@
+"""Нагрузочный прогон сценариев из postman-коллекции.
+
+Запросы берутся из ``postman-collection/diploma.postman_collection.json``
+по имени, переменные ``{{...}}`` подставляются для каждой итерации.
+Сценарии (просмотр, фильтр по тегам, избранное, корзина, выгрузка
+списка, подписки) выбираются по весам и выполняются конкурентно от лица
+заранее зарегистрированных пользователей:
+
+    python benchmarks/loadtest.py --base-url http://127.0.0.1:8000 \
+        --concurrency 32 --duration 60 --output before.json
+
+Повторный прогон с ``--baseline before.json`` показывает изменение
+пропускной способности и p95 по каждому маршруту.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+COLLECTION = os.path.join(
+    os.path.dirname(__file__),
+    os.pardir,
+    "postman-collection",
+    "diploma.postman_collection.json",
+)
+VARIABLE = re.compile(r"{{(\w+)}}")
+
+SCENARIOS = {
+    "browse": [
+        "get_recipes_list // No Auth",
+        "get_recipe_detail // User",
+        "get_ingredients_list_with_name_filter // User",
+    ],
+    "tags": [
+        "get_tag_list // User",
+        "get_recipes_list_with_two_tags_param // User",
+    ],
+    "favorite": [
+        "add_to_favorite // User",
+        "get_recipes_list_with_is_favorited_param // User",
+        "remove_from_favorite // User",
+    ],
+    "cart": [
+        "add_to_shopping_cart // User",
+        "get_recipes_list_with_is_in_shopping_cart_param // User",
+        "remove_from_shopping_cart // User",
+    ],
+    "download": [
+        "add_to_shopping_cart // User",
+        "download_shopping_cart // User",
+        "remove_from_shopping_cart // User",
+    ],
+    "subscribe": [
+        "create_subscription // User",
+        "get_subscription_list // User",
+        "delete_first_subscription // User",
+    ],
+}
+DEFAULT_WEIGHTS = (
+    "browse=40,tags=20,favorite=15,cart=10,download=5,subscribe=10"
+)
+
+
+def load_collection(path):
+    """Плоский словарь запросов коллекции по имени; авторизация
+    наследуется от папок, как в Postman."""
+    with open(path, encoding="utf-8") as file:
+        collection = json.load(file)
+    requests = {}
+
+    def walk(items, auth):
+        for item in items:
+            if "item" in item:
+                walk(item["item"], item.get("auth", auth))
+            elif item["name"] not in requests:
+                request = item["request"]
+                requests[item["name"]] = dict(
+                    request, auth=request.get("auth", auth)
+                )
+
+    walk(collection["item"], collection.get("auth"))
+    return requests
+
+
+def render(template, variables, encode):
+    return VARIABLE.sub(
+        lambda match: encode(variables[match.group(1)]), template
+    )
+
+
+def prepare(request, variables):
+    """Метод, URL-шаблон маршрута, URL, заголовки и тело запроса."""
+    url = request["url"]
+    template = url["raw"] if isinstance(url, dict) else url
+    headers = {"Accept": "application/json"}
+    auth = request.get("auth") or {}
+    if auth.get("type") == "apikey":
+        fields = {field["key"]: field["value"] for field in auth["apikey"]}
+        headers[fields["key"]] = render(fields["value"], variables, str)
+    body = None
+    if (request.get("body") or {}).get("mode") == "raw":
+        body = render(request["body"]["raw"], variables, json.dumps).encode()
+        headers["Content-Type"] = "application/json"
+    route = template.replace("{{baseUrl}}", "").split("?")[0]
+    return (
+        request["method"],
+        route,
+        render(
+            template, variables, lambda value: quote(str(value), safe=":/")
+        ),
+        headers,
+        body,
+    )
+
+
+def send(method, url, headers, body, timeout):
+    started = time.perf_counter()
+    try:
+        with urlopen(
+            Request(url, data=body, headers=headers, method=method),
+            timeout=timeout,
+        ) as resp:
+            payload = resp.read()
+            status = resp.status
+    except HTTPError as error:
+        payload, status = error.read(), error.code
+    except (URLError, OSError):
+        payload, status = b"", 0
+    return time.perf_counter() - started, status, payload
+
+
+def call(requests, name, variables, timeout):
+    method, _, url, headers, body = prepare(requests[name], variables)
+    _, status, payload = send(method, url, headers, body, timeout)
+    if status >= 400 or not status:
+        raise RuntimeError(f"{name}: {status} {payload[:200]!r}")
+    return json.loads(payload) if payload else None
+
+
+def setup(requests, base_url, users, timeout):
+    """Регистрирует пользователей и собирает id тегов, ингредиентов и
+    рецептов. Если рецептов нет, создает их запросом коллекции."""
+    run_id = uuid.uuid4().hex[:8]
+    variables = {"baseUrl": base_url, "password": "Load-test-pa$$word"}
+    accounts = []
+    for number in range(users):
+        username = f"loadtest-{run_id}-{number}"
+        variables.update(email=f"{username}@example.org", username=username)
+        user = call(requests, "create_first_user", variables, timeout)
+        token = call(requests, "get_token_for_first_user", variables, timeout)
+        accounts.append({"id": user["id"], "token": token["auth_token"]})
+
+    variables["userToken"] = accounts[0]["token"]
+    tags = call(requests, "get_tag_list // User", variables, timeout)
+    ingredients = call(
+        requests,
+        "get_ingredients_list_with_name_filter // User",
+        dict(variables, ingredientNameFirstLatter=""),
+        timeout,
+    )
+    if len(tags) < 2 or len(ingredients) < 2:
+        raise SystemExit("Нужно как минимум 2 тега и 2 ингредиента в базе")
+    recipes = call(
+        requests,
+        "get_recipes_list_with_limit_param // User",
+        variables,
+        timeout,
+    )
+    recipe_ids = [recipe["id"] for recipe in recipes["results"]]
+    for account in accounts[: max(0, 10 - len(recipe_ids))]:
+        first, second = random.sample(ingredients, 2)
+        first_tag, second_tag = random.sample(tags, 2)
+        recipe = call(
+            requests,
+            "create_first_recipe // Second User",
+            dict(
+                variables,
+                secondUserToken=account["token"],
+                firstIndredientId=first["id"],
+                secondIndredientId=second["id"],
+                firstIngredientAmount=10,
+                secondIngredientAmount=20,
+                firstTagId=first_tag["id"],
+                secondTagId=second_tag["id"],
+            ),
+            timeout,
+        )
+        recipe_ids.append(recipe["id"])
+    return {
+        "variables": variables,
+        "accounts": accounts,
+        "tags": [tag["slug"] for tag in tags],
+        "ingredients": [ingredient["name"] for ingredient in ingredients],
+        "recipes": recipe_ids,
+    }
+
+
+def iteration_variables(context, account, rng):
+    second_tag, third_tag = rng.sample(context["tags"], 2)
+    authors = [
+        other["id"]
+        for other in context["accounts"]
+        if other["id"] != account["id"]
+    ] or [account["id"]]
+    return dict(
+        context["variables"],
+        userToken=account["token"],
+        userId=account["id"],
+        firstRecipeId=rng.choice(context["recipes"]),
+        secondTagSlug=second_tag,
+        thirdTagSlug=third_tag,
+        thirdUserId=rng.choice(authors),
+        ingredientNameFirstLatter=rng.choice(context["ingredients"])[:1],
+    )
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.results = defaultdict(list)
+
+    def add(self, route, latency, status):
+        with self.lock:
+            self.results[route].append((latency, status))
+
+
+def worker(number, requests, context, weights, args, recorder, deadline):
+    rng = random.Random(args.seed + number)
+    account = context["accounts"][number % len(context["accounts"])]
+    names, scenario_weights = zip(*weights.items())
+    done = 0
+    while time.monotonic() < deadline and (
+        not args.iterations or done < args.iterations
+    ):
+        scenario = rng.choices(names, scenario_weights)[0]
+        variables = iteration_variables(context, account, rng)
+        for name in SCENARIOS[scenario]:
+            method, route, url, headers, body = prepare(
+                requests[name], variables
+            )
+            latency, status, _ = send(method, url, headers, body, args.timeout)
+            recorder.add(f"{method} {route}", latency, status)
+        done += 1
+
+
+def percentile(values, share):
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(share * (len(values) - 1))))
+    return values[index]
+
+
+def summarize(results, elapsed):
+    report = {}
+    for route, samples in sorted(results.items()):
+        latencies = sorted(latency for latency, _ in samples)
+        errors = sum(1 for _, status in samples if not 0 < status < 400)
+        report[route] = {
+            "count": len(samples),
+            "rps": len(samples) / elapsed,
+            "mean": statistics.mean(latencies) * 1000,
+            "p50": percentile(latencies, 0.50) * 1000,
+            "p95": percentile(latencies, 0.95) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "errors": errors / len(samples) * 100,
+        }
+    return report
+
+
+def parse_weights(value):
+    weights = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Неизвестный сценарий: {name}")
+        weights[name] = float(weight)
+    return weights
+
+
+def print_report(report, baseline):
+    print(
+        f"{'route':<50}{'count':>8}{'req/s':>9}{'mean':>9}{'p50':>9}"
+        f"{'p95':>9}{'p99':>9}{'err%':>7}"
+    )
+    for route, stats in report.items():
+        line = (
+            f"{route:<50}{stats['count']:>8}{stats['rps']:>9.1f}"
+            f"{stats['mean']:>9.1f}{stats['p50']:>9.1f}{stats['p95']:>9.1f}"
+            f"{stats['p99']:>9.1f}{stats['errors']:>7.1f}"
+        )
+        before = baseline.get(route)
+        if before:
+            line += (
+                f"  req/s {stats['rps'] - before['rps']:+.1f}"
+                f"  p95 {stats['p95'] - before['p95']:+.1f}"
+            )
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--collection", default=COLLECTION)
+    parser.add_argument(
+        "--weights",
+        type=parse_weights,
+        default=parse_weights(DEFAULT_WEIGHTS),
+        help=f"веса сценариев, по умолчанию {DEFAULT_WEIGHTS}",
+    )
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument(
+        "--users", type=int, help="пользователей, по умолчанию concurrency"
+    )
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument(
+        "--iterations", type=int, default=0, help="сценариев на поток"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--output", help="сохранить отчет в JSON")
+    parser.add_argument("--baseline", help="JSON прошлого прогона")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    requests = load_collection(args.collection)
+    context = setup(
+        requests,
+        args.base_url.rstrip("/"),
+        args.users or args.concurrency,
+        args.timeout,
+    )
+    recorder = Recorder()
+    started = time.monotonic()
+    deadline = started + args.duration
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for future in [
+            pool.submit(
+                worker,
+                number,
+                requests,
+                context,
+                args.weights,
+                args,
+                recorder,
+                deadline,
+            )
+            for number in range(args.concurrency)
+        ]:
+            future.result()
+    elapsed = time.monotonic() - started
+
+    report = summarize(recorder.results, elapsed)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)["routes"]
+    print_report(report, baseline)
+    total = sum(stats["count"] for stats in report.values())
+    print(
+        f"\nВсего: {total} запросов за {elapsed:.1f} с, "
+        f"{total / elapsed:.1f} req/s"
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(
+                {"elapsed": elapsed, "routes": report},
+                file,
+                ensure_ascii=False,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
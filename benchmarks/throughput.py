@@ -0,0 +1,98 @@
+"""Сравнение конкурентной пропускной способности WSGI и ASGI режимов.
+
+Запустите два экземпляра бэкенда (SERVER_MODE=wsgi и SERVER_MODE=asgi)
+на разных портах и передайте их как цели:
+
+    python benchmarks/throughput.py \
+        --target wsgi=http://127.0.0.1:8000 \
+        --target asgi=http://127.0.0.1:8001 \
+        --path /api/recipes/download_shopping_cart/ \
+        --token <token> --concurrency 64 --requests 2000
+"""
+
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+
+def fetch(url, headers, timeout):
+    started = time.perf_counter()
+    try:
+        with urlopen(Request(url, headers=headers), timeout=timeout) as resp:
+            resp.read()
+            ok = resp.status < 400
+    except (HTTPError, URLError, OSError):
+        ok = False
+    return time.perf_counter() - started, ok
+
+
+def percentile(values, share):
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(share * (len(values) - 1))))
+    return values[index]
+
+
+def run(url, headers, total, concurrency, timeout):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(
+            pool.map(lambda _: fetch(url, headers, timeout), range(total))
+        )
+    elapsed = time.perf_counter() - started
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, ok in results if not ok)
+    return {
+        "rps": total / elapsed,
+        "mean": statistics.mean(latencies) * 1000,
+        "p50": percentile(latencies, 0.50) * 1000,
+        "p95": percentile(latencies, 0.95) * 1000,
+        "p99": percentile(latencies, 0.99) * 1000,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--target",
+        action="append",
+        required=True,
+        help="label=base_url, можно указать несколько раз",
+    )
+    parser.add_argument("--path", default="/api/recipes/")
+    parser.add_argument("--token", help="токен для заголовка Authorization")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    headers = {"Accept": "application/json"}
+    if args.token:
+        headers["Authorization"] = f"Token {args.token}"
+
+    print(
+        f"{'target':<10}{'req/s':>10}{'mean':>10}{'p50':>10}"
+        f"{'p95':>10}{'p99':>10}{'errors':>8}"
+    )
+    for target in args.target:
+        label, _, base_url = target.partition("=")
+        stats = run(
+            base_url.rstrip("/") + args.path,
+            headers,
+            args.requests,
+            args.concurrency,
+            args.timeout,
+        )
+        print(
+            f"{label:<10}{stats['rps']:>10.1f}{stats['mean']:>10.1f}"
+            f"{stats['p50']:>10.1f}{stats['p95']:>10.1f}"
+            f"{stats['p99']:>10.1f}{stats['errors']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()